@@ -0,0 +1,322 @@
+"""
+NumPy-backed analytics over a user's calls.
+
+Only the columns the analytics need are fetched, straight from the cursor into
+NumPy arrays, and all grouping and binning is done with vectorized operations
+(bincount, searchsorted, percentile) instead of loops over ``Call`` ORM objects.
+
+Day and hour grouping takes a user timezone: local boundaries are converted
+to UTC epochs once and timestamps are assigned to them with searchsorted,
+which keeps DST transitions exact.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from sqlalchemy import Float, Integer, and_, cast, func, select
+
+import timezones
+from database import Agent, Call
+
+ACTIVE_STATUSES = ["queued", "ringing", "in-progress", "forwarding", "speaking"]
+COMPLETED_STATUSES = ["completed", "ended"]
+FAILED_STATUSES = ["failed", "no-answer", "busy"]
+MISSED_REASONS = ["no-answer", "missed", "busy"]
+
+DEFAULT_DURATION_BINS = [0, 30, 60, 120, 300, 600, 1800, 3600]
+COST_PERCENTILES = [50, 75, 90, 95, 99]
+
+FETCH_SIZE = 10000
+
+
+def epoch_seconds(column, dialect_name: str):
+    """SQL expression converting a naive UTC DateTime column to epoch seconds"""
+    if dialect_name == "sqlite":
+        return cast(func.strftime("%s", column), Integer)
+    return cast(func.extract("epoch", column), Integer)
+
+
+@dataclass
+class CallFrame:
+    """Columnar view of a set of calls.
+
+    Timestamps are float epoch seconds (NaN when missing); string columns are
+    stored as integer codes into the matching ``*_labels`` list.
+    """
+
+    created_at: np.ndarray
+    started_at: np.ndarray
+    duration: np.ndarray
+    cost: np.ndarray
+    has_recording: np.ndarray
+    status: np.ndarray
+    status_labels: List[str]
+    direction: np.ndarray
+    direction_labels: List[str]
+    ended_reason: np.ndarray
+    ended_reason_labels: List[str]
+    agent: np.ndarray
+    agent_labels: List[str]
+
+    def __len__(self):
+        return len(self.duration)
+
+    def is_in(self, codes: np.ndarray, labels: List[str], values: List[str]) -> np.ndarray:
+        """Boolean mask of rows whose label is one of ``values``"""
+        wanted = [index for index, label in enumerate(labels) if label in values]
+        return np.isin(codes, wanted)
+
+    def status_in(self, statuses: List[str]) -> np.ndarray:
+        return self.is_in(self.status, self.status_labels, statuses)
+
+
+def _encode(values: list):
+    # Dictionary-encode in first-seen order; None becomes the empty string so every row gets a code
+    lookup = {}
+    codes = np.fromiter((lookup.setdefault(value or "", len(lookup)) for value in values), dtype=np.int64, count=len(values))
+    return codes, list(lookup)
+
+
+def _as_float(values: list) -> np.ndarray:
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def load_call_frame(
+    db,
+    user_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    time_column: str = "created_at",
+) -> CallFrame:
+    """Fetch only the analytics columns for a user's calls into a CallFrame"""
+    dialect_name = db.get_bind().dialect.name
+    time_attr = getattr(Call, time_column)
+
+    conditions = [Call.user_id == user_id]
+    if start:
+        conditions.append(time_attr >= start)
+    if end:
+        conditions.append(time_attr <= end)
+
+    query = select(
+        epoch_seconds(Call.created_at, dialect_name),
+        epoch_seconds(Call.started_at, dialect_name),
+        Call.duration,
+        cast(Call.cost, Float),
+        Call.recording_url.isnot(None) & (func.trim(Call.recording_url) != ""),
+        Call.status,
+        Call.direction,
+        Call.ended_reason,
+        Call.agent_id,
+    ).where(and_(*conditions))
+
+    # Go through the Core connection so rows skip ORM loading entirely
+    columns = [[] for _ in range(9)]
+    result = db.connection().execute(query)
+    while True:
+        rows = result.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        for column, values in zip(columns, zip(*rows)):
+            column.extend(values)
+
+    created_at, started_at, duration, cost, has_recording, status, direction, ended_reason, agent = columns
+    status_codes, status_labels = _encode(status)
+    direction_codes, direction_labels = _encode(direction)
+    reason_codes, reason_labels = _encode(ended_reason)
+    agent_codes, agent_labels = _encode(agent)
+
+    return CallFrame(
+        created_at=_as_float(created_at),
+        started_at=_as_float(started_at),
+        duration=np.nan_to_num(_as_float(duration)),
+        cost=np.nan_to_num(_as_float(cost)),
+        has_recording=np.array([bool(value) for value in has_recording], dtype=bool),
+        status=status_codes,
+        status_labels=status_labels,
+        direction=direction_codes,
+        direction_labels=direction_labels,
+        ended_reason=reason_codes,
+        ended_reason_labels=reason_labels,
+        agent=agent_codes,
+        agent_labels=agent_labels,
+    )
+
+
+def _epoch(moment: datetime) -> float:
+    return (moment - datetime(1970, 1, 1)).total_seconds()
+
+
+def _counts_by_label(codes: np.ndarray, labels: List[str], mask: Optional[np.ndarray] = None) -> Dict[str, int]:
+    selected = codes if mask is None else codes[mask]
+    counts = np.bincount(selected, minlength=len(labels))
+    return {(labels[index] or "unknown"): int(count) for index, count in enumerate(counts) if count}
+
+
+def missed_mask(frame: CallFrame) -> np.ndarray:
+    return frame.is_in(frame.ended_reason, frame.ended_reason_labels, MISSED_REASONS) | (
+        frame.status_in(["ended"]) & (frame.duration == 0)
+    )
+
+
+def _from_epoch(seconds: float) -> datetime:
+    return datetime(1970, 1, 1) + timedelta(seconds=float(seconds))
+
+
+def _valid_times(frame: CallFrame, time_field: str):
+    times = getattr(frame, time_field)
+    valid = ~np.isnan(times)
+    return times[valid], valid
+
+
+def dashboard_metrics(frame: CallFrame, now: Optional[datetime] = None, tz: Optional[ZoneInfo] = None) -> dict:
+    """The call-derived numbers shown on the dashboard; "today" and "this month" are local to ``tz``"""
+    now = now or datetime.utcnow()
+    tz = tz or timezones.get_zone(None)
+    local_today = timezones.local_now(tz, now).date()
+    today_start = timezones.local_midnight_utc(local_today, tz)
+    month_start = timezones.local_midnight_utc(local_today.replace(day=1), tz)
+    total_calls = len(frame)
+    total_cost = float(frame.cost.sum())
+
+    completed = frame.status_in(COMPLETED_STATUSES) & (frame.duration > 0)
+    avg_duration = float(frame.duration[completed].mean()) / 60 if completed.any() else 0
+
+    # NaN compares False, so calls without a timestamp are never counted
+    with np.errstate(invalid="ignore"):
+        recent_calls = int((frame.created_at >= _epoch(now - timedelta(days=7))).sum())
+        calls_today = int((frame.created_at >= _epoch(today_start)).sum())
+        calls_this_month = int((frame.created_at >= _epoch(month_start)).sum())
+
+    return {
+        "totalCalls": total_calls,
+        "recentCalls": recent_calls,
+        "totalCost": round(total_cost, 2),
+        "averageDuration": round(avg_duration, 2),
+        "totalCallMinutes": round(float(frame.duration.sum()) / 60, 2),
+        "averageCostPerCall": round(total_cost / total_calls, 2) if total_calls else 0,
+        "callsToday": calls_today,
+        "callsThisMonth": calls_this_month,
+        "activeCalls": int(frame.status_in(ACTIVE_STATUSES).sum()),
+        "missedCalls": int(missed_mask(frame).sum()),
+        "recordedCalls": int(frame.has_recording.sum()),
+        "queuedCalls": int(frame.status_in(["queued"]).sum()),
+    }
+
+
+def summary(frame: CallFrame) -> dict:
+    total_calls = len(frame)
+    successful = int(frame.status_in(["completed"]).sum())
+    failed = int(frame.status_in(FAILED_STATUSES).sum())
+    total_duration = float(frame.duration.sum())
+    total_cost = float(frame.cost.sum())
+
+    return {
+        "total_calls": total_calls,
+        "successful_calls": successful,
+        "failed_calls": failed,
+        "success_rate": round(successful / total_calls * 100, 2) if total_calls else 0,
+        "total_duration_minutes": round(total_duration / 60, 2),
+        "average_duration_minutes": round(total_duration / total_calls / 60, 2) if total_calls else 0,
+        "total_cost": round(total_cost, 4),
+        "average_cost_per_call": round(total_cost / total_calls, 4) if total_calls else 0,
+    }
+
+
+def calls_by_day(frame: CallFrame, time_field: str = "started_at", tz: Optional[ZoneInfo] = None) -> Dict[str, Dict[str, int]]:
+    """Per local day call counts split by direction"""
+    times, valid = _valid_times(frame, time_field)
+    if not times.size:
+        return {}
+
+    tz = tz or timezones.get_zone(None)
+    first_day = timezones.local_now(tz, _from_epoch(times.min())).date()
+    last_day = timezones.local_now(tz, _from_epoch(times.max())).date()
+    days, boundaries = timezones.local_day_boundaries(first_day, last_day, tz)
+    edges = np.array([_epoch(boundary) for boundary in boundaries])
+    day_index = np.searchsorted(edges, times, side="right") - 1
+    directions = frame.direction[valid]
+
+    # One bincount over (day, direction) pairs
+    num_directions = len(frame.direction_labels)
+    counts = np.bincount(day_index * num_directions + directions, minlength=len(days) * num_directions)
+    counts = counts.reshape(len(days), num_directions)
+
+    result = {}
+    for row, day in enumerate(days):
+        if not counts[row].any():
+            continue
+        by_direction = {"inbound": 0, "outbound": 0}
+        for column, label in enumerate(frame.direction_labels):
+            if counts[row, column]:
+                by_direction[label or "unknown"] = int(counts[row, column])
+        result[day.isoformat()] = by_direction
+    return result
+
+
+def calls_by_status(frame: CallFrame) -> Dict[str, int]:
+    return _counts_by_label(frame.status, frame.status_labels)
+
+
+def agent_statistics(frame: CallFrame) -> Dict[str, dict]:
+    """Per-agent totals keyed by agent ID"""
+    num_agents = len(frame.agent_labels)
+    totals = np.bincount(frame.agent, minlength=num_agents)
+    successful = np.bincount(frame.agent, weights=frame.status_in(["completed"]).astype(np.float64), minlength=num_agents)
+    durations = np.bincount(frame.agent, weights=frame.duration, minlength=num_agents)
+    costs = np.bincount(frame.agent, weights=frame.cost, minlength=num_agents)
+
+    return {
+        agent_id: {
+            "total": int(totals[index]),
+            "successful": int(successful[index]),
+            "duration": int(durations[index]),
+            "cost": round(float(costs[index]), 4),
+        }
+        for index, agent_id in enumerate(frame.agent_labels)
+        if agent_id and totals[index]
+    }
+
+
+def duration_histogram(frame: CallFrame, bins: Optional[List[int]] = None) -> dict:
+    """Call counts per duration bucket (seconds); the last bucket is open-ended"""
+    edges = np.array(bins or DEFAULT_DURATION_BINS, dtype=np.float64)
+    counts = np.bincount(np.searchsorted(edges, frame.duration, side="right") - 1, minlength=len(edges))
+    labels = [f"{int(low)}-{int(high)}" for low, high in zip(edges[:-1], edges[1:])] + [f"{int(edges[-1])}+"]
+    return {"buckets": labels, "counts": [int(count) for count in counts[: len(edges)]]}
+
+
+def cost_distribution(frame: CallFrame) -> dict:
+    if not len(frame):
+        return {"mean": 0, "max": 0, "percentiles": {str(p): 0 for p in COST_PERCENTILES}}
+
+    values = np.percentile(frame.cost, COST_PERCENTILES)
+    return {
+        "mean": round(float(frame.cost.mean()), 4),
+        "max": round(float(frame.cost.max()), 4),
+        "percentiles": {str(p): round(float(v), 4) for p, v in zip(COST_PERCENTILES, values)},
+    }
+
+
+def hourly_heatmap(frame: CallFrame, time_field: str = "started_at", tz: Optional[ZoneInfo] = None) -> List[List[int]]:
+    """7x24 matrix of call counts, rows Monday..Sunday, columns local hour of day"""
+    times, _valid = _valid_times(frame, time_field)
+    if not times.size:
+        return np.zeros((7, 24), dtype=np.int64).tolist()
+
+    tz = tz or timezones.get_zone(None)
+    local_hours, boundaries = timezones.local_hour_boundaries(_from_epoch(times.min()), _from_epoch(times.max()), tz)
+    edges = np.array([_epoch(boundary) for boundary in boundaries])
+    cells = np.array([hour.weekday() * 24 + hour.hour for hour in local_hours], dtype=np.int64)
+    counts = np.bincount(cells[np.searchsorted(edges, times, side="right") - 1], minlength=7 * 24)
+    return counts.reshape(7, 24).tolist()
+
+
+def agent_names(db, agent_ids: List[str]) -> Dict[str, str]:
+    ids = [agent_id for agent_id in agent_ids if agent_id]
+    if not ids:
+        return {}
+    return dict(db.execute(select(Agent.id, Agent.name).where(Agent.id.in_(ids))).all())
@@ -0,0 +1,104 @@
+"""
+Short-lived cache of authenticated principals.
+
+Every authenticated request decodes its JWT and loads the user by email.
+``principals`` remembers both steps for ``TTL``: decoded tokens keyed by a
+hash of the token (never the token itself), and snapshots of user rows keyed
+by email. Both maps are bounded LRUs. Routes that change a user (password
+reset, email verification, timezone and profile updates) call
+``invalidate(email)``; the TTL bounds staleness for changes made by other
+processes.
+
+Cache hits hand out a fresh, session-less ``User`` built from the snapshot,
+so a route can't accidentally share or persist a cached object. Routes that
+modify the user must load it from their own session.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from database import User
+from metrics import registry
+
+TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))  # seconds
+CAPACITY = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class PrincipalCache:
+    def __init__(self, ttl: float = TTL, capacity: int = CAPACITY, clock=time.monotonic):
+        self.ttl = ttl
+        self.capacity = capacity
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._tokens: "OrderedDict[str, tuple]" = OrderedDict()  # token hash -> (email, expires)
+        self._users: "OrderedDict[str, tuple]" = OrderedDict()  # email -> (column values, expires)
+
+    def _get(self, entries: OrderedDict, key: str):
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if self.clock() >= expires:
+            del entries[key]
+            return None
+        entries.move_to_end(key)
+        return value
+
+    def _put(self, entries: OrderedDict, key: str, value, expires: float):
+        entries[key] = (value, expires)
+        entries.move_to_end(key)
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+
+    def token_email(self, token: str) -> Optional[str]:
+        """Email of a token decoded recently, if still valid"""
+        with self._lock:
+            email = self._get(self._tokens, _token_key(token))
+        registry.increment("auth_cache.token_hits" if email else "auth_cache.token_misses")
+        return email
+
+    def remember_token(self, token: str, email: str, expires_at: Optional[float] = None):
+        """Cache a decoded token; ``expires_at`` is its ``exp`` claim (epoch seconds)"""
+        lifetime = self.ttl
+        if expires_at is not None:
+            # Never outlive the token itself
+            lifetime = min(lifetime, expires_at - time.time())
+        if lifetime <= 0:
+            return
+        with self._lock:
+            self._put(self._tokens, _token_key(token), email, self.clock() + lifetime)
+
+    def user(self, email: str) -> Optional[User]:
+        with self._lock:
+            values = self._get(self._users, email)
+        if values is None:
+            registry.increment("auth_cache.user_misses")
+            return None
+        registry.increment("auth_cache.user_hits")
+        return User(**values)
+
+    def remember_user(self, user: User):
+        values = {column.key: getattr(user, column.key) for column in User.__table__.columns}
+        with self._lock:
+            self._put(self._users, user.email, values, self.clock() + self.ttl)
+
+    def invalidate(self, email: str):
+        """Forget a user's snapshot after the row changed"""
+        with self._lock:
+            self._users.pop(email, None)
+        registry.increment("auth_cache.invalidations")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"tokens": len(self._tokens), "users": len(self._users), "ttl_seconds": self.ttl}
+
+
+principals = PrincipalCache()
@@ -4,11 +4,14 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Optional
+import httpx
 import phonenumbers
 from phonenumbers import NumberParseException
 import os
 from datetime import datetime, timedelta
 
+import google_tokens
+
 class AuthUtils:
     @staticmethod
     def validate_password(password: str) -> tuple[bool, str]:
@@ -74,26 +77,48 @@ class EmailService:
         self.smtp_username = os.getenv("SMTP_USERNAME", "")
         self.smtp_password = os.getenv("SMTP_PASSWORD", "")
         self.from_email = os.getenv("FROM_EMAIL", "noreply@EmployAI.com")
+        self.use_starttls = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+    
+    def verification_message(self, verification_token: str) -> tuple[str, str]:
+        """Subject and HTML body of the email verification message"""
+        subject = "Verify Your EmployAI Account"
+        verification_url = f"{os.getenv('FRONTEND_URL', 'https://cloud-rep-ten.vercel.app')}/verify-email?token={verification_token}"
+        
+        body = f"""
+        <html>
+            <body>
+                <h2>Welcome to EmployAI!</h2>
+                <p>Please click the link below to verify your email address:</p>
+                <a href="{verification_url}" style="background-color: #4CAF50; color: white; padding: 14px 20px; text-decoration: none; border-radius: 4px;">Verify Email</a>
+                <p>If you didn't create an account with EmployAI, please ignore this email.</p>
+                <p>This link will expire in 24 hours.</p>
+            </body>
+        </html>
+        """
+        return subject, body
+    
+    def password_reset_message(self, reset_token: str) -> tuple[str, str]:
+        """Subject and HTML body of the password reset message"""
+        subject = "Reset Your EmployAI Password"
+        reset_url = f"{os.getenv('FRONTEND_URL', 'https://cloud-rep-ten.vercel.app')}/reset-password?token={reset_token}"
+        
+        body = f"""
+        <html>
+            <body>
+                <h2>Password Reset Request</h2>
+                <p>You requested to reset your password. Click the link below to set a new password:</p>
+                <a href="{reset_url}" style="background-color: #f44336; color: white; padding: 14px 20px; text-decoration: none; border-radius: 4px;">Reset Password</a>
+                <p>If you didn't request this password reset, please ignore this email.</p>
+                <p>This link will expire in 1 hour.</p>
+            </body>
+        </html>
+        """
+        return subject, body
     
     def send_verification_email(self, to_email: str, verification_token: str) -> bool:
         """Send email verification"""
         try:
-            subject = "Verify Your EmployAI Account"
-            verification_url = f"{os.getenv('FRONTEND_URL', 'https://cloud-rep-ten.vercel.app')}/verify-email?token={verification_token}"
-            
-            body = f"""
-            <html>
-                <body>
-                    <h2>Welcome to EmployAI!</h2>
-                    <p>Please click the link below to verify your email address:</p>
-                    <a href="{verification_url}" style="background-color: #4CAF50; color: white; padding: 14px 20px; text-decoration: none; border-radius: 4px;">Verify Email</a>
-                    <p>If you didn't create an account with EmployAI, please ignore this email.</p>
-                    <p>This link will expire in 24 hours.</p>
-                </body>
-            </html>
-            """
-            
-            return self._send_email(to_email, subject, body)
+            return self._send_email(to_email, *self.verification_message(verification_token))
         except Exception as e:
             print(f"Error sending verification email: {e}")
             return False
@@ -101,40 +126,38 @@ class EmailService:
     def send_password_reset_email(self, to_email: str, reset_token: str) -> bool:
         """Send password reset email"""
         try:
-            subject = "Reset Your EmployAI Password"
-            reset_url = f"{os.getenv('FRONTEND_URL', 'https://cloud-rep-ten.vercel.app')}/reset-password?token={reset_token}"
-            
-            body = f"""
-            <html>
-                <body>
-                    <h2>Password Reset Request</h2>
-                    <p>You requested to reset your password. Click the link below to set a new password:</p>
-                    <a href="{reset_url}" style="background-color: #f44336; color: white; padding: 14px 20px; text-decoration: none; border-radius: 4px;">Reset Password</a>
-                    <p>If you didn't request this password reset, please ignore this email.</p>
-                    <p>This link will expire in 1 hour.</p>
-                </body>
-            </html>
-            """
-            
-            return self._send_email(to_email, subject, body)
+            return self._send_email(to_email, *self.password_reset_message(reset_token))
         except Exception as e:
             print(f"Error sending reset email: {e}")
             return False
     
-    def _send_email(self, to_email: str, subject: str, body: str) -> bool:
-        """Send email using SMTP"""
+    def build_message(self, to_email: str, subject: str, body: str) -> MIMEMultipart:
+        msg = MIMEMultipart()
+        msg['From'] = self.from_email
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        
+        msg.attach(MIMEText(body, 'html'))
+        return msg
+    
+    def open_connection(self, timeout: float = 30) -> smtplib.SMTP:
+        """A connected SMTP session, upgraded to TLS and logged in as configured"""
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=timeout)
         try:
-            msg = MIMEMultipart()
-            msg['From'] = self.from_email
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            msg.attach(MIMEText(body, 'html'))
-            
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
+            if self.use_starttls:
                 server.starttls()
+            if self.smtp_username:
                 server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
+        except Exception:
+            server.close()
+            raise
+        return server
+    
+    def _send_email(self, to_email: str, subject: str, body: str) -> bool:
+        """Send email using SMTP"""
+        try:
+            with self.open_connection() as server:
+                server.send_message(self.build_message(to_email, subject, body))
             
             return True
         except Exception as e:
@@ -142,30 +165,50 @@ class EmailService:
             return False
 
 class GoogleAuth:
-    def __init__(self):
+    def __init__(self, jwks: Optional["google_tokens.JwksCache"] = None):
         self.client_id = os.getenv("GOOGLE_CLIENT_ID", "")
         self.client_secret = os.getenv("GOOGLE_CLIENT_SECRET", "")
+        self.jwks = jwks or google_tokens.jwks
+        self._client: Optional[httpx.AsyncClient] = None
     
     async def verify_google_token(self, token: str) -> Optional[dict]:
-        """Verify Google OAuth token and return user info"""
+        """Verify a Google ID token (or, for older clients, an OAuth access token) and return user info"""
+        if google_tokens.looks_like_jwt(token):
+            try:
+                claims = await google_tokens.verify_id_token(token, self.client_id, self.jwks)
+            except google_tokens.InvalidIdToken as e:
+                print(f"Rejected Google ID token: {e}")
+                return None
+            if not claims.get("email"):
+                # Issued without the email scope; we key accounts by email
+                return None
+            return {
+                "google_id": claims["sub"],
+                "email": claims.get("email"),
+                "name": claims.get("name") or claims.get("email"),
+                "verified_email": bool(claims.get("email_verified", False))
+            }
+        return await self._userinfo(token)
+    
+    async def _userinfo(self, access_token: str) -> Optional[dict]:
+        """Look up an access token with Google's userinfo endpoint"""
         try:
-            import httpx
+            if self._client is None:
+                self._client = httpx.AsyncClient(timeout=10.0)
+            response = await self._client.get(
+                "https://www.googleapis.com/oauth2/v1/userinfo",
+                headers={"Authorization": f"Bearer {access_token}"}
+            )
             
-            # Verify token with Google
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"https://www.googleapis.com/oauth2/v1/userinfo?access_token={token}"
-                )
-                
-                if response.status_code == 200:
-                    user_info = response.json()
-                    return {
-                        "google_id": user_info.get("id"),
-                        "email": user_info.get("email"),
-                        "name": user_info.get("name"),
-                        "verified_email": user_info.get("verified_email", False)
-                    }
-                return None
+            if response.status_code == 200:
+                user_info = response.json()
+                return {
+                    "google_id": user_info.get("id"),
+                    "email": user_info.get("email"),
+                    "name": user_info.get("name"),
+                    "verified_email": user_info.get("verified_email", False)
+                }
+            return None
         except Exception as e:
             print(f"Error verifying Google token: {e}")
             return None
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark the NumPy analytics engine against the list-comprehension code
+previously used by /analytics/dashboard.
+
+Usage:
+    python benchmark_analytics.py [num_calls]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import analytics_engine
+from database import Base, Call
+
+USER_ID = "benchmark-user"
+
+
+def populate(engine, num_calls):
+    """Insert synthetic calls spread over the last 90 days"""
+    statuses = ["ended", "completed", "failed", "queued", "in-progress"]
+    reasons = [None, "customer-ended-call", "no-answer", "busy"]
+    agents = [str(uuid.uuid4()) for _ in range(20)]
+    now = datetime.utcnow()
+    rows = []
+    for _ in range(num_calls):
+        created_at = now - timedelta(seconds=random.randint(0, 90 * 86400))
+        rows.append({
+            "id": str(uuid.uuid4()),
+            "user_id": USER_ID,
+            "agent_id": random.choice(agents),
+            "direction": random.choice(["inbound", "outbound"]),
+            "status": random.choice(statuses),
+            "duration": random.randint(0, 1800),
+            "cost": f"{random.random():.4f}",
+            "recording_url": random.choice([None, "https://example.com/recording.wav"]),
+            "transcript": "AI: Hello, how can I help you today?\nUser: I'd like to book an appointment.",
+            "ended_reason": random.choice(reasons),
+            "started_at": created_at,
+            "created_at": created_at,
+        })
+    with engine.begin() as conn:
+        conn.execute(insert(Call), rows)
+
+
+def legacy_dashboard_metrics(db):
+    """The list-comprehension implementation over Call ORM objects"""
+    all_calls = db.query(Call).filter(Call.user_id == USER_ID).all()
+    total_calls = len(all_calls)
+    total_duration = sum([call.duration or 0 for call in all_calls]) / 60
+    total_cost = sum([float(call.cost or 0) for call in all_calls])
+    seven_days_ago = datetime.utcnow() - timedelta(days=7)
+    recent_calls = len([call for call in all_calls if call.created_at and call.created_at >= seven_days_ago])
+    completed_calls = [call for call in all_calls if call.status in ["completed", "ended"] and call.duration and call.duration > 0]
+    avg_duration = sum([call.duration or 0 for call in completed_calls]) / len(completed_calls) / 60 if completed_calls else 0
+    today = datetime.utcnow().date()
+    calls_today = len([call for call in all_calls if call.created_at and call.created_at.date() >= today])
+    # Month start at midnight; the old code kept the current time of day
+    this_month = datetime.combine(today.replace(day=1), datetime.min.time())
+    calls_this_month = len([call for call in all_calls if call.created_at and call.created_at >= this_month])
+    active_statuses = ["queued", "ringing", "in-progress", "forwarding", "speaking"]
+    active_calls = len([call for call in all_calls if call.status in active_statuses])
+    missed_calls = len([
+        call for call in all_calls
+        if call.ended_reason in ["no-answer", "missed", "busy"] or (call.status == "ended" and (call.duration or 0) == 0)
+    ])
+    recorded_calls = len([call for call in all_calls if call.recording_url and call.recording_url.strip()])
+    queued_calls = len([call for call in all_calls if call.status == "queued"])
+    return {
+        "totalCalls": total_calls,
+        "recentCalls": recent_calls,
+        "totalCost": round(total_cost, 2),
+        "averageDuration": round(avg_duration, 2),
+        "totalCallMinutes": round(total_duration, 2),
+        "callsToday": calls_today,
+        "callsThisMonth": calls_this_month,
+        "activeCalls": active_calls,
+        "missedCalls": missed_calls,
+        "recordedCalls": recorded_calls,
+        "queuedCalls": queued_calls,
+    }
+
+
+def engine_dashboard_metrics(db):
+    frame = analytics_engine.load_call_frame(db, USER_ID)
+    return analytics_engine.dashboard_metrics(frame)
+
+
+def timed(label, func, db, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        db.expunge_all()
+        started = time.perf_counter()
+        result = func(db)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  {label:<22} {best * 1000:9.1f} ms")
+    return result, best
+
+
+def main():
+    num_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'benchmark.db')}")
+        Base.metadata.create_all(bind=engine)
+        print(f"📦 Populating {num_calls} calls...")
+        populate(engine, num_calls)
+
+        db = sessionmaker(bind=engine)()
+        print("⏱️  Dashboard metrics (best of 3)")
+        legacy, legacy_time = timed("list comprehensions", legacy_dashboard_metrics, db)
+        vectorized, engine_time = timed("numpy engine", engine_dashboard_metrics, db)
+        db.close()
+        engine.dispose()
+
+    mismatched = [key for key in legacy if legacy[key] != vectorized[key]]
+    if mismatched:
+        print(f"❌ Results differ for: {', '.join(mismatched)}")
+        return 1
+
+    print(f"✅ Results match, speedup {legacy_time / engine_time:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
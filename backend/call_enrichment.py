@@ -0,0 +1,187 @@
+"""
+Background post-call enrichment.
+
+When a call ends, VAPI keeps producing artifacts for a while: the recording
+is uploaded, the full transcript and the summary are generated, and the final
+cost is settled. Instead of fetching them whenever someone opens a call, the
+webhook pipeline schedules the call here once its end event commits. After
+``INITIAL_DELAY`` the final VAPI call object is fetched and stored; if the
+artifacts aren't ready it is retried on the ``RETRY_DELAYS`` schedule, and
+whatever is available is stored after the last attempt.
+
+The transcript and recording endpoints only read local columns, so they never
+wait on VAPI.
+"""
+
+import asyncio
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional, Set
+
+from database import Call
+from metrics import registry
+
+INITIAL_DELAY = float(os.getenv("ENRICHMENT_INITIAL_DELAY", "5"))  # seconds
+RETRY_DELAYS = (10, 30, 60, 180, 600)  # seconds, after the first attempt
+CONCURRENCY = int(os.getenv("ENRICHMENT_CONCURRENCY", "4"))
+SWEEP_WINDOW = timedelta(days=1)  # Ended calls re-scheduled at startup if never enriched
+
+Fetch = Callable[[str], Awaitable[dict]]
+
+
+def artifacts_ready(data: dict) -> bool:
+    """Whether VAPI has finished producing the call's artifacts"""
+    artifact = data.get("artifact") or {}
+    has_recording = bool(data.get("recordingUrl") or artifact.get("recordingUrl"))
+    has_transcript = bool(data.get("transcript") or artifact.get("transcript"))
+    return data.get("status") == "ended" and has_recording and has_transcript
+
+
+def is_enriched(call: Call) -> bool:
+    return bool(call.recording_url and call.transcript and call.summary)
+
+
+def apply_vapi_call(call: Call, data: dict):
+    """Copy the final artifacts of a VAPI call onto the local record"""
+    artifact = data.get("artifact") or {}
+    analysis = data.get("analysis") or {}
+
+    call.recording_url = data.get("recordingUrl") or artifact.get("recordingUrl") or call.recording_url
+    call.transcript = data.get("transcript") or artifact.get("transcript") or call.transcript
+    call.summary = data.get("summary") or analysis.get("summary") or call.summary
+    call.ended_reason = data.get("endedReason") or call.ended_reason
+    if data.get("cost") is not None:
+        call.cost = str(data["cost"])
+    if data.get("startedAt") and data.get("endedAt") and not call.duration:
+        started = datetime.fromisoformat(data["startedAt"].replace("Z", "+00:00"))
+        ended = datetime.fromisoformat(data["endedAt"].replace("Z", "+00:00"))
+        call.duration = int((ended - started).total_seconds())
+    call.updated_at = datetime.utcnow()
+
+
+class CallEnricher:
+    """Delayed, retried fetches of final VAPI call objects, a few at a time"""
+
+    def __init__(self, initial_delay: float = INITIAL_DELAY, retry_delays=RETRY_DELAYS, concurrency: int = CONCURRENCY):
+        self.initial_delay = initial_delay
+        self.retry_delays = tuple(retry_delays)
+        self.concurrency = concurrency
+        self.session_factory = None
+        self.fetch: Optional[Fetch] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._lock = threading.Lock()
+        self._scheduled: Set[str] = set()
+
+    def start(self, session_factory, fetch: Fetch):
+        """Start the workers on the running loop; until then ``schedule`` is a no-op"""
+        self.session_factory = session_factory
+        self.fetch = fetch
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+        self._loop = None
+
+    def schedule(self, call_id: str, attempt: int = 0, delay: Optional[float] = None):
+        """Enrich a call after a delay; safe to call from any thread"""
+        loop = self._loop
+        if loop is None:
+            return
+        if attempt == 0:
+            # hang and end-of-call-report both end a call; one enrichment is enough
+            with self._lock:
+                if call_id in self._scheduled:
+                    return
+                self._scheduled.add(call_id)
+                registry.set_gauge("enrichment.scheduled", len(self._scheduled))
+        delay = self.initial_delay if delay is None else delay
+        try:
+            loop.call_soon_threadsafe(loop.call_later, delay, self._queue.put_nowait, (call_id, attempt))
+        except RuntimeError:
+            # The loop has shut down
+            pass
+
+    async def _work(self):
+        while True:
+            call_id, attempt = await self._queue.get()
+            try:
+                done = await self.enrich(call_id, attempt)
+            except Exception as e:
+                print(f"Enrichment failed for call {call_id}: {str(e)}")
+                registry.increment("enrichment.errors")
+                done = False
+            if not done and attempt < len(self.retry_delays):
+                registry.increment("enrichment.retries")
+                self.schedule(call_id, attempt + 1, self.retry_delays[attempt])
+            else:
+                with self._lock:
+                    self._scheduled.discard(call_id)
+                    registry.set_gauge("enrichment.scheduled", len(self._scheduled))
+
+    async def enrich(self, call_id: str, attempt: int = 0) -> bool:
+        """One attempt; returns whether the call needs no further attempts"""
+        call = await asyncio.to_thread(self._load, call_id)
+        if call is None or not call.vapi_id:
+            return True
+        if is_enriched(call):
+            await asyncio.to_thread(self._store, call_id, None)
+            return True
+
+        data = await self.fetch(call.vapi_id)
+        registry.increment("enrichment.fetched")
+        ready = artifacts_ready(data)
+        if ready or attempt >= len(self.retry_delays):
+            await asyncio.to_thread(self._store, call_id, data)
+            registry.increment("enrichment.completed" if ready else "enrichment.incomplete")
+            return True
+        return False
+
+    def _load(self, call_id: str) -> Optional[Call]:
+        db = self.session_factory()
+        try:
+            call = db.get(Call, call_id)
+            if call is not None:
+                db.expunge(call)
+            return call
+        finally:
+            db.close()
+
+    def _store(self, call_id: str, data: Optional[dict]):
+        db = self.session_factory()
+        try:
+            call = db.get(Call, call_id)
+            if call is None:
+                return
+            if data is not None:
+                apply_vapi_call(call, data)
+            call.enriched_at = datetime.utcnow()
+            db.commit()
+        finally:
+            db.close()
+
+    def sweep(self, db, now: Optional[datetime] = None) -> int:
+        """Schedule recently ended calls that were never enriched, e.g. after a restart"""
+        since = (now or datetime.utcnow()) - SWEEP_WINDOW
+        call_ids = [
+            call_id for (call_id,) in db.query(Call.id).filter(
+                Call.enriched_at.is_(None), Call.vapi_id.isnot(None), Call.ended_at >= since
+            )
+        ]
+        for call_id in call_ids:
+            self.schedule(call_id)
+        return len(call_ids)
+
+
+enricher = CallEnricher()
@@ -0,0 +1,228 @@
+"""
+Streaming export of call history for BI tooling.
+
+Rows are read through a server-side cursor in fixed-size chunks and encoded
+incrementally as Parquet, Arrow IPC or CSV, so memory use is bounded by the
+chunk size rather than by how many calls a user has.
+"""
+
+import csv
+import io
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from sqlalchemy import and_, select
+
+from database import Call
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, CSV export works without it
+    pa = None
+
+# Columns that may be exported, in their default output order
+EXPORT_COLUMNS = [
+    "id",
+    "vapi_id",
+    "agent_id",
+    "phone_number_id",
+    "phone_number",
+    "customer_number",
+    "direction",
+    "type",
+    "status",
+    "duration",
+    "cost",
+    "recording_url",
+    "transcript",
+    "ended_reason",
+    "started_at",
+    "ended_at",
+    "created_at",
+    "updated_at",
+]
+
+# Transcripts are large, so they are only exported when explicitly requested
+DEFAULT_COLUMNS = [column for column in EXPORT_COLUMNS if column != "transcript"]
+
+EXPORT_FORMATS = {
+    "parquet": {"media_type": "application/vnd.apache.parquet", "extension": "parquet"},
+    "arrow": {"media_type": "application/vnd.apache.arrow.stream", "extension": "arrow"},
+    "csv": {"media_type": "text/csv", "extension": "csv"},
+}
+
+DEFAULT_CHUNK_SIZE = 5000
+
+_INTEGER_COLUMNS = {"duration"}
+_FLOAT_COLUMNS = {"cost"}
+_TIMESTAMP_COLUMNS = {"started_at", "ended_at", "created_at", "updated_at"}
+
+
+def parse_columns(columns: Optional[str]) -> List[str]:
+    """Parse a comma separated column list, raising ValueError on unknown names"""
+    if not columns:
+        return list(DEFAULT_COLUMNS)
+
+    selected = [column.strip() for column in columns.split(",") if column.strip()]
+    unknown = [column for column in selected if column not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown export columns: {', '.join(unknown)}")
+    if not selected:
+        raise ValueError("At least one export column is required")
+    return selected
+
+
+def check_format(export_format: str):
+    """Raise ValueError if the format is unknown or its encoder is unavailable"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}. Supported formats: {', '.join(EXPORT_FORMATS)}")
+    if export_format != "csv" and pa is None:
+        raise ValueError(f"{export_format} export requires pyarrow; use format=csv instead")
+
+
+def build_export_query(user_id: str, columns: List[str], start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Select only the requested columns for a user's calls, oldest first"""
+    conditions = [Call.user_id == user_id]
+    if start:
+        conditions.append(Call.created_at >= start)
+    if end:
+        conditions.append(Call.created_at < end)
+
+    return (
+        select(*[getattr(Call, column) for column in columns])
+        .where(and_(*conditions))
+        .order_by(Call.created_at, Call.id)
+    )
+
+
+def iter_call_chunks(
+    engine,
+    user_id: str,
+    columns: List[str],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[list]:
+    """Yield lists of row tuples using a server-side cursor"""
+    query = build_export_query(user_id, columns, start, end)
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+        for partition in result.partitions(chunk_size):
+            yield partition
+
+
+def _to_float(value):
+    # Call.cost is stored as a string
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _arrow_schema(columns: List[str]):
+    fields = []
+    for column in columns:
+        if column in _INTEGER_COLUMNS:
+            fields.append(pa.field(column, pa.int64()))
+        elif column in _FLOAT_COLUMNS:
+            fields.append(pa.field(column, pa.float64()))
+        elif column in _TIMESTAMP_COLUMNS:
+            fields.append(pa.field(column, pa.timestamp("us")))
+        else:
+            fields.append(pa.field(column, pa.string()))
+    return pa.schema(fields)
+
+
+def _chunk_to_record_batch(chunk: list, columns: List[str], schema):
+    arrays = []
+    for index, column in enumerate(columns):
+        values = [row[index] for row in chunk]
+        if column in _FLOAT_COLUMNS:
+            values = [_to_float(value) for value in values]
+        arrays.append(pa.array(values, type=schema.field(column).type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _ChunkSink:
+    """Minimal writable file that hands written bytes back to the caller"""
+
+    def __init__(self):
+        self.buffer = []
+        self.closed = False
+
+    def write(self, data):
+        self.buffer.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.buffer)
+        self.buffer = []
+        return data
+
+
+def _encode_csv(chunks: Iterator[list], columns: List[str]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode("utf-8")
+
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        for row in chunk:
+            writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _encode_arrow(chunks: Iterator[list], columns: List[str], export_format: str) -> Iterator[bytes]:
+    schema = _arrow_schema(columns)
+    sink = _ChunkSink()
+    if export_format == "parquet":
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    else:
+        writer = pa_ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+
+    try:
+        for chunk in chunks:
+            batch = _chunk_to_record_batch(chunk, columns, schema)
+            if export_format == "parquet":
+                # Each chunk becomes its own row group
+                writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                writer.write_batch(batch)
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def export_calls(
+    engine,
+    user_id: str,
+    export_format: str = "parquet",
+    columns: Optional[List[str]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[bytes]:
+    """Stream a user's calls encoded in the requested format"""
+    check_format(export_format)
+    columns = columns or list(DEFAULT_COLUMNS)
+    chunks = iter_call_chunks(engine, user_id, columns, start, end, chunk_size)
+
+    if export_format == "csv":
+        return _encode_csv(chunks, columns)
+    return _encode_arrow(chunks, columns, export_format)
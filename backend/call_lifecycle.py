@@ -0,0 +1,63 @@
+"""
+Call lifecycle state machine for webhook events.
+
+VAPI can deliver events out of order, e.g. a late ``status-update:
+in-progress`` after ``hang``. A call only moves forward through
+
+    queued -> ringing -> in-progress -> ended
+
+and every terminal status (ended, completed, failed, ...) is the last stage.
+An event that would move a call backwards, repeat its current status, or is
+older than the last event applied to it is stale and is rejected before
+anything is written. Each accepted lifecycle event bumps the call's
+``event_seq``, a per-call version clients can use to order what they see.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+QUEUED, RINGING, IN_PROGRESS, ENDED = range(4)
+
+STAGES = {
+    "initiated": QUEUED,  # Test calls as stored before VAPI reports on them
+    "scheduled": QUEUED,
+    "queued": QUEUED,
+    "ringing": RINGING,
+    "in-progress": IN_PROGRESS,
+    "forwarding": IN_PROGRESS,
+    "speaking": IN_PROGRESS,
+}
+
+
+def stage(status: Optional[str]) -> int:
+    """Lifecycle stage of a status; anything past in-progress is terminal"""
+    if status is None:
+        return QUEUED
+    return STAGES.get(status, ENDED)
+
+
+def accepts(call, status: Optional[str], event_at: Optional[datetime], final: bool = False) -> bool:
+    """Whether a lifecycle event moving ``call`` to ``status`` should be applied.
+
+    ``final`` marks end-of-call events, which may follow a terminal status to
+    fill in cost, duration and recording, as long as they are not older than
+    what was already applied.
+    """
+    if event_at is not None and call.last_event_at is not None and event_at < call.last_event_at:
+        return False
+
+    current = stage(call.status)
+    target = ENDED if final else stage(status)
+    if target < current or (current == ENDED and not final):
+        return False
+    if target == current and not final:
+        # Same stage: only a genuine status change (e.g. in-progress -> forwarding) is worth a write
+        return status is not None and status != call.status
+    return True
+
+
+def advance(call, event_at: Optional[datetime]):
+    """Record that a lifecycle event was applied to the call"""
+    call.event_seq = (call.event_seq or 0) + 1
+    if event_at is not None and (call.last_event_at is None or event_at > call.last_event_at):
+        call.last_event_at = event_at
@@ -0,0 +1,278 @@
+"""
+Concurrent-call limits for outbound dialing.
+
+Carrier numbers and the VAPI org can only carry so many calls at once; past
+that, placements fail upstream. ``limiter`` keeps an in-memory count of live
+calls per phone number, agent and user, plus one org-wide count, and checks
+every outbound placement against ``LIMITS`` before it reaches VAPI:
+
+- admit: every count is under its limit; a slot is reserved right away;
+- queue: something is full, but fewer than ``MAX_QUEUED`` placements are
+  waiting: the request waits up to ``QUEUE_TIMEOUT`` for a slot;
+- reject: the wait queue is full, or the wait timed out.
+
+Counts follow the calls themselves: a placement's reservation is bound to
+its call, and the webhook pipeline reports calls going live (inbound ones
+included, which count but are never refused) and ending. Calls with no end
+event are forgotten after ``STALE_AFTER`` so a lost webhook can't hold a slot
+forever. ``seed`` rebuilds the counts from the database at startup.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional, Tuple
+
+import call_lifecycle
+from database import Call
+from metrics import registry
+
+LIMITS = {
+    "org": int(os.getenv("CALL_LIMIT_ORG", "10")),  # VAPI org concurrency
+    "user": int(os.getenv("CALL_LIMIT_PER_USER", "10")),
+    "agent": int(os.getenv("CALL_LIMIT_PER_AGENT", "10")),
+    "phone": int(os.getenv("CALL_LIMIT_PER_PHONE", "5")),
+}
+QUEUE_TIMEOUT = float(os.getenv("CALL_LIMIT_QUEUE_TIMEOUT", "30"))  # seconds
+MAX_QUEUED = int(os.getenv("CALL_LIMIT_MAX_QUEUED", "20"))
+STALE_AFTER = 2 * 60 * 60  # seconds
+
+Key = Tuple[str, str]  # (scope, id)
+
+
+class CallCapacityExceeded(Exception):
+    """No slot for the placement: the limit is reached and it can't wait"""
+
+    def __init__(self, scope: str, reason: str):
+        super().__init__(f"Concurrent call limit reached for {scope} ({reason})")
+        self.scope = scope
+
+
+def call_keys(user_id: str, agent_id: Optional[str] = None, phone_number_id: Optional[str] = None) -> List[Key]:
+    keys = [("org", "vapi"), ("user", user_id)]
+    if agent_id:
+        keys.append(("agent", agent_id))
+    if phone_number_id:
+        keys.append(("phone", phone_number_id))
+    return keys
+
+
+class _Waiter:
+    __slots__ = ("keys", "future", "loop", "token")
+
+    def __init__(self, keys: List[Key], future: asyncio.Future, loop: asyncio.AbstractEventLoop):
+        self.keys = keys
+        self.future = future
+        self.loop = loop
+        self.token: Optional[str] = None
+
+
+class CallLimiter:
+    def __init__(self, limits: Optional[Dict[str, int]] = None, queue_timeout: float = QUEUE_TIMEOUT,
+                 max_queued: int = MAX_QUEUED, stale_after: float = STALE_AFTER, clock=time.monotonic):
+        self.limits = dict(limits or LIMITS)
+        self.queue_timeout = queue_timeout
+        self.max_queued = max_queued
+        self.stale_after = stale_after
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._active: Dict[str, Tuple[List[Key], float]] = {}  # call id or reservation token -> (keys, since)
+        self._counts: Dict[Key, int] = {}
+        self._waiters: Deque[_Waiter] = deque()
+
+    # Bookkeeping; callers hold the lock
+
+    def _fits(self, keys: List[Key]) -> Optional[str]:
+        """Scope of the first full count, or None if the call fits"""
+        for key in keys:
+            if self._counts.get(key, 0) >= self.limits.get(key[0], float("inf")):
+                return key[0]
+        return None
+
+    def _add(self, entry_id: str, keys: List[Key]):
+        self._active[entry_id] = (keys, self.clock())
+        for key in keys:
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def _remove(self, entry_id: str) -> bool:
+        entry = self._active.pop(entry_id, None)
+        if entry is None:
+            return False
+        for key in entry[0]:
+            remaining = self._counts.get(key, 0) - 1
+            if remaining > 0:
+                self._counts[key] = remaining
+            else:
+                self._counts.pop(key, None)
+        return True
+
+    def _expire(self):
+        cutoff = self.clock() - self.stale_after
+        for entry_id in [entry_id for entry_id, (_, since) in self._active.items() if since < cutoff]:
+            self._remove(entry_id)
+            registry.increment("call_limits.expired")
+
+    def _wake(self):
+        """Hand freed slots to waiting placements, oldest first"""
+        for waiter in list(self._waiters):
+            if self._fits(waiter.keys) is not None:
+                continue
+            self._waiters.remove(waiter)
+            waiter.token = f"reservation:{uuid.uuid4()}"
+            self._add(waiter.token, waiter.keys)
+            try:
+                waiter.loop.call_soon_threadsafe(_resolve, waiter.future, waiter.token)
+            except RuntimeError:
+                # The waiter's loop has shut down
+                self._remove(waiter.token)
+        registry.set_gauge("call_limits.queued", len(self._waiters))
+
+    # Placement
+
+    def try_acquire(self, keys: List[Key]) -> Optional[str]:
+        """Reserve a slot without waiting; a reservation token, or None if full"""
+        with self._lock:
+            self._expire()
+            # Placements waiting in line go first
+            if self._fits(keys) is not None or self._waiters:
+                registry.increment("call_limits.deferred")
+                return None
+            token = f"reservation:{uuid.uuid4()}"
+            self._add(token, keys)
+        registry.increment("call_limits.admitted")
+        return token
+
+    async def acquire(self, keys: List[Key], timeout: Optional[float] = None) -> str:
+        """Reserve a slot, waiting in line if needed; raises ``CallCapacityExceeded``"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._expire()
+            full = self._fits(keys)
+            # Waiting placements go first, so a burst can't starve them
+            if full is None and not self._waiters:
+                token = f"reservation:{uuid.uuid4()}"
+                self._add(token, keys)
+                registry.increment("call_limits.admitted")
+                return token
+            if len(self._waiters) >= self.max_queued:
+                registry.increment("call_limits.rejected")
+                raise CallCapacityExceeded(full or "queue", "too many calls waiting")
+            waiter = _Waiter(keys, loop.create_future(), loop)
+            self._waiters.append(waiter)
+            self._wake()
+        registry.increment("call_limits.queued_total")
+
+        started = time.perf_counter()
+        try:
+            token = await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout if timeout is None else timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    registry.set_gauge("call_limits.queued", len(self._waiters))
+                elif waiter.token is not None:
+                    # Granted just as we gave up
+                    self._remove(waiter.token)
+                    self._wake()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            registry.increment("call_limits.rejected")
+            raise CallCapacityExceeded(self._fits(keys) or "queue", "timed out waiting for a free slot")
+        registry.observe("call_limits.wait", time.perf_counter() - started)
+        registry.increment("call_limits.admitted")
+        return token
+
+    def bind(self, token: str, call_id: str):
+        """The reserved placement became ``call_id``"""
+        with self._lock:
+            entry = self._active.pop(token, None)
+            if entry is None:
+                return
+            if call_id in self._active:
+                # Its webhook got here first and already counted it
+                self._active[token] = entry
+                self._remove(token)
+                self._wake()
+            else:
+                self._active[call_id] = entry
+
+    def release(self, token: str):
+        """Give back a reservation whose placement failed"""
+        with self._lock:
+            if self._remove(token):
+                self._wake()
+
+    # Webhook-driven tracking; safe to call from any thread
+
+    def started(self, call_id: str, keys: List[Key]):
+        with self._lock:
+            if call_id not in self._active:
+                self._add(call_id, keys)
+
+    def ended(self, call_id: str):
+        with self._lock:
+            if self._remove(call_id):
+                self._wake()
+
+    def seed(self, db, now: Optional[datetime] = None) -> int:
+        """Count the calls that are live according to the database"""
+        now = now or datetime.utcnow()
+        live = [status for status, stage in call_lifecycle.STAGES.items() if stage < call_lifecycle.ENDED]
+        calls = (
+            db.query(Call.id, Call.user_id, Call.agent_id, Call.phone_number_id)
+            .filter(Call.status.in_(live), Call.updated_at >= now - timedelta(seconds=self.stale_after))
+            .all()
+        )
+        for call_id, user_id, agent_id, phone_number_id in calls:
+            self.started(call_id, call_keys(user_id, agent_id, phone_number_id))
+        return len(calls)
+
+    def utilization(self, user_id: Optional[str] = None) -> dict:
+        """Active calls against limits, for one user's agents and numbers or everything"""
+        with self._lock:
+            self._expire()
+            scoped = set()
+            if user_id is not None:
+                for keys, _ in self._active.values():
+                    if ("user", user_id) in keys:
+                        scoped.update(keys)
+            by_scope: Dict[str, dict] = {scope: {} for scope in self.limits}
+            for key, count in self._counts.items():
+                scope, key_id = key
+                if user_id is not None and key not in scoped and scope != "org":
+                    continue
+                limit = self.limits.get(scope)
+                by_scope.setdefault(scope, {})[key_id] = {
+                    "active": count,
+                    "limit": limit,
+                    "utilization": round(count / limit, 3) if limit else None,
+                }
+            queued = sum(1 for waiter in self._waiters if user_id is None or ("user", user_id) in waiter.keys)
+        return {"limits": self.limits, "queued": queued, "max_queued": self.max_queued, **by_scope}
+
+    def totals(self) -> dict:
+        """Aggregate counts with no user, agent or number ids, for unauthenticated health checks"""
+        with self._lock:
+            self._expire()
+            by_scope = {scope: {"keys": 0, "active": 0, "at_limit": 0} for scope in self.limits}
+            for (scope, _), count in self._counts.items():
+                totals = by_scope.setdefault(scope, {"keys": 0, "active": 0, "at_limit": 0})
+                totals["keys"] += 1
+                totals["active"] += count
+                limit = self.limits.get(scope)
+                if limit and count >= limit:
+                    totals["at_limit"] += 1
+            return {"limits": self.limits, "active_calls": len(self._active), "queued": len(self._waiters),
+                    "max_queued": self.max_queued, "by_scope": by_scope}
+
+
+def _resolve(future: asyncio.Future, token: str):
+    if not future.done():
+        future.set_result(token)
+
+
+limiter = CallLimiter()
@@ -0,0 +1,243 @@
+"""
+Queued calls, indexed per phone number, agent and user.
+
+``index`` holds every call in the queued lifecycle stage (queued, scheduled,
+initiated). The webhook pipeline, ``POST /calls``, agent test calls and the
+campaign dialer report calls entering and leaving that stage, so
+``/calls/queues`` reads an in-memory structure instead of syncing from VAPI.
+
+Each ``CallQueue`` keeps two sorted lists:
+
+- service order, ``(-priority, enqueued_at, seq)``: a call's position is a
+  binary search;
+- enqueue times: the oldest wait is the first element, the average comes
+  from a running sum, and wait percentiles are a single index.
+
+Length, oldest wait, average wait and percentiles are O(1); a position is
+O(log n). Inserts and removals binary-search too, then shift list memory,
+which is cheap at queue sizes. Waits of calls that have left the queue are recorded in a
+``metrics.Timing`` per queue. Every report of a call still being queued
+refreshes its last-seen time, and calls not seen for ``MAX_QUEUE_AGE`` are
+dropped when read.
+"""
+
+import bisect
+import heapq
+import itertools
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import call_lifecycle
+from database import Call
+from metrics import Timing, registry
+
+NORMAL_PRIORITY = 0
+CAMPAIGN_PRIORITY = -1  # Bulk dialing yields to calls placed by hand
+MAX_QUEUE_AGE = timedelta(hours=1)
+PERCENTILES = (50, 90, 99)
+
+Key = Tuple[str, str]  # (scope, id)
+
+
+def _epoch(moment: datetime) -> float:
+    return (moment - datetime(1970, 1, 1)).total_seconds()
+
+
+def is_queued(status: Optional[str]) -> bool:
+    return call_lifecycle.stage(status) == call_lifecycle.QUEUED
+
+
+class CallQueue:
+    def __init__(self):
+        self._order: List[tuple] = []  # (-priority, enqueued_at, seq, call_id), in service order
+        self._times: List[Tuple[float, int, str]] = []  # (enqueued_at, seq, call_id), oldest first
+        self._keys: Dict[str, tuple] = {}  # call id -> its _order entry
+        self._total = 0.0  # Sum of enqueue times, for the average wait
+        self.waits = Timing()  # Completed waits
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, call_id: str) -> bool:
+        return call_id in self._keys
+
+    def add(self, call_id: str, enqueued_at: float, priority: int, seq: int):
+        entry = (-priority, enqueued_at, seq, call_id)
+        bisect.insort(self._order, entry)
+        bisect.insort(self._times, (enqueued_at, seq, call_id))
+        self._keys[call_id] = entry
+        self._total += enqueued_at
+
+    def remove(self, call_id: str, now: Optional[float] = None) -> Optional[float]:
+        """Take a call out; returns how long it waited, recorded if ``now`` is given"""
+        entry = self._keys.pop(call_id, None)
+        if entry is None:
+            return None
+        _, enqueued_at, seq, _ = entry
+        del self._order[bisect.bisect_left(self._order, entry)]
+        del self._times[bisect.bisect_left(self._times, (enqueued_at, seq, call_id))]
+        self._total -= enqueued_at
+        if now is None:
+            return None
+        wait = max(0.0, now - enqueued_at)
+        self.waits.observe(wait)
+        return wait
+
+    def position(self, call_id: str) -> Optional[int]:
+        """1-based place in service order"""
+        entry = self._keys.get(call_id)
+        if entry is None:
+            return None
+        return bisect.bisect_left(self._order, entry) + 1
+
+    def oldest(self) -> Optional[Tuple[float, str]]:
+        """(enqueued at, call id) of the longest-waiting call"""
+        return (self._times[0][0], self._times[0][2]) if self._times else None
+
+    def calls(self) -> List[Tuple[str, float, int]]:
+        """(call id, enqueued at, priority) in service order"""
+        return [(call_id, enqueued_at, -negated) for negated, enqueued_at, _, call_id in self._order]
+
+    def stats(self, now: float) -> dict:
+        length = len(self._times)
+        if not length:
+            return {"length": 0, "oldest_wait_seconds": 0.0, "average_wait_seconds": 0.0,
+                    "total_wait_seconds": 0.0, "completed_waits": self.waits.snapshot()}
+        total_wait = now * length - self._total
+        stats = {
+            "length": length,
+            "oldest_wait_seconds": round(now - self._times[0][0], 3),
+            "average_wait_seconds": round(total_wait / length, 3),
+            "total_wait_seconds": round(total_wait, 3),
+        }
+        # Nearest rank: the k-th shortest wait is the k-th latest enqueue time
+        for percentile in PERCENTILES:
+            rank = max(1, math.ceil(percentile / 100 * length))
+            stats[f"p{percentile}_wait_seconds"] = round(now - self._times[length - rank][0], 3)
+        stats["completed_waits"] = self.waits.snapshot()
+        return stats
+
+
+class CallQueueIndex:
+    def __init__(self, max_age: timedelta = MAX_QUEUE_AGE, clock=time.time):
+        self.max_age = max_age.total_seconds()
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._queues: Dict[Key, CallQueue] = {}
+        self._calls: Dict[str, List[Key]] = {}  # call id -> queues it is in
+        self._seq = itertools.count()
+        self._seen: Dict[str, float] = {}  # call id -> when it was last reported queued
+        # (last seen, call id), least recently seen first, so expiry only looks at the front.
+        # A call seen again gets a new entry; the superseded one is skipped when it comes up.
+        self._expiry: List[Tuple[float, str]] = []
+
+    def enqueue(self, call_id: str, user_id: str, agent_id: Optional[str] = None, phone_number_id: Optional[str] = None,
+                enqueued_at: Optional[datetime] = None, priority: int = NORMAL_PRIORITY,
+                seen_at: Optional[datetime] = None):
+        """Add a queued call; a call already in the queue keeps its place but counts as seen again"""
+        at = _epoch(enqueued_at) if enqueued_at else self.clock()
+        seen = _epoch(seen_at) if seen_at else self.clock()
+        keys = [("user", user_id)]
+        if agent_id:
+            keys.append(("agent", agent_id))
+        if phone_number_id:
+            keys.append(("phone", phone_number_id))
+        with self._lock:
+            if call_id not in self._calls:
+                seq = next(self._seq)
+                for key in keys:
+                    self._queues.setdefault(key, CallQueue()).add(call_id, at, priority, seq)
+                self._calls[call_id] = keys
+                registry.set_gauge("call_queues.queued", len(self._calls))
+            if seen > self._seen.get(call_id, float("-inf")):
+                self._seen[call_id] = seen
+                heapq.heappush(self._expiry, (seen, call_id))
+
+    def dequeue(self, call_id: str) -> Optional[float]:
+        """The call left the queued stage; returns how long it waited"""
+        with self._lock:
+            wait = self._remove(call_id, self.clock())
+            registry.set_gauge("call_queues.queued", len(self._calls))
+        if wait is not None:
+            registry.observe("call_queues.wait", wait)
+        return wait
+
+    def _remove(self, call_id: str, now: Optional[float]) -> Optional[float]:
+        keys = self._calls.pop(call_id, None)
+        if keys is None:
+            return None
+        self._seen.pop(call_id, None)
+        wait = None
+        for key in keys:
+            queue = self._queues[key]
+            waited = queue.remove(call_id, now)
+            if key[0] == "user":
+                wait = waited
+            if not len(queue) and not queue.waits.count:
+                del self._queues[key]
+        return wait
+
+    def _expire(self, now: float):
+        cutoff = now - self.max_age
+        while self._expiry and self._expiry[0][0] < cutoff:
+            seen, call_id = heapq.heappop(self._expiry)
+            if self._seen.get(call_id) != seen:
+                continue  # Seen again since, or already gone
+            # Not recorded as a wait: we don't know when it actually left the queue
+            self._remove(call_id, None)
+            registry.increment("call_queues.expired")
+
+    def track(self, call: Call, priority: int = NORMAL_PRIORITY, seen_at: Optional[datetime] = None):
+        """Enqueue or dequeue a call according to its current status"""
+        if is_queued(call.status):
+            self.enqueue(call.id, call.user_id, call.agent_id, call.phone_number_id,
+                         call.created_at or call.started_at, priority, seen_at)
+        else:
+            self.dequeue(call.id)
+
+    def seed(self, db, now: Optional[datetime] = None) -> int:
+        """Load the calls the database says are queued"""
+        now = now or datetime.utcnow()
+        queued = [status for status, stage in call_lifecycle.STAGES.items() if stage == call_lifecycle.QUEUED]
+        calls = db.query(Call).filter(Call.status.in_(queued), Call.updated_at >= now - timedelta(seconds=self.max_age)).all()
+        for call in calls:
+            # Last seen when the database last heard about it, not now
+            self.track(call, seen_at=call.updated_at)
+        return len(calls)
+
+    def user_queue(self, user_id: str) -> List[dict]:
+        """A user's queued calls in service order"""
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            queue = self._queues.get(("user", user_id))
+            if queue is None:
+                return []
+            return [
+                {"call_id": call_id, "position": position, "priority": priority,
+                 "enqueued_at": datetime.utcfromtimestamp(enqueued_at).isoformat(),
+                 "wait_seconds": round(now - enqueued_at, 3)}
+                for position, (call_id, enqueued_at, priority) in enumerate(queue.calls(), start=1)
+            ]
+
+    def stats(self, user_id: str, agent_ids: List[str], phone_number_ids: List[str]) -> dict:
+        """Queue statistics for a user overall and for each of their agents and numbers"""
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            empty = CallQueue()
+
+            def queue_stats(key: Key) -> dict:
+                return self._queues.get(key, empty).stats(now)
+
+            return {
+                "user": queue_stats(("user", user_id)),
+                "by_agent": {agent_id: queue_stats(("agent", agent_id)) for agent_id in agent_ids},
+                "by_phone_number": {phone_id: queue_stats(("phone", phone_id)) for phone_id in phone_number_ids},
+            }
+
+
+index = CallQueueIndex()
@@ -0,0 +1,540 @@
+"""
+Bulk outbound calling campaigns.
+
+A campaign is an uploaded contact list (CSV or JSON) dialed with one agent
+from one phone number. Numbers are validated and normalized to E.164 when
+the list is uploaded, and every contact is stored as a row in
+``campaign_contacts``, which is the dialer's persistent queue: a restart
+picks up where it left off.
+
+``CampaignDialer`` ticks every ``TICK`` seconds. For each running campaign it
+places as many calls as both limits allow:
+
+- ``max_concurrent``: calls placed and not yet ended (contacts in
+  ``dialing`` or ``in_progress``);
+- ``calls_per_minute``: a token bucket that refills continuously and holds at
+  most one tick's worth, so placements are spread out instead of bursting;
+- the shared concurrent-call limits of ``call_limits``, without waiting.
+
+A contact's call counts as in flight until the webhook pipeline moves the
+local call to a terminal status (or ``CALL_TIMEOUT`` passes without one).
+Placements VAPI rejects with 429 or 5xx, or that fail to reach it, are
+retried up to ``MAX_ATTEMPTS`` times; other errors fail the contact.
+
+The local call is recorded with the claim, before VAPI is asked to place it,
+so after a restart ``recover`` can tell a placement that went through from one
+that didn't instead of dialing every interrupted contact again. Database work
+runs in a thread; only the VAPI requests run on the event loop.
+"""
+
+import asyncio
+import csv
+import io
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import phonenumbers
+from phonenumbers import NumberParseException
+from sqlalchemy import func, insert
+
+import call_lifecycle
+import call_queues
+from call_limits import call_keys, limiter
+from database import Agent, Call, Campaign, CampaignContact, PhoneNumber
+from metrics import registry
+
+MAX_CONTACTS = int(os.getenv("CAMPAIGN_MAX_CONTACTS", "10000"))
+MAX_CONCURRENT = int(os.getenv("CAMPAIGN_MAX_CONCURRENT", "10"))  # Upper bound for a campaign's setting
+MAX_CALLS_PER_MINUTE = 60
+TICK = float(os.getenv("CAMPAIGN_TICK", "1"))  # seconds
+MAX_ATTEMPTS = 3
+RETRY_DELAY = timedelta(minutes=2)  # Multiplied by the attempt number
+CALL_TIMEOUT = timedelta(hours=1)  # In-flight calls with no end event are given up on after this
+PLACEMENT_GRACE = timedelta(minutes=2)  # How long an interrupted placement's webhook is waited for
+NUMBER_COLUMNS = ("customer_number", "number", "phone", "phone_number")
+NAME_COLUMNS = ("name", "customer_name")
+
+IN_FLIGHT = ("dialing", "in_progress")
+STATUSES = ("pending", "dialing", "in_progress", "completed", "failed", "cancelled")
+
+Place = Callable[[dict], Awaitable[dict]]
+
+
+class Claim(NamedTuple):
+    """Contacts claimed in one campaign, with their recorded calls and call-limit slots"""
+    campaign_id: str
+    contact_ids: List[int]
+    call_ids: List[str]
+    slots: List[str]
+    payloads: List[dict]
+
+
+class ContactListError(ValueError):
+    """The uploaded contact list can't be read"""
+
+
+def parse_contacts(content: bytes, filename: str = "") -> List[dict]:
+    """Rows of ``{"number", "name"}`` from a CSV or JSON upload.
+
+    JSON is a list of numbers or of objects with a number field. CSV has a
+    header naming the number column, or the number in the first column and
+    optionally a name in the second.
+    """
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ContactListError("Contact list must be UTF-8 text")
+
+    if filename.lower().endswith(".json") or text.lstrip().startswith("["):
+        try:
+            items = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ContactListError(f"Invalid JSON: {e}")
+        if not isinstance(items, list):
+            raise ContactListError("JSON contact list must be an array")
+        rows = []
+        for item in items:
+            if isinstance(item, dict):
+                number = next((item[key] for key in NUMBER_COLUMNS if item.get(key)), "")
+                name = next((item[key] for key in NAME_COLUMNS if item.get(key)), None)
+                rows.append({"number": str(number), "name": name})
+            else:
+                rows.append({"number": str(item), "name": None})
+        return rows
+
+    reader = csv.reader(io.StringIO(text))
+    first = next(reader, None)
+    if first is None:
+        return []
+    header = [cell.strip().lower() for cell in first]
+    number_column = next((header.index(key) for key in NUMBER_COLUMNS if key in header), None)
+    if number_column is None:
+        # No header: number, then optional name
+        number_column, name_column = 0, 1
+        records = [first]
+    else:
+        name_column = next((header.index(key) for key in NAME_COLUMNS if key in header), None)
+        records = []
+
+    rows = []
+    for record in (records + list(reader)):
+        if not any(cell.strip() for cell in record):
+            continue
+        number = record[number_column].strip() if number_column < len(record) else ""
+        name = record[name_column].strip() if name_column is not None and name_column < len(record) else None
+        rows.append({"number": number, "name": name or None})
+    return rows
+
+
+def normalize_contacts(rows: List[dict], default_region: str = "US") -> Tuple[List[dict], List[dict], int]:
+    """(valid contacts in E.164, invalid rows with reasons, duplicates dropped)"""
+    valid, invalid, seen = [], [], set()
+    duplicates = 0
+    for index, row in enumerate(rows, start=1):
+        raw = row["number"]
+        try:
+            parsed = phonenumbers.parse(raw, None if raw.startswith("+") else default_region)
+        except NumberParseException:
+            invalid.append({"row": index, "number": raw, "error": "Unable to parse phone number"})
+            continue
+        if not phonenumbers.is_valid_number(parsed):
+            invalid.append({"row": index, "number": raw, "error": "Invalid phone number"})
+            continue
+        number = phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+        if number in seen:
+            duplicates += 1
+            continue
+        seen.add(number)
+        valid.append({"customer_number": number, "name": row.get("name")})
+    return valid, invalid, duplicates
+
+
+def create_campaign(db, user_id: str, name: str, agent_id: str, phone_number_id: str, contacts: List[dict],
+                    max_concurrent: int = 2, calls_per_minute: int = 10) -> Campaign:
+    campaign = Campaign(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        name=name,
+        agent_id=agent_id,
+        phone_number_id=phone_number_id,
+        status="draft",
+        max_concurrent=max_concurrent,
+        calls_per_minute=calls_per_minute,
+        created_at=datetime.utcnow(),
+    )
+    db.add(campaign)
+    now = datetime.utcnow()
+    if contacts:
+        db.execute(insert(CampaignContact), [
+            {**contact, "campaign_id": campaign.id, "status": "pending", "attempts": 0, "next_attempt_at": now}
+            for contact in contacts
+        ])
+    db.commit()
+    db.refresh(campaign)
+    return campaign
+
+
+def progress(db, campaign_ids: List[str]) -> Dict[str, dict]:
+    """Contact counts per status for each campaign"""
+    counts = {campaign_id: {status: 0 for status in STATUSES} for campaign_id in campaign_ids}
+    if not campaign_ids:
+        return counts
+    rows = (
+        db.query(CampaignContact.campaign_id, CampaignContact.status, func.count(CampaignContact.id))
+        .filter(CampaignContact.campaign_id.in_(campaign_ids))
+        .group_by(CampaignContact.campaign_id, CampaignContact.status)
+        .all()
+    )
+    for campaign_id, status, count in rows:
+        counts[campaign_id][status] = count
+    for campaign_counts in counts.values():
+        total = sum(campaign_counts.values())
+        done = campaign_counts["completed"] + campaign_counts["failed"] + campaign_counts["cancelled"]
+        campaign_counts["total"] = total
+        campaign_counts["percent_done"] = round(100.0 * done / total, 1) if total else 100.0
+    return counts
+
+
+def campaign_dict(campaign: Campaign, counts: dict) -> dict:
+    return {
+        "id": campaign.id,
+        "name": campaign.name,
+        "agent_id": campaign.agent_id,
+        "phone_number_id": campaign.phone_number_id,
+        "status": campaign.status,
+        "max_concurrent": campaign.max_concurrent,
+        "calls_per_minute": campaign.calls_per_minute,
+        "created_at": campaign.created_at.isoformat() if campaign.created_at else None,
+        "started_at": campaign.started_at.isoformat() if campaign.started_at else None,
+        "completed_at": campaign.completed_at.isoformat() if campaign.completed_at else None,
+        "progress": counts,
+    }
+
+
+def cancel_pending(db, campaign_id: str) -> int:
+    """Drop contacts not yet dialed; calls in flight are left to finish"""
+    return (
+        db.query(CampaignContact)
+        .filter(CampaignContact.campaign_id == campaign_id, CampaignContact.status == "pending")
+        .update({CampaignContact.status: "cancelled", CampaignContact.finished_at: datetime.utcnow()},
+                synchronize_session=False)
+    )
+
+
+def is_retryable(error: Exception) -> bool:
+    status_code = getattr(error, "status_code", None)
+    # No status code: VAPI couldn't be reached
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+class CampaignDialer:
+    """Places queued campaign calls within each campaign's concurrency and pacing limits"""
+
+    def __init__(self, tick: float = TICK):
+        self.tick_interval = tick
+        self.session_factory = None
+        self.place: Optional[Place] = None
+        self._buckets: Dict[str, Tuple[float, datetime]] = {}  # campaign id -> (tokens, refilled at)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, session_factory, place: Place):
+        self.session_factory = session_factory
+        self.place = place
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        """Wake the dialer early, e.g. right after a campaign is started"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self):
+        while True:
+            try:
+                await self.tick()
+            except Exception as e:
+                print(f"Campaign dialer error: {str(e)}")
+                registry.increment("campaigns.errors")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.tick_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def recover(self, db, now: Optional[datetime] = None) -> int:
+        """Settle contacts whose placement was interrupted by a restart"""
+        settled = self.reconcile_placements(db, now or datetime.utcnow())
+        db.commit()
+        return settled
+
+    def _allowance(self, campaign: Campaign, now: datetime) -> int:
+        rate = campaign.calls_per_minute / 60.0  # per second
+        capacity = max(1.0, rate * self.tick_interval)
+        tokens, refilled = self._buckets.get(campaign.id, (capacity, now))
+        tokens = min(capacity, tokens + max(0.0, (now - refilled).total_seconds()) * rate)
+        self._buckets[campaign.id] = (tokens, now)
+        return int(tokens)
+
+    def _spend(self, campaign_id: str, count: int):
+        tokens, refilled = self._buckets[campaign_id]
+        self._buckets[campaign_id] = (tokens - count, refilled)
+
+    def _placed_call(self, db, contact: CampaignContact) -> Optional[Call]:
+        """A call VAPI has reported for the contact since it was dialed"""
+        campaign = db.get(Campaign, contact.campaign_id)
+        if campaign is None or contact.dialed_at is None:
+            return None
+        return (
+            db.query(Call)
+            .filter(
+                Call.vapi_id.isnot(None),
+                Call.phone_number_id == campaign.phone_number_id,
+                Call.customer_number == contact.customer_number,
+                Call.direction == "outbound",
+                Call.created_at >= contact.dialed_at,
+            )
+            .order_by(Call.created_at)
+            .first()
+        )
+
+    def _drop_placeholder(self, db, call: Optional[Call]):
+        if call is None:
+            return
+        db.delete(call)
+        limiter.ended(call.id)
+        call_queues.index.dequeue(call.id)
+
+    def reconcile_placements(self, db, now: datetime) -> int:
+        """Settle contacts left in ``dialing``, whose placement may or may not have reached VAPI.
+
+        A contact's call is recorded when it is claimed, so a placement that
+        went through shows up as that call with its VAPI ID, or as a call the
+        webhook pipeline created for the same number. Only when neither
+        appears within ``PLACEMENT_GRACE`` is the contact dialed again.
+        """
+        settled = 0
+        rows = (
+            db.query(CampaignContact, Call)
+            .outerjoin(Call, Call.id == CampaignContact.call_id)
+            .filter(CampaignContact.status == "dialing")
+            .all()
+        )
+        for contact, placeholder in rows:
+            if placeholder is not None and placeholder.vapi_id:
+                call = placeholder
+            else:
+                call = self._placed_call(db, contact)
+            if call is not None:
+                # VAPI took the call: follow it instead of dialing the contact again
+                if call is not placeholder:
+                    self._drop_placeholder(db, placeholder)
+                contact.status = "in_progress"
+                contact.call_id = call.id
+                registry.increment("campaigns.placements_recovered")
+            elif contact.dialed_at and now - contact.dialed_at < PLACEMENT_GRACE:
+                continue  # Its first webhook may still be on the way
+            else:
+                self._drop_placeholder(db, placeholder)
+                contact.status = "pending"
+                contact.call_id = None
+                registry.increment("campaigns.placements_requeued")
+            settled += 1
+        return settled
+
+    def reconcile(self, db, now: datetime) -> int:
+        """Finish contacts whose call has ended"""
+        finished = 0
+        rows = (
+            db.query(CampaignContact, Call.status, Call.ended_at)
+            .outerjoin(Call, Call.id == CampaignContact.call_id)
+            .filter(CampaignContact.status == "in_progress")
+            .all()
+        )
+        for contact, call_status, ended_at in rows:
+            if call_status is not None and call_lifecycle.stage(call_status) == call_lifecycle.ENDED:
+                contact.status = "completed"
+                contact.finished_at = ended_at or now
+            elif contact.dialed_at and now - contact.dialed_at > CALL_TIMEOUT:
+                contact.status = "completed"
+                contact.finished_at = now
+                contact.last_error = "No end-of-call event received"
+            else:
+                continue
+            finished += 1
+        if finished:
+            registry.increment("campaigns.calls_finished", finished)
+        return finished
+
+    async def tick(self, now: Optional[datetime] = None) -> int:
+        """One scheduling pass; returns the number of calls placed"""
+        now = now or datetime.utcnow()
+        # Database work runs in a thread so the event loop keeps serving requests
+        claims = await asyncio.to_thread(self._claim_all, now)
+        placed = 0
+        for claim in claims:
+            results = await asyncio.gather(*(self.place(payload) for payload in claim.payloads),
+                                           return_exceptions=True)
+            placed += await asyncio.to_thread(self._record, claim, results, now)
+        return placed
+
+    def _claim_all(self, now: datetime) -> List[Claim]:
+        db = self.session_factory()
+        try:
+            self.reconcile_placements(db, now)
+            self.reconcile(db, now)
+            db.commit()
+
+            claims = []
+            for campaign in db.query(Campaign).filter(Campaign.status == "running").all():
+                claim = self._claim(db, campaign, now)
+                if claim is not None:
+                    claims.append(claim)
+            return claims
+        finally:
+            db.close()
+
+    def _claim(self, db, campaign: Campaign, now: datetime) -> Optional[Claim]:
+        counts = dict(
+            db.query(CampaignContact.status, func.count(CampaignContact.id))
+            .filter(CampaignContact.campaign_id == campaign.id, CampaignContact.status.in_(("pending",) + IN_FLIGHT))
+            .group_by(CampaignContact.status)
+            .all()
+        )
+        in_flight = sum(counts.get(status, 0) for status in IN_FLIGHT)
+        if not counts:
+            campaign.status = "completed"
+            campaign.completed_at = now
+            self._buckets.pop(campaign.id, None)
+            db.commit()
+            registry.increment("campaigns.completed")
+            return None
+
+        slots = min(campaign.max_concurrent - in_flight, self._allowance(campaign, now))
+        if slots <= 0:
+            return None
+        contacts = (
+            db.query(CampaignContact)
+            .filter(
+                CampaignContact.campaign_id == campaign.id,
+                CampaignContact.status == "pending",
+                CampaignContact.next_attempt_at <= now,
+            )
+            .order_by(CampaignContact.id)
+            .limit(slots)
+            .all()
+        )
+        if not contacts:
+            return None
+
+        agent = db.get(Agent, campaign.agent_id)
+        phone_number = db.get(PhoneNumber, campaign.phone_number_id)
+        if agent is None or phone_number is None or not phone_number.vapi_id:
+            campaign.status = "paused"
+            db.commit()
+            print(f"Paused campaign {campaign.id}: its agent or phone number is no longer available")
+            return None
+
+        # Shared concurrent-call limits for the number, agent and account
+        keys = call_keys(campaign.user_id, campaign.agent_id, campaign.phone_number_id)
+        slots = []
+        for _ in contacts:
+            slot = limiter.try_acquire(keys)
+            if slot is None:
+                break
+            slots.append(slot)
+        contacts = contacts[:len(slots)]
+        if not contacts:
+            return None
+
+        # Claim and record the call before placing it, so a crash mid-placement can be reconciled
+        calls = []
+        for contact in contacts:
+            call = Call(
+                id=str(uuid.uuid4()),
+                user_id=campaign.user_id,
+                agent_id=campaign.agent_id,
+                phone_number_id=campaign.phone_number_id,
+                phone_number=phone_number.number,
+                customer_number=contact.customer_number,
+                direction="outbound",
+                status="initiated",
+                started_at=now,
+            )
+            db.add(call)
+            calls.append(call)
+            contact.status = "dialing"
+            contact.attempts = (contact.attempts or 0) + 1
+            contact.dialed_at = now
+            contact.call_id = call.id
+        db.commit()
+        self._spend(campaign.id, len(contacts))
+
+        payloads = [
+            {
+                "customer": {"number": contact.customer_number, **({"name": contact.name} if contact.name else {})},
+                "assistantId": agent.vapi_id or agent.id,
+                "phoneNumberId": phone_number.vapi_id,
+            }
+            for contact in contacts
+        ]
+        return Claim(campaign.id, [contact.id for contact in contacts], [call.id for call in calls], slots, payloads)
+
+    def _record(self, claim: Claim, results: list, now: datetime) -> int:
+        db = self.session_factory()
+        try:
+            placed = 0
+            bound = []
+            for contact_id, call_id, slot, result in zip(claim.contact_ids, claim.call_ids, claim.slots, results):
+                contact = db.get(CampaignContact, contact_id)
+                call = db.get(Call, call_id)
+                if isinstance(result, Exception):
+                    limiter.release(slot)
+                    db.delete(call)
+                    contact.call_id = None
+                    contact.last_error = str(getattr(result, "detail", result))
+                    if is_retryable(result) and contact.attempts < MAX_ATTEMPTS:
+                        contact.status = "pending"
+                        contact.next_attempt_at = now + RETRY_DELAY * contact.attempts
+                        registry.increment("campaigns.retries")
+                    else:
+                        contact.status = "failed"
+                        contact.finished_at = now
+                        registry.increment("campaigns.failed")
+                    continue
+
+                existing = db.query(Call).filter(Call.vapi_id == result.get("id")).first() if result.get("id") else None
+                if existing is not None:
+                    # A webhook for the call got here first and created it
+                    db.delete(call)
+                    call = existing
+                else:
+                    call.vapi_id = result.get("id")
+                    call.status = result.get("status", "queued")
+                contact.status = "in_progress"
+                contact.call_id = call.id
+                contact.last_error = None
+                bound.append((slot, call))
+                placed += 1
+            db.commit()
+            for slot, call in bound:
+                limiter.bind(slot, call.id)
+                call_queues.index.track(call, call_queues.CAMPAIGN_PRIORITY)
+            registry.increment("campaigns.placed", placed)
+            return placed
+        finally:
+            db.close()
+
+dialer = CampaignDialer()
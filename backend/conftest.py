@@ -0,0 +1,77 @@
+"""
+Shared pytest fixtures: in-memory databases and VAPI webhook bodies
+"""
+
+import json
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import webhook_log
+from database import Base, PhoneNumber
+
+
+@pytest.fixture(autouse=True)
+def log_dir(tmp_path, monkeypatch):
+    """Keep the raw webhook event log out of the source tree"""
+    path = str(tmp_path / "webhook_log")
+    monkeypatch.setattr(webhook_log, "LOG_DIR", path)
+    return path
+
+
+@pytest.fixture
+def make_session_factory():
+    """Builds a fresh in-memory database per call, with the application's session options.
+
+    Unless ``phone_number=False``, it holds phone number ``phone-1`` (VAPI id
+    ``vapi-phone-1``, user ``u1``), which owns the calls ``webhook_event`` describes.
+    """
+    engines = []
+
+    def make(phone_number: bool = True):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        engines.append(engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        if phone_number:
+            db = session_factory()
+            db.add(PhoneNumber(id="phone-1", vapi_id="vapi-phone-1", user_id="u1", number="+15550000001", name="Front desk"))
+            db.commit()
+            db.close()
+        return session_factory
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+@pytest.fixture
+def session_factory(make_session_factory):
+    return make_session_factory()
+
+
+@pytest.fixture
+def engine(session_factory):
+    return session_factory.kw["bind"]
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def webhook_event():
+    """Builds raw VAPI webhook bodies for call ``vapi-call-1`` on ``vapi-phone-1``"""
+    def event(message_type, call=None, **fields):
+        call = {"id": "vapi-call-1", "phoneNumberId": "vapi-phone-1", **(call or {})}
+        return json.dumps({"message": {"type": message_type, "call": call, **fields}}).encode()
+    return event
@@ -0,0 +1,158 @@
+"""
+Cost burn rate and month-end spend forecast.
+
+Everything here works on quarter-hour rollup rows (see ``rollups.py``), so
+the cost of a forecast grows with the number of days covered, not the number
+of calls made. Days and months are the user's local ones.
+"""
+
+import math
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+import timezones
+
+BURN_RATE_WINDOW_DAYS = 7
+HISTORY_DAYS = 28
+
+# Two-sided z-scores for the forecast confidence bands
+CONFIDENCE_LEVELS = {"80": 1.2816, "95": 1.96}
+
+
+def _next_month(day: date) -> date:
+    return date(day.year + 1, 1, 1) if day.month == 12 else date(day.year, day.month + 1, 1)
+
+
+def history_start(now: datetime, tz: Optional[ZoneInfo] = None) -> datetime:
+    """Earliest bucket the forecast needs: month start or the daily-spend history, whichever is older"""
+    tz = tz or timezones.get_zone(None)
+    today = timezones.local_now(tz, now).date()
+    return timezones.local_midnight_utc(min(today.replace(day=1), today - timedelta(days=HISTORY_DAYS)), tz)
+
+
+def _window_totals(rows: List[tuple], start: datetime, end: datetime) -> dict:
+    calls = duration = cost = 0
+    for bucket_start, _agent_id, _phone_number_id, bucket_calls, bucket_duration, bucket_cost in rows:
+        if start <= bucket_start < end:
+            calls += bucket_calls
+            duration += bucket_duration
+            cost += bucket_cost
+    return {"calls": calls, "duration": duration, "cost": cost}
+
+
+def _burn_by(rows: List[tuple], key_index: int, start: datetime, end: datetime, labels: Dict[str, str]) -> List[dict]:
+    totals = defaultdict(lambda: {"calls": 0, "cost": 0.0})
+    for row in rows:
+        if start <= row[0] < end:
+            entry = totals[row[key_index]]
+            entry["calls"] += row[3]
+            entry["cost"] += row[5]
+
+    window_days = (end - start).total_seconds() / 86400
+    result = [
+        {
+            "id": key,
+            "name": labels.get(key, "Unassigned" if key is None else "Unknown"),
+            "calls": entry["calls"],
+            "cost": round(entry["cost"], 4),
+            "cost_per_day": round(entry["cost"] / window_days, 4),
+        }
+        for key, entry in totals.items()
+    ]
+    result.sort(key=lambda item: item["cost"], reverse=True)
+    return result
+
+
+def _change(current: float, previous: float) -> Optional[float]:
+    if not previous:
+        return None
+    return round((current - previous) / previous * 100, 2)
+
+
+def daily_costs(rows: List[tuple], boundaries: List[datetime]) -> np.ndarray:
+    """Total cost per day between consecutive UTC day boundaries (days without calls are zero)"""
+    days = len(boundaries) - 1
+    totals = np.zeros(days)
+    for row in rows:
+        index = bisect_right(boundaries, row[0]) - 1
+        if 0 <= index < days:
+            totals[index] += row[5]
+    return totals
+
+
+def burn_rate_report(
+    rows: List[tuple],
+    now: datetime,
+    agent_labels: Optional[Dict[str, str]] = None,
+    phone_labels: Optional[Dict[str, str]] = None,
+    tz: Optional[ZoneInfo] = None,
+) -> dict:
+    """Burn rate per agent and phone number, month-end projection and week-over-week comparison.
+
+    ``now`` is naive UTC; month and day boundaries follow ``tz`` (UTC by default).
+    """
+    agent_labels = agent_labels or {}
+    phone_labels = phone_labels or {}
+    tz = tz or timezones.get_zone(None)
+    local_today = timezones.local_now(tz, now).date()
+    month_start = timezones.local_midnight_utc(local_today.replace(day=1), tz)
+    month_end = timezones.local_midnight_utc(_next_month(local_today), tz)
+
+    window_start = now - timedelta(days=BURN_RATE_WINDOW_DAYS)
+    current_week = _window_totals(rows, window_start, now)
+    previous_week = _window_totals(rows, window_start - timedelta(days=BURN_RATE_WINDOW_DAYS), window_start)
+
+    # Spend so far this month and a projection from the recent daily spend distribution
+    month_to_date = _window_totals(rows, month_start, now)["cost"]
+    _days, boundaries = timezones.local_day_boundaries(
+        local_today - timedelta(days=HISTORY_DAYS), local_today - timedelta(days=1), tz
+    )
+    history = daily_costs(rows, boundaries)
+    first_active = np.flatnonzero(history)
+    if first_active.size:
+        # Don't let days before the account had any calls drag the mean down
+        history = history[first_active[0]:]
+    daily_mean = float(history.mean()) if history.size else current_week["cost"] / BURN_RATE_WINDOW_DAYS
+    daily_std = float(history.std(ddof=1)) if history.size > 1 else 0.0
+
+    remaining_days = (month_end - now).total_seconds() / 86400
+    projected = month_to_date + daily_mean * remaining_days
+    bands = {}
+    for level, z in CONFIDENCE_LEVELS.items():
+        margin = z * daily_std * math.sqrt(remaining_days)
+        bands[level] = {
+            "low": round(max(month_to_date, projected - margin), 2),
+            "high": round(projected + margin, 2),
+        }
+
+    return {
+        "generated_at": now.isoformat(),
+        "burn_rate": {
+            "window_days": BURN_RATE_WINDOW_DAYS,
+            "cost_per_day": round(current_week["cost"] / BURN_RATE_WINDOW_DAYS, 4),
+            "cost_per_hour": round(current_week["cost"] / (BURN_RATE_WINDOW_DAYS * 24), 4),
+            "by_agent": _burn_by(rows, 1, window_start, now, agent_labels),
+            "by_phone_number": _burn_by(rows, 2, window_start, now, phone_labels),
+        },
+        "month": {
+            "month": local_today.strftime("%Y-%m"),
+            "timezone": tz.key,
+            "spend_to_date": round(month_to_date, 2),
+            "days_remaining": round(remaining_days, 2),
+            "daily_mean": round(daily_mean, 4),
+            "daily_std": round(daily_std, 4),
+            "projected_spend": round(projected, 2),
+            "confidence_bands": bands,
+        },
+        "week_over_week": {
+            "current": {"calls": current_week["calls"], "cost": round(current_week["cost"], 2)},
+            "previous": {"calls": previous_week["calls"], "cost": round(previous_week["cost"], 2)},
+            "cost_change_percent": _change(current_week["cost"], previous_week["cost"]),
+            "calls_change_percent": _change(current_week["calls"], previous_week["calls"]),
+        },
+    }
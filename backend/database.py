@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, String, DateTime, Boolean, Text, Integer
+from sqlalchemy import create_engine, event, Column, String, DateTime, Boolean, Text, Integer, Float, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -10,6 +10,14 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./EmployAI.db")
 # Create engine
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def enable_wal(dbapi_connection, connection_record):
+        # Readers and the webhook ingest insert don't wait behind the queue consumer's batch transaction
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -30,6 +38,7 @@ class User(Base):
     reset_token = Column(String, nullable=True)
     reset_token_expires = Column(DateTime, nullable=True)
     google_id = Column(String, nullable=True)
+    timezone = Column(String, default="UTC")  # IANA name used for local-time analytics
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -96,6 +105,120 @@ class Call(Base):
     ended_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    event_seq = Column(Integer, default=0)  # Lifecycle events applied from webhooks
+    last_event_at = Column(DateTime, nullable=True)  # VAPI timestamp of the latest one
+    summary = Column(Text, nullable=True)  # VAPI's post-call analysis summary
+    enriched_at = Column(DateTime, nullable=True)  # Final artifacts fetched from VAPI after the call
+
+# Lets rollup refreshes find recently changed calls without a full scan
+Index("ix_calls_user_updated", Call.user_id, Call.updated_at)
+
+class TranscriptSegment(Base):
+    __tablename__ = "transcript_segments"
+    __table_args__ = (Index("ix_transcript_segments_call_seq", "call_id", "seq", unique=True),)
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    call_id = Column(String, nullable=False)  # Local call ID
+    seq = Column(Integer, nullable=False)  # Position within the call, from 1
+    role = Column(String, nullable=True)  # assistant/user as sent by VAPI
+    text = Column(Text, nullable=False)
+    timestamp = Column(DateTime, default=datetime.utcnow)
+
+class CallActivity(Base):
+    __tablename__ = "call_activity"
+    
+    call_id = Column(String, primary_key=True)  # Local call ID
+    events = Column(Text, nullable=False)  # JSON list of partial speech and function-call events
+    flushed_at = Column(DateTime, default=datetime.utcnow)
+
+class CallRollup(Base):
+    __tablename__ = "call_rollups"
+    __table_args__ = (Index("ix_call_rollups_user_bucket", "user_id", "bucket_start"),)
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)  # UTC quarter-hour the calls were created in
+    agent_id = Column(String, nullable=True)
+    phone_number_id = Column(String, nullable=True)
+    calls = Column(Integer, default=0)
+    duration = Column(Integer, default=0)  # seconds
+    cost = Column(Float, default=0.0)
+    refreshed_at = Column(DateTime, default=datetime.utcnow)
+
+class WebhookQueueItem(Base):
+    __tablename__ = "webhook_queue"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)  # Delivery order
+    payload = Column(Text, nullable=False)  # Raw webhook body
+    received_at = Column(DateTime, default=datetime.utcnow)
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
+    failed_at = Column(DateTime, nullable=True)  # Set once the event is given up on
+
+class OutboundEmail(Base):
+    __tablename__ = "outbound_emails"
+    __table_args__ = (Index("ix_outbound_emails_due", "failed_at", "next_attempt_at"),)
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)  # HTML
+    created_at = Column(DateTime, default=datetime.utcnow)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    failed_at = Column(DateTime, nullable=True)  # Set once delivery is given up on; sent rows are deleted
+
+class Campaign(Base):
+    __tablename__ = "campaigns"
+
+    id = Column(String, primary_key=True, index=True)
+    user_id = Column(String, nullable=False, index=True)
+    name = Column(String, nullable=False)
+    agent_id = Column(String, nullable=False)
+    phone_number_id = Column(String, nullable=False)
+    status = Column(String, default="draft")  # draft/running/paused/completed/cancelled
+    max_concurrent = Column(Integer, default=2)  # Calls in flight at once
+    calls_per_minute = Column(Integer, default=10)  # Placement pacing
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+
+class CampaignContact(Base):
+    __tablename__ = "campaign_contacts"
+    __table_args__ = (Index("ix_campaign_contacts_campaign_status", "campaign_id", "status", "next_attempt_at"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    campaign_id = Column(String, nullable=False)
+    customer_number = Column(String, nullable=False)  # E.164
+    name = Column(String, nullable=True)
+    status = Column(String, default="pending")  # pending/dialing/in_progress/completed/failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    call_id = Column(String, nullable=True)  # Local call, recorded when the contact is claimed
+    last_error = Column(Text, nullable=True)
+    dialed_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class KnowledgeBaseFile(Base):
+    __tablename__ = "knowledge_base_files"
+
+    user_id = Column(String, primary_key=True)  # Reuse never crosses users
+    sha256 = Column(String, primary_key=True)  # Hex digest of the uploaded bytes
+    size = Column(Integer, nullable=False)
+    file_name = Column(String, nullable=False)
+    vapi_file_id = Column(String, nullable=False)
+    knowledge_base_id = Column(String, nullable=False)
+    knowledge_base_name = Column(String, nullable=True)
+    reuse_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow)
+
+class ProcessedWebhookEvent(Base):
+    __tablename__ = "processed_webhook_events"
+    
+    fingerprint = Column(String, primary_key=True)  # call id + event type + timestamp
+    processed_at = Column(DateTime, default=datetime.utcnow, index=True)
 
 # Create tables
 def create_tables():
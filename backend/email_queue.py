@@ -0,0 +1,250 @@
+"""
+Queued email delivery over pooled SMTP connections.
+
+Routes call ``enqueue`` instead of sending inline: the message is stored in
+``outbound_emails`` and the request returns. ``EmailDispatcher`` drains the
+table in batches, splitting each batch across up to ``POOL_SIZE`` SMTP
+sessions that stay open (already upgraded to TLS and logged in) between
+batches, so a signup spike costs a few connections rather than one handshake
+per email.
+
+Failed deliveries are retried with exponential backoff; a message the server
+rejects outright (5xx for the recipient or content) or that fails
+``MAX_ATTEMPTS`` times is marked ``failed_at`` and kept for inspection. Sent
+messages are deleted, so reset and verification links don't linger.
+"""
+
+import asyncio
+import os
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from database import OutboundEmail
+from metrics import registry
+
+BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+POLL_INTERVAL = float(os.getenv("EMAIL_POLL_INTERVAL", "5"))  # seconds
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = timedelta(seconds=30)
+MAX_BACKOFF = timedelta(hours=1)
+IDLE_CHECK = 30.0  # seconds idle before a pooled connection is checked with NOOP
+
+
+def enqueue(db, to_email: str, subject: str, body: str) -> int:
+    """Store an email for delivery; returns its queue id"""
+    email = OutboundEmail(to_email=to_email, subject=subject, body=body, created_at=datetime.utcnow(),
+                          next_attempt_at=datetime.utcnow())
+    db.add(email)
+    db.commit()
+    registry.increment("email.enqueued")
+    return email.id
+
+
+def backoff(attempts: int) -> timedelta:
+    return min(BACKOFF_BASE * (2 ** (attempts - 1)), MAX_BACKOFF)
+
+
+def is_permanent(error: Exception) -> bool:
+    """Rejections retrying won't fix; connection and auth problems are retried"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, smtplib.SMTPDataError):
+        return 500 <= error.smtp_code < 600
+    return False
+
+
+class SmtpPool:
+    """Idle authenticated SMTP sessions kept for reuse"""
+
+    def __init__(self, connect: Callable[[], smtplib.SMTP], size: int = POOL_SIZE):
+        self.connect = connect
+        self.size = size
+        self._lock = threading.Lock()
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self.opened = 0
+
+    def acquire(self) -> smtplib.SMTP:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, last_used = self._idle.pop()
+            if time.monotonic() - last_used < IDLE_CHECK:
+                return connection
+            # The server may have dropped a connection that sat idle
+            try:
+                if connection.noop()[0] == 250:
+                    return connection
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._discard(connection)
+
+        connection = self.connect()
+        self.opened += 1
+        registry.increment("email.smtp.connections_opened")
+        return connection
+
+    def release(self, connection: smtplib.SMTP, healthy: bool = True):
+        with self._lock:
+            if healthy and len(self._idle) < self.size:
+                self._idle.append((connection, time.monotonic()))
+                return
+        self._discard(connection)
+
+    def _discard(self, connection: smtplib.SMTP):
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._discard(connection)
+
+
+class EmailDispatcher:
+    """Background task delivering queued emails"""
+
+    def __init__(
+        self,
+        session_factory,
+        email_service,
+        pool_size: int = POOL_SIZE,
+        batch_size: int = BATCH_SIZE,
+        poll_interval: float = POLL_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.email_service = email_service
+        self.pool = SmtpPool(email_service.open_connection, pool_size)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="smtp")
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _due(self, db, now: datetime) -> List[OutboundEmail]:
+        return (
+            db.query(OutboundEmail)
+            .filter(OutboundEmail.failed_at.is_(None), OutboundEmail.next_attempt_at <= now)
+            .order_by(OutboundEmail.id)
+            .limit(self.batch_size)
+            .all()
+        )
+
+    def _send_chunk(self, messages: List[Tuple[int, str, str, str]]) -> List[Tuple[int, Optional[Exception]]]:
+        """Send messages over one pooled session; (id, error or None) for each"""
+        results = []
+        try:
+            connection = self.pool.acquire()
+        except (smtplib.SMTPException, OSError) as e:
+            return [(email_id, e) for email_id, _, _, _ in messages]
+
+        healthy = True
+        for email_id, to_email, subject, body in messages:
+            if not healthy:
+                results.append((email_id, smtplib.SMTPServerDisconnected("connection lost earlier in batch")))
+                continue
+            started = time.perf_counter()
+            try:
+                connection.send_message(self.email_service.build_message(to_email, subject, body))
+                results.append((email_id, None))
+                registry.observe("email.send", time.perf_counter() - started)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError) as e:
+                # The session is fine; only this message was refused
+                results.append((email_id, e))
+            except (smtplib.SMTPException, OSError) as e:
+                healthy = False
+                results.append((email_id, e))
+        self.pool.release(connection, healthy)
+        return results
+
+    def process_batch(self, now: Optional[datetime] = None) -> int:
+        """Deliver the next batch of due emails; returns how many were attempted"""
+        now = now or datetime.utcnow()
+        db = self.session_factory()
+        try:
+            emails = self._due(db, now)
+            if not emails:
+                return 0
+
+            # One chunk per pooled session, sent in parallel
+            chunks = [[] for _ in range(min(self.pool.size, len(emails)))]
+            for index, email in enumerate(emails):
+                chunks[index % len(chunks)].append((email.id, email.to_email, email.subject, email.body))
+            results = [result for chunk in self._executor.map(self._send_chunk, chunks) for result in chunk]
+
+            by_id = {email.id: email for email in emails}
+            for email_id, error in results:
+                email = by_id[email_id]
+                if error is None:
+                    db.delete(email)
+                    registry.increment("email.sent")
+                    continue
+                email.attempts = (email.attempts or 0) + 1
+                email.last_error = str(error)
+                if email.attempts >= MAX_ATTEMPTS or is_permanent(error):
+                    email.failed_at = now
+                    registry.increment("email.failed")
+                    print(f"Giving up on email {email_id} to {email.to_email}: {str(error)}")
+                else:
+                    email.next_attempt_at = now + backoff(email.attempts)
+                    registry.increment("email.retried")
+            db.commit()
+            return len(emails)
+        finally:
+            db.close()
+
+    def stats(self, db, now: Optional[datetime] = None) -> dict:
+        now = now or datetime.utcnow()
+        pending = db.query(func.count(OutboundEmail.id)).filter(OutboundEmail.failed_at.is_(None)).scalar()
+        due = db.query(func.count(OutboundEmail.id)).filter(
+            OutboundEmail.failed_at.is_(None), OutboundEmail.next_attempt_at <= now
+        ).scalar()
+        failed = db.query(func.count(OutboundEmail.id)).filter(OutboundEmail.failed_at.isnot(None)).scalar()
+        registry.set_gauge("email.queue.pending", pending)
+        return {"pending": pending, "due": due, "failed": failed, "connections_opened": self.pool.opened}
+
+    def notify(self):
+        """Wake the dispatcher early, e.g. right after an enqueue"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self):
+        while True:
+            try:
+                # SMTP is blocking; keep it off the event loop
+                taken = await asyncio.to_thread(self.process_batch)
+            except Exception as e:
+                print(f"Email dispatcher error: {str(e)}")
+                taken = 0
+
+            if taken < self.batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.pool.close_all()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Export a user's call history to Parquet, Arrow IPC or CSV
+
+Usage:
+    python export_calls.py user@example.com --format parquet --output calls.parquet
+    python export_calls.py user@example.com --format csv --columns id,status,duration --start 2024-01-01
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import call_export
+from database import SessionLocal, User, engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a user's calls out of the local database")
+    parser.add_argument("user", help="User email or user ID")
+    parser.add_argument("--format", default="parquet", choices=list(call_export.EXPORT_FORMATS))
+    parser.add_argument("--columns", default=None, help="Comma separated columns (default: all but transcript)")
+    parser.add_argument("--start", default=None, help="Only calls created on or after this ISO date/time")
+    parser.add_argument("--end", default=None, help="Only calls created before this ISO date/time")
+    parser.add_argument("--chunk-size", type=int, default=call_export.DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--output", default=None, help="Output file (default: calls.<ext>)")
+    args = parser.parse_args()
+
+    try:
+        columns = call_export.parse_columns(args.columns)
+        call_export.check_format(args.format)
+        start = datetime.fromisoformat(args.start) if args.start else None
+        end = datetime.fromisoformat(args.end) if args.end else None
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter((User.email == args.user) | (User.id == args.user)).first()
+    finally:
+        db.close()
+
+    if not user:
+        print(f"❌ User not found: {args.user}")
+        return 1
+
+    output = args.output or f"calls.{call_export.EXPORT_FORMATS[args.format]['extension']}"
+    written = 0
+    with open(output, "wb") as f:
+        for data in call_export.export_calls(engine, user.id, args.format, columns, start, end, args.chunk_size):
+            f.write(data)
+            written += len(data)
+
+    print(f"✅ Exported calls for {user.email} to {output} ({written} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
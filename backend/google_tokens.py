@@ -0,0 +1,160 @@
+"""
+Local verification of Google ID tokens.
+
+Google signs ID tokens with keys published at ``CERTS_URL``. ``JwksCache``
+keeps those keys in memory for as long as Google's ``Cache-Control: max-age``
+allows (``DEFAULT_TTL`` if it is missing), so signing in costs a signature
+check rather than a round trip to Google. A token signed with a key id we
+don't know triggers an early refresh, rate limited to one per
+``MIN_REFRESH_INTERVAL``, which picks up key rotation. If Google can't be
+reached the previous keys stay in use until they are replaced.
+
+``verify_id_token`` checks the signature, expiry, audience (our client id)
+and issuer, and returns the token's claims or raises ``InvalidIdToken``.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+import jwt
+
+from metrics import registry
+
+CERTS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+ISSUERS = ["accounts.google.com", "https://accounts.google.com"]
+DEFAULT_TTL = float(os.getenv("GOOGLE_JWKS_TTL", "3600"))  # seconds
+MIN_REFRESH_INTERVAL = 60.0  # seconds between refreshes forced by unknown key ids
+LEEWAY = 60  # seconds of clock skew tolerated on exp/iat
+
+
+class InvalidIdToken(Exception):
+    """The ID token is malformed, expired, for another client or not signed by Google"""
+
+
+def _max_age(cache_control: Optional[str]) -> Optional[float]:
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return float(match.group(1)) if match else None
+
+
+async def fetch_certs(url: str = CERTS_URL) -> Tuple[dict, Optional[float]]:
+    """Google's JWKS document and how long it may be cached"""
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        response = await client.get(url)
+        response.raise_for_status()
+        return response.json(), _max_age(response.headers.get("cache-control"))
+
+
+class JwksCache:
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[Tuple[dict, Optional[float]]]] = fetch_certs,
+        ttl: float = DEFAULT_TTL,
+        clock=time.monotonic,
+    ):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.clock = clock
+        self._keys: Dict[str, object] = {}
+        self._expires = 0.0
+        self._refreshed = None  # Clock time of the last refresh attempt
+        self._lock: Optional[asyncio.Lock] = None
+        self.refreshes = 0
+
+    async def key(self, kid: str):
+        """Public key for ``kid``, or None if Google doesn't publish it"""
+        if self.clock() >= self._expires:
+            await self._refresh()
+        elif kid not in self._keys and self._may_refresh():
+            # Probably a key Google rotated in since our last fetch
+            await self._refresh()
+        key = self._keys.get(kid)
+        registry.increment("google_tokens.key_hits" if key is not None else "google_tokens.key_misses")
+        return key
+
+    async def warm(self):
+        """Fetch the keys ahead of the first sign-in"""
+        if not self._keys:
+            await self._refresh()
+
+    def _may_refresh(self) -> bool:
+        return self._refreshed is None or self.clock() - self._refreshed >= MIN_REFRESH_INTERVAL
+
+    async def _refresh(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        attempted = self._refreshed
+        async with self._lock:
+            if self._refreshed != attempted:
+                # Another request refreshed while we waited
+                return
+            self._refreshed = self.clock()
+            try:
+                document, max_age = await self.fetch()
+                keys = {
+                    jwk["kid"]: jwt.algorithms.RSAAlgorithm.from_jwk(json.dumps(jwk))
+                    for jwk in document.get("keys", [])
+                    if jwk.get("kty") == "RSA" and jwk.get("kid")
+                }
+            except Exception as e:
+                # Keep using the keys we have; try again after MIN_REFRESH_INTERVAL
+                registry.increment("google_tokens.refresh_errors")
+                print(f"Error fetching Google signing keys: {str(e)}")
+                self._expires = self._refreshed + MIN_REFRESH_INTERVAL
+                return
+            self._keys = keys
+            self._expires = self._refreshed + (max_age if max_age is not None else self.ttl)
+            self.refreshes += 1
+            registry.increment("google_tokens.refreshes")
+
+    def stats(self) -> dict:
+        return {
+            "keys": sorted(self._keys),
+            "expires_in": max(0.0, self._expires - self.clock()),
+            "refreshes": self.refreshes,
+        }
+
+
+def looks_like_jwt(token: str) -> bool:
+    return token.count(".") == 2
+
+
+async def verify_id_token(token: str, audience: str, jwks: JwksCache) -> dict:
+    """Claims of a valid Google ID token issued to ``audience``"""
+    if not audience:
+        raise InvalidIdToken("GOOGLE_CLIENT_ID is not configured")
+    try:
+        header = jwt.get_unverified_header(token)
+    except jwt.PyJWTError as e:
+        raise InvalidIdToken(str(e))
+    if header.get("alg") != "RS256":
+        raise InvalidIdToken(f"Unexpected signing algorithm {header.get('alg')}")
+
+    key = await jwks.key(header.get("kid", ""))
+    if key is None:
+        raise InvalidIdToken("Token is not signed by a current Google key")
+
+    started = time.perf_counter()
+    try:
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=["RS256"],
+            audience=audience,
+            issuer=ISSUERS,
+            leeway=LEEWAY,
+            options={"require": ["exp", "iat", "aud", "iss", "sub"]},
+        )
+    except jwt.PyJWTError as e:
+        registry.increment("google_tokens.rejected")
+        raise InvalidIdToken(str(e))
+    finally:
+        registry.observe("google_tokens.verify", time.perf_counter() - started)
+    return claims
+
+
+jwks = JwksCache()
@@ -0,0 +1,270 @@
+"""
+Local preview of how Trieve will chunk a knowledge-base file.
+
+VAPI knowledge bases are built with a Trieve ``createPlan``: the file's text
+is cut into *splits* after every run of delimiter characters (sentences, with
+the default ``".!?\\n"``), and the splits are grouped ``targetSplitsPerChunk``
+at a time. With ``rebalanceChunks`` the same number of chunks is kept but the
+splits are spread evenly across them, so the last chunk isn't a stub.
+
+``ChunkPreview`` applies a plan to a file as it streams in. Each block of text
+is split with one ``re.split`` and measured with numpy; only the length of
+each split is kept (4 bytes per split in an ``array``), plus the start of the
+text for a sample of the first chunk. Chunk sizes are worked out at the end.
+Markdown is reduced to its text first (list numbers and link targets would
+otherwise read as sentence ends) and CSV records are emitted one per line so
+quoted newlines don't split a record.
+"""
+
+import codecs
+import csv
+import math
+import re
+from array import array
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+
+FORMATS = {"txt": "text", "text": "text", "log": "text", "md": "markdown", "markdown": "markdown", "csv": "csv"}
+PERCENTILES = [50, 90, 99]
+SIZE_BUCKETS = [0, 250, 500, 1000, 2000, 4000, 8000]  # Chunk size histogram edges, in characters
+SAMPLE_CHARS = 2000
+FEED_BYTES = 1024 * 1024  # How much of a streamed file to split at a time
+MAX_TARGET_SPLITS = 1000
+
+
+class PreviewError(ValueError):
+    pass
+
+
+@dataclass
+class ChunkPlan:
+    """A Trieve chunk plan, as sent in a VAPI knowledge base's ``createPlan``"""
+
+    target_splits_per_chunk: int = 50
+    split_delimiters: List[str] = field(default_factory=lambda: [".!?\n"])
+    rebalance_chunks: bool = True
+
+    def __post_init__(self):
+        if not 1 <= self.target_splits_per_chunk <= MAX_TARGET_SPLITS:
+            raise PreviewError(f"targetSplitsPerChunk must be between 1 and {MAX_TARGET_SPLITS}")
+        if not "".join(self.split_delimiters):
+            raise PreviewError("splitDelimiters must contain at least one character")
+
+    def to_vapi(self) -> dict:
+        return {
+            "targetSplitsPerChunk": self.target_splits_per_chunk,
+            "splitDelimiters": list(self.split_delimiters),
+            "rebalanceChunks": self.rebalance_chunks,
+        }
+
+    def pattern(self) -> re.Pattern:
+        """A run of delimiter characters: each string in ``splitDelimiters`` is a set of characters"""
+        characters = sorted(set("".join(self.split_delimiters)))
+        return re.compile("[" + "".join(re.escape(c) for c in characters) + "]+")
+
+
+DEFAULT_PLAN = ChunkPlan()
+
+
+def file_format(filename: str) -> Optional[str]:
+    """Preview format for a file name, or None if it can't be previewed"""
+    ext = filename.lower().rsplit('.', 1)[-1] if '.' in filename else 'txt'
+    return FORMATS.get(ext)
+
+
+def chunk_split_counts(splits: int, plan: ChunkPlan) -> np.ndarray:
+    """How many splits go into each chunk"""
+    if not splits:
+        return np.zeros(0, dtype=np.int64)
+    chunks = math.ceil(splits / plan.target_splits_per_chunk)
+    if plan.rebalance_chunks:
+        base, extra = divmod(splits, chunks)
+        counts = np.full(chunks, base, dtype=np.int64)
+        counts[:extra] += 1
+    else:
+        counts = np.full(chunks, plan.target_splits_per_chunk, dtype=np.int64)
+        counts[-1] = splits - plan.target_splits_per_chunk * (chunks - 1)
+    return counts
+
+
+class Splitter:
+    """Cuts streamed text into splits, keeping each split's length"""
+
+    def __init__(self, plan: ChunkPlan):
+        self._pattern = re.compile("(" + plan.pattern().pattern + ")")
+        self.lengths = array("I")
+        self.skipped = 0  # Whitespace and delimiters before the first split
+        self._carry = 0  # Characters of a split whose delimiter hasn't arrived yet
+        self._carry_text = False  # Whether they include anything but whitespace
+        self._prefix: List[str] = []  # Start of the text, for the sample
+        self._prefix_chars = 0
+        self._fed = 0
+
+    def feed(self, text: str):
+        if not text:
+            return
+        pieces = self._pattern.split(text)  # content, delimiters, content, ..., tail
+        contents, delimiters, tail = pieces[0:-1:2], pieces[1::2], pieces[-1]
+        if contents:
+            n = len(contents)
+            sizes = np.fromiter(map(len, contents), dtype=np.int64, count=n)
+            sizes += np.fromiter(map(len, delimiters), dtype=np.int64, count=n)
+            sizes[0] += self._carry
+            has_text = np.fromiter(map(bool, map(str.strip, contents)), dtype=bool, count=n)
+            has_text[0] |= self._carry_text
+            self._add(sizes, has_text)
+            self._carry, self._carry_text = 0, False
+        self._carry += len(tail)
+        self._carry_text = self._carry_text or bool(tail.strip())
+
+        wanted = self.skipped + SAMPLE_CHARS - self._prefix_chars
+        if wanted > 0 and self._prefix_chars == self._fed:
+            self._prefix.append(text[:wanted])
+            self._prefix_chars += len(self._prefix[-1])
+        self._fed += len(text)
+
+    def _add(self, sizes: np.ndarray, has_text: np.ndarray):
+        # Whitespace and stray delimiters are not a split of their own: they join the split before
+        owner = np.cumsum(has_text) - 1
+        orphans = owner < 0
+        if orphans.any():
+            extra = int(sizes[orphans].sum())
+            if len(self.lengths):
+                self.lengths[-1] += extra
+            else:
+                self.skipped += extra
+            sizes, owner = sizes[~orphans], owner[~orphans]
+        if len(sizes):
+            merged = np.bincount(owner, weights=sizes).astype(np.uint32)
+            self.lengths.frombytes(merged.tobytes())
+
+    def finish(self):
+        if self._carry:
+            self._add(np.array([self._carry], dtype=np.int64), np.array([self._carry_text]))
+            self._carry, self._carry_text = 0, False
+
+    def sample(self, characters: int) -> str:
+        """Text of the first ``characters`` characters of the first split on, cut at ``SAMPLE_CHARS``"""
+        prefix = "".join(self._prefix)
+        return prefix[self.skipped:self.skipped + min(characters, SAMPLE_CHARS)]
+
+
+MARKDOWN_RULES = [
+    # (characters the rule needs, pattern, replacement); rules whose characters are absent are skipped
+    # Fences, HTML comments and horizontal rules: the whole line goes
+    ("`~<-*_", re.compile(r"^[ \t]*(?:```|~~~).*\n?|^[ \t]*<!--.*-->[ \t]*\n?|^[ \t]*([-*_])[ \t]*(?:\1[ \t]*){2,}\n?", re.M), ""),
+    ("#>", re.compile(r"^[ \t]{0,3}(?:#{1,6}[ \t]+|>[ \t]?)+", re.M), ""),  # Heading and quote markers
+    ("-*+.)", re.compile(r"^[ \t]*(?:[-*+]|\d+[.)])[ \t]+", re.M), ""),  # List markers; "1." isn't a sentence end
+    ("!", re.compile(r"!\[([^\]]*)\]\([^)]*\)"), r"\1"),  # Images: alt text
+    ("[", re.compile(r"\[([^\]]+)\]\([^)]*\)"), r"\1"),  # Links: text, not the URL
+    (":", re.compile(r"<https?://[^>]+>|https?://\S+"), "link"),
+]
+EMPHASIS = str.maketrans("", "", "*`")  # Emphasis and code spans
+
+
+def markdown_text(text: str) -> str:
+    """The readable text of whole lines of Markdown"""
+    for characters, rule, replacement in MARKDOWN_RULES:
+        if any(c in text for c in characters):
+            text = rule.sub(replacement, text)
+    return text.replace("__", "").translate(EMPHASIS)
+
+
+def csv_text(rows) -> str:
+    """CSV records one per line, cells joined with commas"""
+    return "".join(
+        ", ".join(cell.replace("\r", " ").replace("\n", " ") for cell in cells) + "\n"
+        for cells in rows if any(cell.strip() for cell in cells)
+    )
+
+
+class ChunkPreview:
+    """Streams a file through a chunk plan; ``feed`` bytes, then ``finish`` for the summary"""
+
+    def __init__(self, fmt: str = "text", plan: ChunkPlan = DEFAULT_PLAN):
+        if fmt not in ("text", "markdown", "csv"):
+            raise PreviewError(f"Unsupported preview format: {fmt}")
+        self.format = fmt
+        self.plan = plan
+        self.bytes = 0
+        self.characters = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self._line = ""  # Partial line (Markdown and CSV)
+        self._record: List[str] = []  # CSV lines of a record with an open quote
+        self._splitter = Splitter(plan)
+
+    def feed(self, data: bytes):
+        self.bytes += len(data)
+        self._text(self._decoder.decode(data))
+
+    def _text(self, text: str, final: bool = False):
+        self.characters += len(text)
+        if self.format == "text":
+            self._splitter.feed(text)
+            return
+        lines = (self._line + text).splitlines(keepends=True)
+        self._line = lines.pop() if lines and not final and not lines[-1].endswith(("\n", "\r")) else ""
+        if self.format == "markdown":
+            self._splitter.feed(markdown_text("".join(lines)))
+            return
+        # Hold back the lines of a record whose quoted field is still open
+        lines = self._record + lines
+        quotes = complete = 0
+        for i, line in enumerate(lines):
+            quotes += line.count('"')
+            if not quotes % 2:
+                complete = i + 1
+        if final:
+            complete = len(lines)  # Unterminated quote: take the rest as one record
+        self._record = lines[complete:]
+        self._splitter.feed(csv_text(csv.reader(lines[:complete])))
+
+    def finish(self) -> dict:
+        self._text(self._decoder.decode(b"", final=True), final=True)
+        self._splitter.finish()
+        return self.summary()
+
+    def summary(self) -> dict:
+        lengths = np.frombuffer(self._splitter.lengths, dtype=np.uint32).astype(np.int64)
+        counts = chunk_split_counts(len(lengths), self.plan)
+        ends = np.cumsum(counts)
+        sizes = np.diff(np.concatenate(([0], np.cumsum(lengths)[ends - 1]))) if len(counts) else counts
+        summary = {
+            "format": self.format,
+            "plan": self.plan.to_vapi(),
+            "bytes": self.bytes,
+            "characters": self.characters,
+            "splits": int(len(lengths)),
+            "chunks": int(len(sizes)),
+            "splits_per_chunk": {"min": int(counts.min()) if len(counts) else 0,
+                                 "max": int(counts.max()) if len(counts) else 0},
+        }
+        if not len(sizes):
+            summary["chunk_characters"] = {"min": 0, "max": 0, "mean": 0,
+                                           **{f"p{p}": 0 for p in PERCENTILES}}
+            summary["histogram"] = []
+            summary["sample"] = ""
+            return summary
+        summary["chunk_characters"] = {
+            "min": int(sizes.min()),
+            "max": int(sizes.max()),
+            "mean": round(float(sizes.mean()), 1),
+            **{f"p{p}": int(v) for p, v in zip(PERCENTILES, np.percentile(sizes, PERCENTILES, method="nearest"))},
+        }
+        edges = SIZE_BUCKETS + [max(int(sizes.max()) + 1, SIZE_BUCKETS[-1] + 1)]
+        histogram, _ = np.histogram(sizes, bins=edges)
+        summary["histogram"] = [
+            {"min_characters": low, "max_characters": high if i < len(SIZE_BUCKETS) - 1 else None, "chunks": int(n)}
+            for i, (low, high, n) in enumerate(zip(edges, edges[1:], histogram))
+        ]
+        summary["sample"] = self._splitter.sample(int(sizes[0]))
+        return summary
+
+
+def preview_text(text: str, fmt: str = "text", plan: ChunkPlan = DEFAULT_PLAN) -> dict:
+    """Preview for text already in memory"""
+    preview = ChunkPreview(fmt, plan)
+    preview.feed(text.encode("utf-8"))
+    return preview.finish()
@@ -0,0 +1,380 @@
+"""
+Streaming knowledge-base file uploads to VAPI.
+
+``POST /knowledge-bases/upload`` takes an ordinary ``multipart/form-data``
+request. ``MultipartStream`` parses the request body incrementally with
+python-multipart's push parser and hands the file part out as an async
+iterator of chunks; ``upload_file`` re-wraps those chunks in a multipart body
+of its own and streams it to VAPI ``/file`` with chunked transfer encoding.
+Nothing is spooled to disk and at most a few network chunks are held in
+memory, whatever the file size.
+
+The older base64-in-JSON path (``AgentCreate.knowledgeBaseFile``) goes
+through ``base64_chunks``, which decodes in slices instead of materialising
+the decoded file next to the JSON string.
+
+Uploads are content-addressed per user: ``ContentHash`` computes the SHA-256
+of the bytes as they stream past, and ``KnowledgeBaseFile`` maps each user's
+digests to the VAPI file and knowledge base built from them.
+``upload_deduplicated`` reuses both when the same user uploads the same bytes
+again, unless the knowledge base has since been deleted in VAPI. A client
+that sends the digest ahead of the file (``sha256`` form field) skips the
+VAPI upload entirely once the server has confirmed the bytes match;
+otherwise the file is uploaded while hashed and the duplicate VAPI file is
+discarded afterwards.
+"""
+
+import base64
+import binascii
+import hashlib
+import os
+import re
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+
+import httpx
+from multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy.exc import IntegrityError
+
+from database import KnowledgeBaseFile
+from metrics import registry
+
+MAX_UPLOAD_BYTES = int(os.getenv("KB_MAX_UPLOAD_MB", "100")) * 1024 * 1024
+MAX_FIELD_BYTES = 64 * 1024  # Form fields other than the file
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = re.compile(r"\s")
+SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+
+MIME_TYPES = {
+    'txt': 'text/plain',
+    'md': 'text/markdown',
+    'markdown': 'text/markdown',
+    'pdf': 'application/pdf',
+    'csv': 'text/csv',
+    'tsv': 'text/tab-separated-values',
+    'log': 'text/x-log',
+    'js': 'text/javascript',
+    'css': 'text/css',
+    'html': 'text/html',
+    'htm': 'text/html',
+    'xml': 'application/xml',
+    'json': 'application/json',
+    'yaml': 'application/x-yaml',
+    'yml': 'application/x-yaml',
+    'doc': 'application/msword',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'ts': 'application/typescript'
+}
+
+
+class UploadError(Exception):
+    """The upload is malformed, too large, or VAPI refused it"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def mime_type(filename: str) -> str:
+    """MIME type VAPI expects for a file, by extension"""
+    ext = filename.lower().split('.')[-1] if '.' in filename else ''
+    return MIME_TYPES.get(ext, 'text/plain')  # Default to text/plain
+
+
+def base64_chunks(encoded: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Decode base64 a slice at a time"""
+    if WHITESPACE.search(encoded):
+        encoded = WHITESPACE.sub("", encoded)
+    step = chunk_size // 3 * 4  # Whole base64 quanta
+    try:
+        for start in range(0, len(encoded), step):
+            yield base64.b64decode(encoded[start:start + step], validate=True)
+    except binascii.Error as e:
+        raise UploadError(f"Invalid base64 file content: {e}")
+
+
+async def aiter_chunks(chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    for chunk in chunks:
+        yield chunk
+
+
+class Part:
+    """One part of a multipart body; the file's data is read with ``chunks``"""
+
+    def __init__(self, stream: "MultipartStream", headers: Dict[str, bytes]):
+        self._stream = stream
+        self.done = False
+        _, options = parse_options_header(headers.get("content-disposition", b""))
+        self.name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        self.filename = filename.decode("utf-8", "replace") if filename is not None else None
+        content_type = headers.get("content-type")
+        self.content_type = content_type.decode("latin-1") if content_type else None
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        while not self.done:
+            event = await self._stream._next_event()
+            if event is None or event[0] == "end":
+                self.done = True
+                if event is None:
+                    raise UploadError("Multipart body ended in the middle of a part")
+                return
+            yield event[1]
+
+    async def text(self, limit: int = MAX_FIELD_BYTES) -> str:
+        data = bytearray()
+        async for chunk in self.chunks():
+            data += chunk
+            if len(data) > limit:
+                raise UploadError(f"Form field '{self.name}' is too large")
+        return data.decode("utf-8", "replace")
+
+    async def drain(self):
+        async for _ in self.chunks():
+            pass
+
+
+class MultipartStream:
+    """Pull-based parts of a multipart request body read from an async byte stream"""
+
+    def __init__(self, body: AsyncIterator[bytes], content_type: str):
+        kind, options = parse_options_header(content_type or "")
+        boundary = options.get(b"boundary")
+        if kind != b"multipart/form-data" or not boundary:
+            raise UploadError("Expected a multipart/form-data body", status_code=415)
+        self._body = body.__aiter__()
+        self._events: deque = deque()
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+        self._headers: Dict[str, bytes] = {}
+        self._finished = False
+        self._parser = MultipartParser(boundary, callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": lambda: self._events.append(("end",)),
+            "on_header_field": lambda data, start, end: self._header_field.extend(data[start:end]),
+            "on_header_value": lambda data, start, end: self._header_value.extend(data[start:end]),
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": lambda: self._events.append(("part", dict(self._headers))),
+        })
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if end > start:
+            self._events.append(("data", bytes(data[start:end])))
+
+    def _on_header_end(self):
+        self._headers[bytes(self._header_field).decode("latin-1").lower()] = bytes(self._header_value)
+        self._header_field.clear()
+        self._header_value.clear()
+
+    async def _next_event(self) -> Optional[tuple]:
+        while not self._events:
+            if self._finished:
+                return None
+            try:
+                chunk = await self._body.__anext__()
+            except StopAsyncIteration:
+                self._parser.finalize()
+                self._finished = True
+                continue
+            if chunk:
+                self._parser.write(chunk)
+        return self._events.popleft()
+
+    async def parts(self) -> AsyncIterator[Part]:
+        while True:
+            event = await self._next_event()
+            if event is None:
+                return
+            if event[0] != "part":
+                continue
+            part = Part(self, event[1])
+            yield part
+            # Skip whatever the caller didn't read
+            if not part.done:
+                await part.drain()
+
+
+async def limit_size(chunks: AsyncIterator[bytes], limit: int = MAX_UPLOAD_BYTES) -> AsyncIterator[bytes]:
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > limit:
+            raise UploadError(f"File is larger than {limit // (1024 * 1024)} MB", status_code=413)
+        yield chunk
+
+
+async def _multipart_body(chunks: AsyncIterator[bytes], filename: str, content_type: str, boundary: str):
+    quoted = filename.replace('\\', '\\\\').replace('"', '\\"')
+    yield (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{quoted}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode("utf-8")
+    async for chunk in chunks:
+        yield chunk
+    yield f'\r\n--{boundary}--\r\n'.encode("ascii")
+
+
+async def upload_file(
+    chunks: AsyncIterator[bytes],
+    filename: str,
+    base_url: str,
+    api_key: str,
+    content_type: Optional[str] = None,
+    client: Optional[httpx.AsyncClient] = None,
+) -> Tuple[str, dict]:
+    """Stream a file to VAPI ``/file``; returns (file id, VAPI's response)"""
+    boundary = uuid.uuid4().hex
+    body = _multipart_body(chunks, filename, content_type or mime_type(filename), boundary)
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": f"multipart/form-data; boundary={boundary}"}
+    owned = client is None
+    client = client or httpx.AsyncClient(timeout=httpx.Timeout(30.0, write=None))
+    try:
+        print(f"VAPI File Upload: POST {base_url}/file ({filename}, streamed)")
+        response = await client.post(f"{base_url}/file", content=body, headers=headers)
+    finally:
+        if owned:
+            await client.aclose()
+
+    print(f"File Upload Response Status: {response.status_code}")
+    if response.status_code >= 400:
+        print(f"File upload error: {response.text}")
+        raise UploadError("Failed to upload file to VAPI", status_code=502)
+    data = response.json()
+    file_id = data.get("id")
+    if not file_id:
+        raise UploadError("Failed to get file ID from upload", status_code=502)
+    print(f"File uploaded successfully with ID: {file_id}")
+    return file_id, data
+
+
+class ContentHash:
+    """SHA-256 and size of a byte stream, computed as it passes through ``tee``"""
+
+    def __init__(self):
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    def update(self, chunk: bytes):
+        self._sha256.update(chunk)
+        self.size += len(chunk)
+
+    async def tee(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        async for chunk in chunks:
+            self.update(chunk)
+            yield chunk
+
+    def hexdigest(self) -> str:
+        return self._sha256.hexdigest()
+
+
+def normalize_sha256(value: Optional[str]) -> Optional[str]:
+    """A client-supplied digest, or None if it isn't a hex SHA-256"""
+    value = (value or "").strip().lower()
+    return value if SHA256_HEX.match(value) else None
+
+
+def find_file(db, user_id: str, sha256: str) -> Optional[KnowledgeBaseFile]:
+    return db.get(KnowledgeBaseFile, (user_id, sha256))
+
+
+async def find_live_file(db, user_id: str, sha256: str,
+                         knowledge_base_exists: Callable[[KnowledgeBaseFile], Awaitable[bool]]) -> Optional[KnowledgeBaseFile]:
+    """The user's earlier upload of these bytes, evicted if its knowledge base has since been deleted in VAPI"""
+    known = find_file(db, user_id, sha256)
+    if known and not await knowledge_base_exists(known):
+        print(f"Knowledge base {known.knowledge_base_id} is gone from VAPI; forgetting file {sha256[:12]}")
+        db.delete(known)
+        db.commit()
+        registry.increment("kb_upload.evicted")
+        return None
+    return known
+
+
+def reuse(db, known: KnowledgeBaseFile) -> dict:
+    known.reuse_count = (known.reuse_count or 0) + 1
+    known.last_used_at = datetime.utcnow()
+    db.commit()
+    registry.increment("kb_upload.reused")
+    print(f"Reusing knowledge base {known.knowledge_base_id} for identical file {known.sha256[:12]}")
+    return file_dict(known, reused=True)
+
+
+def file_dict(known: KnowledgeBaseFile, reused: bool) -> dict:
+    return {
+        "id": known.knowledge_base_id,
+        "name": known.knowledge_base_name,
+        "provider": "trieve",
+        "fileId": known.vapi_file_id,
+        "sha256": known.sha256,
+        "size": known.size,
+        "reused": reused,
+    }
+
+
+async def upload_deduplicated(
+    db,
+    chunks: AsyncIterator[bytes],
+    filename: str,
+    name: str,
+    user_id: str,
+    upload: Callable[[AsyncIterator[bytes], str], Awaitable[str]],
+    create_knowledge_base: Callable[[str, str], Awaitable[dict]],
+    delete_file: Callable[[str], Awaitable[None]],
+    knowledge_base_exists: Callable[[KnowledgeBaseFile], Awaitable[bool]],
+    sha256: Optional[str] = None,
+) -> dict:
+    """
+    Knowledge base for a file, reusing the VAPI file and knowledge base of the user's identical earlier uploads.
+
+    ``upload(chunks, filename)`` streams the bytes to VAPI and returns the file id,
+    ``create_knowledge_base(name, file_id)`` returns VAPI's knowledge base,
+    ``delete_file(file_id)`` discards an upload that turned out to be a duplicate and
+    ``knowledge_base_exists(known)`` checks a recorded knowledge base is still in VAPI.
+    ``sha256`` is the client's digest of the file, if it sent one first.
+    """
+    content = ContentHash()
+    # Checked before the bytes are read: if it's gone, they still have to go to VAPI
+    known = await find_live_file(db, user_id, sha256, knowledge_base_exists) if sha256 else None
+    if known:
+        # Read the bytes anyway: the digest only counts once the content matches it
+        async for _ in content.tee(chunks):
+            pass
+        if content.hexdigest() != sha256:
+            raise UploadError("File content does not match its sha256")
+        return reuse(db, known)
+
+    file_id = await upload(content.tee(chunks), filename)
+    digest = content.hexdigest()
+    if sha256 and digest != sha256:
+        await delete_file(file_id)
+        raise UploadError("File content does not match its sha256")
+
+    known = await find_live_file(db, user_id, digest, knowledge_base_exists)
+    if known:
+        await delete_file(file_id)
+        return reuse(db, known)
+
+    kb = await create_knowledge_base(name, file_id)
+    db.add(KnowledgeBaseFile(
+        sha256=digest,
+        size=content.size,
+        file_name=filename,
+        vapi_file_id=file_id,
+        knowledge_base_id=kb["id"],
+        knowledge_base_name=name,
+        user_id=user_id,
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        # The user uploaded the same file concurrently; both knowledge bases work
+        db.rollback()
+    registry.increment("kb_upload.uploaded")
+    return {**kb, "fileId": file_id, "sha256": digest, "size": content.size, "reused": False}
@@ -0,0 +1,171 @@
+"""
+Agent leaderboard computed in a single windowed SQL query.
+
+Per agent (keyed by agent ID, so agents sharing a name stay separate) the
+query computes volume, success and missed rates, average and p95 duration,
+cost per minute, and the agent's rank in the current and the prior period of
+the same length. Only standard window functions are used, so the same query
+runs on SQLite (3.25+) and Postgres.
+"""
+
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import Float, and_, case, cast, func, literal, or_, select
+
+from database import Agent, Call
+
+MISSED_REASONS = ["no-answer", "missed", "busy"]
+
+# Leaderboard orderings, best first
+RANK_ORDERINGS = {
+    "volume": ["calls", "successful"],
+    "success_rate": ["success_rate", "calls"],
+    "successful": ["successful", "success_rate"],
+    "cost_per_minute": ["cost_per_minute_asc", "calls"],
+}
+
+
+def build_leaderboard_query(user_id: str, current_start: datetime, end: datetime, rank_by: str = "volume"):
+    period = end - current_start
+    previous_start = current_start - period
+
+    duration = func.coalesce(Call.duration, 0)
+    cost = func.coalesce(cast(Call.cost, Float), 0.0)
+    is_current = case((Call.created_at >= current_start, 1), else_=0)
+    is_missed = case(
+        (or_(Call.ended_reason.in_(MISSED_REASONS), and_(Call.status == "ended", duration == 0)), 1),
+        else_=0,
+    )
+
+    scoped = (
+        select(
+            Call.agent_id.label("agent_id"),
+            is_current.label("is_current"),
+            case((Call.status == "completed", 1), else_=0).label("is_successful"),
+            is_missed.label("is_missed"),
+            duration.label("duration"),
+            cost.label("cost"),
+        )
+        .where(
+            and_(
+                Call.user_id == user_id,
+                Call.agent_id.isnot(None),
+                Call.created_at >= previous_start,
+                Call.created_at < end,
+            )
+        )
+        .cte("scoped")
+    )
+
+    # Position of each call within its agent's period, ordered by duration, for the p95
+    partition = [scoped.c.agent_id, scoped.c.is_current]
+    ordered = select(
+        scoped,
+        func.row_number().over(partition_by=partition, order_by=scoped.c.duration).label("duration_rank"),
+        func.count().over(partition_by=partition).label("period_calls"),
+    ).cte("ordered")
+
+    calls = func.count()
+    total_duration = func.sum(ordered.c.duration)
+    stats = (
+        select(
+            ordered.c.agent_id,
+            ordered.c.is_current,
+            calls.label("calls"),
+            func.sum(ordered.c.is_successful).label("successful"),
+            func.sum(ordered.c.is_missed).label("missed"),
+            func.avg(ordered.c.duration).label("average_duration"),
+            # Nearest-rank p95: the first duration whose rank covers 95% of the calls
+            func.min(
+                case((ordered.c.duration_rank * 100 >= ordered.c.period_calls * 95, ordered.c.duration))
+            ).label("p95_duration"),
+            total_duration.label("total_duration"),
+            func.sum(ordered.c.cost).label("total_cost"),
+            (cast(func.sum(ordered.c.is_successful), Float) * 100 / calls).label("success_rate"),
+            (cast(func.sum(ordered.c.is_missed), Float) * 100 / calls).label("missed_rate"),
+            case(
+                (total_duration > 0, func.sum(ordered.c.cost) * 60 / cast(total_duration, Float)),
+                else_=None,
+            ).label("cost_per_minute"),
+        )
+        .group_by(ordered.c.agent_id, ordered.c.is_current)
+        .cte("stats")
+    )
+
+    order_by = []
+    for key in RANK_ORDERINGS[rank_by]:
+        if key == "cost_per_minute_asc":
+            # Cheapest first, agents without talk time last
+            order_by.append(case((stats.c.cost_per_minute.is_(None), 1), else_=0))
+            order_by.append(stats.c.cost_per_minute.asc())
+        else:
+            order_by.append(getattr(stats.c, key).desc())
+
+    ranked = select(
+        stats,
+        func.rank().over(partition_by=stats.c.is_current, order_by=order_by).label("rank"),
+    ).cte("ranked")
+
+    current = ranked.alias("current_period")
+    previous = ranked.alias("previous_period")
+    return (
+        select(
+            current.c.agent_id,
+            Agent.name,
+            current.c.calls,
+            current.c.successful,
+            current.c.missed,
+            current.c.success_rate,
+            current.c.missed_rate,
+            current.c.average_duration,
+            current.c.p95_duration,
+            current.c.total_duration,
+            current.c.total_cost,
+            current.c.cost_per_minute,
+            current.c.rank,
+            previous.c.rank.label("previous_rank"),
+            previous.c.calls.label("previous_calls"),
+        )
+        .select_from(current)
+        .join(Agent, Agent.id == current.c.agent_id)
+        .outerjoin(previous, and_(previous.c.agent_id == current.c.agent_id, previous.c.is_current == literal(0)))
+        .where(current.c.is_current == literal(1))
+        .order_by(current.c.rank, Agent.name)
+    )
+
+
+def _round(value, digits=2) -> Optional[float]:
+    return None if value is None else round(float(value), digits)
+
+
+def agent_leaderboard(db, user_id: str, days: int = 30, rank_by: str = "volume", now: Optional[datetime] = None) -> List[dict]:
+    """Leaderboard for the last ``days`` days, compared against the ``days`` before that"""
+    if rank_by not in RANK_ORDERINGS:
+        raise ValueError(f"Unsupported rank_by: {rank_by}. Supported values: {', '.join(RANK_ORDERINGS)}")
+
+    end = now or datetime.utcnow()
+    rows = db.execute(build_leaderboard_query(user_id, end - timedelta(days=days), end, rank_by)).all()
+
+    return [
+        {
+            "agent_id": row.agent_id,
+            "agent_name": row.name,
+            "rank": row.rank,
+            "previous_rank": row.previous_rank,
+            # Positive means the agent moved up the leaderboard
+            "rank_change": None if row.previous_rank is None else row.previous_rank - row.rank,
+            "calls": row.calls,
+            "previous_calls": row.previous_calls or 0,
+            "successful_calls": row.successful,
+            "missed_calls": row.missed,
+            "success_rate": _round(row.success_rate),
+            "missed_rate": _round(row.missed_rate),
+            "average_duration_seconds": _round(row.average_duration),
+            "p95_duration_seconds": row.p95_duration,
+            "total_duration_minutes": _round(row.total_duration / 60),
+            "total_cost": _round(row.total_cost, 4),
+            "cost_per_minute": _round(row.cost_per_minute, 4),
+        }
+        for row in rows
+    ]
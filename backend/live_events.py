@@ -0,0 +1,153 @@
+"""
+Per-user live call events over Server-Sent Events.
+
+The webhook pipeline publishes call-start, status-update, transcript and
+call-end events after they are committed; each connected dashboard gets them
+on a bounded queue. A subscriber that falls behind loses its oldest events
+and is sent a ``resync`` event telling it to reload its snapshot, and one
+that stays behind is disconnected, so a slow client can never grow server
+memory. Between events an open stream costs nothing but a periodic
+heartbeat comment.
+"""
+
+import asyncio
+import json
+import threading
+from datetime import datetime
+from typing import AsyncIterator, Dict, Optional, Set
+
+from metrics import registry
+
+BUFFER_SIZE = 100
+MAX_DROPPED_EVENTS = 500  # Dropped since the subscriber last read, before it is disconnected
+HEARTBEAT_INTERVAL = 15.0  # seconds
+ACTIVE_STATUSES = ("queued", "ringing", "in-progress", "forwarding", "speaking")
+
+
+class Subscriber:
+    def __init__(self, user_id: str, buffer_size: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+        self.needs_resync = False
+        self.closed = False
+
+
+class LiveEventBroker:
+    def __init__(self, buffer_size: int = BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, user_id: str) -> Subscriber:
+        # Subscribing happens on the event loop; remember it for cross-thread publishing
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(user_id, self.buffer_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+        registry.set_gauge("live.subscribers", self.subscriber_count())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscriber.closed = True
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.user_id]
+        registry.set_gauge("live.subscribers", self.subscriber_count())
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, user_id: str, event: dict):
+        """Send an event to the user's subscribers; safe to call from any thread"""
+        with self._lock:
+            if user_id not in self._subscribers or self._loop is None:
+                return
+            loop = self._loop
+        try:
+            loop.call_soon_threadsafe(self._deliver, user_id, event)
+        except RuntimeError:
+            # The loop has shut down
+            pass
+
+    def _deliver(self, user_id: str, event: dict):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscriber in subscribers:
+            if subscriber.queue.full():
+                # Backpressure: drop the oldest event and have the client resync
+                subscriber.queue.get_nowait()
+                subscriber.needs_resync = True
+                subscriber.dropped += 1
+                registry.increment("live.dropped_events")
+                if subscriber.dropped > MAX_DROPPED_EVENTS:
+                    registry.increment("live.disconnected_slow_subscribers")
+                    self.unsubscribe(subscriber)
+                    # Wake the stream so it can finish
+                    subscriber.queue.get_nowait()
+                    subscriber.queue.put_nowait(None)
+                    continue
+            subscriber.queue.put_nowait(event)
+        registry.increment("live.published_events")
+
+    async def stream(self, subscriber: Subscriber, snapshot: Optional[dict] = None,
+                     heartbeat: float = HEARTBEAT_INTERVAL) -> AsyncIterator[str]:
+        """SSE frames for a subscriber, starting with an optional snapshot"""
+        try:
+            if snapshot is not None:
+                yield format_sse("snapshot", snapshot)
+            while not subscriber.closed:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+
+                if event is None:
+                    break
+                if subscriber.needs_resync:
+                    subscriber.needs_resync = False
+                    yield format_sse("resync", {"reason": "events dropped"})
+                subscriber.dropped = 0
+                yield format_sse(event.get("type", "message"), event)
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def format_sse(event_type: str, data: dict) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(data, default=_json_default)}\n\n"
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def call_state(call) -> dict:
+    """The fields of a call a live dashboard shows"""
+    return {
+        "id": call.id,
+        "vapi_id": call.vapi_id,
+        "agent_id": call.agent_id,
+        "phone_number_id": call.phone_number_id,
+        "phone_number": call.phone_number,
+        "customer_number": call.customer_number,
+        "direction": call.direction,
+        "status": call.status,
+        "seq": call.event_seq,
+        "duration": call.duration,
+        "cost": call.cost,
+        "ended_reason": call.ended_reason,
+        "started_at": call.started_at,
+        "ended_at": call.ended_at,
+        "created_at": call.created_at,
+    }
+
+
+broker = LiveEventBroker()
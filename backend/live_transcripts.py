@@ -0,0 +1,151 @@
+"""
+In-memory live activity for calls in progress.
+
+Partial transcripts, speech-update and function-call events change many times
+a second and are only interesting while a call is live, so they are kept in a
+fixed-size ring buffer per call instead of being written to SQLite. A global
+byte cap bounds the total: when it is exceeded, the oldest entries of the
+least recently active call are evicted first, and a single entry larger than
+the cap is truncated to fit. Sequence numbers are counted per call outside the
+ring, so they keep rising after a call's entries have all been evicted. When a
+call ends its buffer is written once to ``call_activity`` and released.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from database import CallActivity
+from metrics import registry
+
+RING_SIZE = 200  # Entries kept per call
+MAX_TOTAL_BYTES = int(os.getenv("LIVE_TRANSCRIPT_MAX_BYTES", str(8 * 1024 * 1024)))
+ENTRY_OVERHEAD = 200  # Rough per-entry cost of the dict and its fixed fields
+
+
+def _entry_size(text: Optional[str], data: Optional[dict]) -> int:
+    size = ENTRY_OVERHEAD + len(text or "")
+    if data:
+        size += len(json.dumps(data, default=str))
+    return size
+
+
+class CallBuffer:
+    def __init__(self, ring_size: int):
+        # (approximate size in bytes, entry)
+        self.entries: deque = deque(maxlen=ring_size)
+        self.bytes = 0
+
+
+class LiveTranscriptBuffer:
+    def __init__(self, ring_size: int = RING_SIZE, max_bytes: int = MAX_TOTAL_BYTES):
+        self.ring_size = ring_size
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        # Least recently active call first
+        self._calls: "OrderedDict[str, CallBuffer]" = OrderedDict()
+        # Kept until the call is discarded, even when eviction empties its buffer
+        self._next_seq: Dict[str, int] = {}
+
+    def record(self, call_id: str, kind: str, role: Optional[str] = None, text: Optional[str] = None,
+               data: Optional[dict] = None, at: Optional[datetime] = None) -> dict:
+        """Append an entry to the call's ring; returns it with its per-call sequence number"""
+        with self._lock:
+            buffer = self._calls.get(call_id)
+            if buffer is None:
+                buffer = self._calls[call_id] = CallBuffer(self.ring_size)
+            self._calls.move_to_end(call_id)
+
+            size = _entry_size(text, data)
+            if size > self.max_bytes:
+                # Too big for the whole buffer: keep the entry (and its place in the sequence) but not its payload
+                data = {"truncated": True}
+                text = text[:max(self.max_bytes - _entry_size(None, data), 0)] if text else text
+                size = _entry_size(text, data)
+                registry.increment("live_transcripts.truncated")
+
+            seq = self._next_seq.get(call_id, 1)
+            self._next_seq[call_id] = seq + 1
+            entry = {
+                "seq": seq,
+                "kind": kind,
+                "role": role,
+                "text": text,
+                "data": data,
+                "at": (at or datetime.utcnow()).isoformat(),
+            }
+            if len(buffer.entries) == buffer.entries.maxlen:
+                self._release(buffer, buffer.entries[0][0])
+            buffer.entries.append((size, entry))
+            buffer.bytes += size
+            self.total_bytes += size
+            self._enforce_cap()
+            registry.set_gauge("live_transcripts.bytes", self.total_bytes)
+            return entry
+
+    def _release(self, buffer: CallBuffer, size: int):
+        buffer.bytes -= size
+        self.total_bytes -= size
+
+    def _enforce_cap(self):
+        while self.total_bytes > self.max_bytes and self._calls:
+            call_id, buffer = next(iter(self._calls.items()))
+            self._release(buffer, buffer.entries.popleft()[0])
+            registry.increment("live_transcripts.evicted")
+            if not buffer.entries:
+                del self._calls[call_id]
+
+    def entries(self, call_id: str, since: int = 0) -> List[dict]:
+        """Buffered entries for a call with a sequence number above ``since``"""
+        with self._lock:
+            buffer = self._calls.get(call_id)
+            if buffer is None:
+                return []
+            return [entry for _, entry in buffer.entries if entry["seq"] > since]
+
+    def discard(self, call_id: str):
+        with self._lock:
+            buffer = self._calls.pop(call_id, None)
+            self._next_seq.pop(call_id, None)
+            if buffer is not None:
+                self.total_bytes -= buffer.bytes
+            registry.set_gauge("live_transcripts.bytes", self.total_bytes)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "calls": len(self._calls),
+                "entries": sum(len(buffer.entries) for buffer in self._calls.values()),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def flush(db, buffer: LiveTranscriptBuffer, call_id: str):
+    """Store a finished call's buffered activity; the buffer is released after commit"""
+    entries = buffer.entries(call_id)
+    if not entries:
+        return
+    activity = db.get(CallActivity, call_id)
+    if activity is None:
+        db.add(CallActivity(call_id=call_id, events=json.dumps(entries, default=str), flushed_at=datetime.utcnow()))
+        return
+    # A later end event (e.g. the end-of-call report after a hang) adds what arrived in between
+    stored = json.loads(activity.events)
+    last_seq = stored[-1]["seq"] if stored else 0
+    activity.events = json.dumps(stored + [entry for entry in entries if entry["seq"] > last_seq], default=str)
+    activity.flushed_at = datetime.utcnow()
+
+
+def stored_entries(db, call_id: str, since: int = 0) -> List[dict]:
+    activity = db.get(CallActivity, call_id)
+    if activity is None:
+        return []
+    return [entry for entry in json.loads(activity.events) if entry["seq"] > since]
+
+
+live_buffer = LiveTranscriptBuffer()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Check that a login burst doesn't stall the rest of the API
+
+Probes a cheap endpoint on its own, then again while N logins run
+concurrently, and prints both latency distributions. With password hashing on
+the thread pool the two should be close; with bcrypt on the event loop the
+probes queue up behind every login.
+
+Usage:
+    python load_test_auth.py --url http://localhost:8000 --email load@example.com --password 'Secret#123'
+    python load_test_auth.py --url http://localhost:8000 --email load@example.com --password 'Secret#123' --logins 50 --probe /health
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from metrics import Timing
+
+
+async def probe_until(client: httpx.AsyncClient, path: str, done: asyncio.Event, interval: float) -> Timing:
+    timing = Timing()
+    while not done.is_set():
+        started = time.perf_counter()
+        try:
+            await client.get(path)
+        except httpx.HTTPError as e:
+            print(f"Probe failed: {type(e).__name__}")
+        timing.observe(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+    return timing
+
+
+async def run(url: str, email: str, password: str, logins: int, probe: str, baseline_seconds: float, interval: float):
+    async with httpx.AsyncClient(base_url=url, timeout=60.0, limits=httpx.Limits(max_connections=logins + 10)) as client:
+        done = asyncio.Event()
+        baseline = asyncio.create_task(probe_until(client, probe, done, interval))
+        await asyncio.sleep(baseline_seconds)
+        done.set()
+        baseline_timing = await baseline
+
+        done = asyncio.Event()
+        during = asyncio.create_task(probe_until(client, probe, done, interval))
+        started = time.perf_counter()
+        responses = await asyncio.gather(
+            *(client.post("/auth/login", json={"email": email, "password": password}) for _ in range(logins)),
+            return_exceptions=True,
+        )
+        burst_seconds = time.perf_counter() - started
+        done.set()
+        during_timing = await during
+
+    statuses = {}
+    for response in responses:
+        key = response.status_code if isinstance(response, httpx.Response) else type(response).__name__
+        statuses[key] = statuses.get(key, 0) + 1
+    return baseline_timing.snapshot(), during_timing.snapshot(), statuses, burst_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API latency during a burst of concurrent logins")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True, help="An existing account to log in as")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=50, help="Concurrent logins in the burst")
+    parser.add_argument("--probe", default="/health", help="Endpoint whose latency is measured")
+    parser.add_argument("--baseline-seconds", type=float, default=2.0)
+    parser.add_argument("--interval", type=float, default=0.01, help="Pause between probe requests")
+    args = parser.parse_args()
+
+    baseline, during, statuses, burst_seconds = asyncio.run(
+        run(args.url, args.email, args.password, args.logins, args.probe, args.baseline_seconds, args.interval)
+    )
+    print(f"✅ {args.logins} logins finished in {burst_seconds:.2f}s: {statuses}")
+    print(f"   {args.probe} before the burst: {baseline}")
+    print(f"   {args.probe} during the burst: {during}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
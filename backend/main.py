@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, Depends, status, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Form, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
@@ -6,18 +6,42 @@ from typing import Optional, List
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, desc
 import os
+import asyncio
+import time
 import httpx
 import jwt
 from datetime import datetime, timedelta
 import uuid
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
 import uvicorn
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.requests import Request
 from fastapi import status
 # Local imports
-from database import get_db, create_tables, User, Agent, PhoneNumber, Call
+from database import get_db, create_tables, SessionLocal, User, Agent, PhoneNumber, Call, Campaign
+import call_export
+import analytics_engine
+import rollups
+import cost_forecast
+import leaderboard
+import timezones
+import metrics
+import webhooks
+import webhook_queue
+import transcripts
+import live_events
+import live_transcripts
+import call_enrichment
+import passwords
+import email_queue
+import google_tokens
+import campaigns
+import call_limits
+import call_queues
+import kb_upload
+import kb_chunking
+from resolver import owner_index
+from auth_cache import principals
 from auth_utils import AuthUtils, EmailService, GoogleAuth
 
 # Environment variables
@@ -38,17 +62,62 @@ app.add_middleware(
 
 # Security
 security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Initialize services
 email_service = EmailService()
 google_auth = GoogleAuth()
 auth_utils = AuthUtils()
 
+# Applies queued VAPI webhooks in the background
+webhook_consumer = webhook_queue.WebhookQueueConsumer(SessionLocal)
+
+# Delivers queued verification and reset emails over pooled SMTP connections
+email_dispatcher = email_queue.EmailDispatcher(SessionLocal, email_service)
+
 # Create database tables on startup
 @app.on_event("startup")
 async def startup_event():
     create_tables()
+    
+    # Warm the webhook owner lookups and recent fingerprints before the consumer starts applying events
+    db = SessionLocal()
+    try:
+        owner_index.warm(db)
+        webhook_queue.dedup_index.warm(db)
+    finally:
+        db.close()
+    webhook_consumer.start()
+    
+    # Fetch final artifacts for calls that end from now on, and any missed before a restart
+    call_enrichment.enricher.start(SessionLocal, lambda vapi_id: call_vapi_api(f"/call/{vapi_id}"))
+    db = SessionLocal()
+    try:
+        call_enrichment.enricher.sweep(db)
+    finally:
+        db.close()
+    
+    email_dispatcher.start()
+    
+    # Resume campaigns; placements cut off by a restart are matched to their calls or dialed again
+    db = SessionLocal()
+    try:
+        call_limits.limiter.seed(db)
+        call_queues.index.seed(db)
+        campaigns.dialer.recover(db)
+    finally:
+        db.close()
+    campaigns.dialer.start(SessionLocal, lambda payload: call_vapi_api("/call", method="POST", data=payload))
+    
+    # Google's signing keys, so the first Google sign-in doesn't wait for them
+    if google_auth.client_id:
+        asyncio.create_task(google_tokens.jwks.warm())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await webhook_consumer.stop()
+    await call_enrichment.enricher.stop()
+    await email_dispatcher.stop()
+    await campaigns.dialer.stop()
 
 @app.get("/")
 async def root():
@@ -85,6 +154,9 @@ class ResetPasswordRequest(BaseModel):
 class VerifyEmailRequest(BaseModel):
     token: str
 
+class TimezoneUpdate(BaseModel):
+    timezone: str
+
 class AgentCreate(BaseModel):
     name: str
     industry: str
@@ -101,6 +173,7 @@ class AgentCreate(BaseModel):
     knowledgeBaseName: Optional[str] = None
     knowledgeBaseFile: Optional[str] = None  # Base64 encoded file content
     knowledgeBaseFileName: Optional[str] = None
+    knowledgeBaseId: Optional[str] = None  # From POST /knowledge-bases/upload
 
 class AgentUpdate(BaseModel):
     name: Optional[str] = None
@@ -141,11 +214,6 @@ class PhoneNumberUpdate(BaseModel):
     name: Optional[str] = None
     assistantId: Optional[str] = None  # Connect to an assistant
 
-class WebhookData(BaseModel):
-    # VAPI webhook data model
-    call: Optional[dict] = None
-    message: Optional[dict] = None
-
 # Helper functions
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -154,12 +222,27 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm="HS256")
     return encoded_jwt
 
+def release_connection(db: Session):
+    """End the session's read transaction so its pooled connection isn't held while bcrypt runs"""
+    db.commit()
+
+async def hash_password(password: str) -> str:
+    """bcrypt on the password pool; 503 when it is saturated"""
+    try:
+        return await passwords.hasher.hash(password)
+    except passwords.PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    cached_email = principals.token_email(credentials.credentials)
+    if cached_email:
+        return cached_email
     try:
         payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=["HS256"])
         user_email: str = payload.get("sub")
         if user_email is None:
             raise HTTPException(status_code=401, detail="Invalid token")
+        principals.remember_token(credentials.credentials, user_email, payload.get("exp"))
         return user_email
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
@@ -167,9 +250,14 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
         raise HTTPException(status_code=401, detail="Invalid token")
 
 def get_current_user(user_email: str = Depends(verify_token), db: Session = Depends(get_db)):
+    """The authenticated user; a detached copy, so load the row to change it"""
+    user = principals.user(user_email)
+    if user is not None:
+        return user
     user = db.query(User).filter(User.email == user_email).first()
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
+    principals.remember_user(user)
     return user
 
 def get_safe_voice_config(provider: str, voice_id: str = None, gender: str = None, model: str = None):
@@ -329,122 +417,81 @@ async def call_vapi_api(endpoint: str, method: str = "GET", data: dict = None):
             print(f"VAPI Unknown Error: {str(e)}")  # Debug logging
             raise HTTPException(status_code=500, detail=f"VAPI API call failed: {str(e)}")
 
-async def create_knowledge_base(name: str, file_content: str, file_name: str):
-    """Create a knowledge base in VAPI with uploaded file"""
-    try:
-        import base64
-        import tempfile
-        import os
-        
-        # Decode base64 file content
-        file_data = base64.b64decode(file_content)
-        
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{file_name}") as temp_file:
-            temp_file.write(file_data)
-            temp_file_path = temp_file.name
-        
-        try:
-            # Step 1: Upload file to VAPI first
-            print(f"Step 1: Uploading file {file_name} to VAPI")
-            
-            # Determine proper MIME type based on file extension
-            def get_mime_type(filename):
-                """Get proper MIME type for VAPI file upload"""
-                ext = filename.lower().split('.')[-1] if '.' in filename else ''
-                mime_types = {
-                    'txt': 'text/plain',
-                    'md': 'text/markdown', 
-                    'markdown': 'text/markdown',
-                    'pdf': 'application/pdf',
-                    'csv': 'text/csv',
-                    'tsv': 'text/tab-separated-values',
-                    'log': 'text/x-log',
-                    'js': 'text/javascript',
-                    'css': 'text/css',
-                    'html': 'text/html',
-                    'htm': 'text/html',
-                    'xml': 'application/xml',
-                    'json': 'application/json',
-                    'yaml': 'application/x-yaml',
-                    'yml': 'application/x-yaml',
-                    'doc': 'application/msword',
-                    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                    'ts': 'application/typescript'
-                }
-                return mime_types.get(ext, 'text/plain')  # Default to text/plain
-            
-            mime_type = get_mime_type(file_name)
-            print(f"Using MIME type: {mime_type} for file: {file_name}")
-            
-            async with httpx.AsyncClient() as client:
-                headers = {
-                    "Authorization": f"Bearer {VAPI_API_KEY}",
-                }
-                
-                with open(temp_file_path, 'rb') as f:
-                    files = {'file': (file_name, f, mime_type)}
-                    upload_url = f"{VAPI_BASE_URL}/file"
-                    
-                    print(f"VAPI File Upload: POST {upload_url}")
-                    upload_response = await client.post(
-                        upload_url,
-                        headers=headers,
-                        files=files
-                    )
-                    
-                    print(f"File Upload Response Status: {upload_response.status_code}")
-                    
-                    if upload_response.status_code >= 400:
-                        print(f"File upload error: {upload_response.text}")
-                        raise HTTPException(status_code=500, detail="Failed to upload file to VAPI")
-                    
-                    file_response = upload_response.json()
-                    file_id = file_response.get("id")
-                    
-                    if not file_id:
-                        raise HTTPException(status_code=500, detail="Failed to get file ID from upload")
-                    
-                    print(f"File uploaded successfully with ID: {file_id}")
-            
-            # Step 2: Create knowledge base with the uploaded file
-            print(f"Step 2: Creating knowledge base '{name}' with file ID: {file_id}")
-            
-            kb_payload = {
-                "name": name,
-                "provider": "trieve",
-                "searchPlan": {
-                    "searchType": "semantic",
-                    "topK": 3,
-                    "removeStopWords": True,
-                    "scoreThreshold": 0.7
-                },
-                "createPlan": {
-                    "type": "create",
-                    "chunkPlans": [
-                        {
-                            "fileIds": [file_id],
-                            "targetSplitsPerChunk": 50,
-                            "splitDelimiters": [".!?\n"],
-                            "rebalanceChunks": True
-                        }
-                    ]
+def trieve_knowledge_base_payload(name: str, file_id: str) -> dict:
+    """VAPI knowledge-base payload chunking an uploaded file with Trieve"""
+    return {
+        "name": name,
+        "provider": "trieve",
+        "searchPlan": {
+            "searchType": "semantic",
+            "topK": 3,
+            "removeStopWords": True,
+            "scoreThreshold": 0.7
+        },
+        "createPlan": {
+            "type": "create",
+            "chunkPlans": [
+                {
+                    "fileIds": [file_id],
+                    **kb_chunking.DEFAULT_PLAN.to_vapi()  # Previewed by POST /knowledge-bases/preview
                 }
-            }
-            
-            print(f"VAPI Knowledge Base API Call: POST {VAPI_BASE_URL}/knowledge-base")
-            print(f"VAPI Knowledge Base Payload: {kb_payload}")
-            
-            # Create the knowledge base
-            kb_response = await call_vapi_api("/knowledge-base", method="POST", data=kb_payload)
-            print(f"VAPI Knowledge Base Response: {kb_response}")
-            
-            return kb_response
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+            ]
+        }
+    }
+
+async def create_trieve_knowledge_base(name: str, file_id: str):
+    """Create a knowledge base in VAPI over a file already uploaded to VAPI"""
+    print(f"Creating knowledge base '{name}' with file ID: {file_id}")
+    kb_response = await call_vapi_api("/knowledge-base", method="POST", data=trieve_knowledge_base_payload(name, file_id))
+    print(f"VAPI Knowledge Base Response: {kb_response}")
+    return kb_response
+
+async def upload_vapi_file(chunks, file_name: str) -> str:
+    """Stream a file to VAPI /file and return its id"""
+    file_id, _ = await kb_upload.upload_file(chunks, file_name, VAPI_BASE_URL, VAPI_API_KEY)
+    return file_id
+
+async def delete_vapi_file(file_id: str):
+    """Best-effort removal of a VAPI file that turned out to be a duplicate"""
+    try:
+        await call_vapi_api(f"/file/{file_id}", method="DELETE")
+    except Exception as e:
+        print(f"Warning: Failed to delete duplicate VAPI file {file_id}: {str(e)}")
+
+async def vapi_knowledge_base_exists(known) -> bool:
+    """Whether a recorded knowledge base and its file are still in VAPI; assumed so if VAPI can't be reached"""
+    headers = {"Authorization": f"Bearer {VAPI_API_KEY}"}
+    try:
+        async with httpx.AsyncClient() as client:
+            for path in (f"/knowledge-base/{known.knowledge_base_id}", f"/file/{known.vapi_file_id}"):
+                response = await client.get(f"{VAPI_BASE_URL}{path}", headers=headers)
+                if response.status_code == 404:
+                    return False
+    except httpx.RequestError as e:
+        print(f"Warning: Could not check VAPI knowledge base {known.knowledge_base_id}: {str(e)}")
+    return True
+
+async def knowledge_base_for_file(db: Session, name: str, chunks, file_name: str, user_id: str, sha256: str = None):
+    """Knowledge base for a streamed file, reusing the one the user built from identical bytes if it still exists"""
+    return await kb_upload.upload_deduplicated(
+        db, chunks, file_name, name, user_id,
+        upload=upload_vapi_file,
+        create_knowledge_base=create_trieve_knowledge_base,
+        delete_file=delete_vapi_file,
+        knowledge_base_exists=vapi_knowledge_base_exists,
+        sha256=sha256,
+    )
+
+async def create_knowledge_base(db: Session, user_id: str, name: str, file_content: str, file_name: str):
+    """Create a knowledge base in VAPI from base64 file content (older clients; see /knowledge-bases/upload)"""
+    try:
+        # Hash first so a known file is reused without uploading it again
+        content = kb_upload.ContentHash()
+        for chunk in kb_upload.base64_chunks(file_content):
+            content.update(chunk)
+        # Decoded a slice at a time as it is streamed to VAPI
+        chunks = kb_upload.aiter_chunks(kb_upload.base64_chunks(file_content))
+        return await knowledge_base_for_file(db, name, chunks, file_name, user_id, content.hexdigest())
     
     except Exception as e:
         print(f"Knowledge base creation error: {str(e)}")
@@ -455,7 +502,7 @@ async def create_knowledge_base(name: str, file_content: str, file_name: str):
 
 # Auth routes
 @app.post("/auth/register")
-async def register(user_data: UserRegister, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def register(user_data: UserRegister, db: Session = Depends(get_db)):
     # Validate password
     is_valid, message = auth_utils.validate_password(user_data.password)
     if not is_valid:
@@ -474,7 +521,8 @@ async def register(user_data: UserRegister, background_tasks: BackgroundTasks, d
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Hash password
-    hashed_password = pwd_context.hash(user_data.password)
+    release_connection(db)
+    hashed_password = await hash_password(user_data.password)
     
     # Generate verification token
     verification_token = auth_utils.generate_verification_token()
@@ -495,8 +543,9 @@ async def register(user_data: UserRegister, background_tasks: BackgroundTasks, d
     db.commit()
     db.refresh(user)
     
-    # Send verification email in background
-    background_tasks.add_task(email_service.send_verification_email, user_data.email, verification_token)
+    # Queue the verification email; the dispatcher sends and retries it
+    email_queue.enqueue(db, user_data.email, *email_service.verification_message(verification_token))
+    email_dispatcher.notify()
     
     # Create access token
     access_token = create_access_token(data={"sub": user_data.email})
@@ -516,8 +565,21 @@ async def register(user_data: UserRegister, background_tasks: BackgroundTasks, d
 @app.post("/auth/login")
 async def login(login_data: UserLogin, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == login_data.email).first()
-    if not user or not pwd_context.verify(login_data.password, user.password_hash):
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    password_hash = user.password_hash
+    release_connection(db)
+    try:
+        valid, new_hash = await passwords.hasher.verify_and_update(login_data.password, password_hash)
+    except passwords.PasswordPoolBusy:
+        raise HTTPException(status_code=503, detail="Too many login attempts in progress, please retry", headers={"Retry-After": "1"})
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # Stored with an older work factor; upgrade it now that we have the password
+        user.password_hash = new_hash
+        db.commit()
+        principals.invalidate(user.email)
     
     access_token = create_access_token(data={"sub": login_data.email})
     
@@ -534,7 +596,7 @@ async def login(login_data: UserLogin, db: Session = Depends(get_db)):
     }
 
 @app.post("/auth/google")
-async def google_auth(auth_data: GoogleAuthRequest, db: Session = Depends(get_db)):
+async def google_sign_in(auth_data: GoogleAuthRequest, db: Session = Depends(get_db)):
     # Verify Google token
     user_info = await google_auth.verify_google_token(auth_data.token)
     if not user_info:
@@ -562,6 +624,7 @@ async def google_auth(auth_data: GoogleAuthRequest, db: Session = Depends(get_db
         if not user.google_id:
             user.google_id = user_info["google_id"]
             db.commit()
+            principals.invalidate(user.email)
     
     access_token = create_access_token(data={"sub": user.email})
     
@@ -578,7 +641,7 @@ async def google_auth(auth_data: GoogleAuthRequest, db: Session = Depends(get_db
     }
 
 @app.post("/auth/forgot-password")
-async def forgot_password(request: ForgotPasswordRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == request.email).first()
     if not user:
         # Don't reveal if email exists or not
@@ -591,9 +654,11 @@ async def forgot_password(request: ForgotPasswordRequest, background_tasks: Back
     user.reset_token = reset_token
     user.reset_token_expires = reset_token_expires
     db.commit()
+    principals.invalidate(user.email)
     
-    # Send reset email in background
-    background_tasks.add_task(email_service.send_password_reset_email, request.email, reset_token)
+    # Queue the reset email; the dispatcher sends and retries it
+    email_queue.enqueue(db, request.email, *email_service.password_reset_message(reset_token))
+    email_dispatcher.notify()
     
     return {"message": "If your email is registered, you will receive a password reset link"}
 
@@ -609,10 +674,12 @@ async def reset_password(request: ResetPasswordRequest, db: Session = Depends(ge
         raise HTTPException(status_code=400, detail=message)
     
     # Update password
-    user.password_hash = pwd_context.hash(request.new_password)
+    release_connection(db)
+    user.password_hash = await hash_password(request.new_password)
     user.reset_token = None
     user.reset_token_expires = None
     db.commit()
+    principals.invalidate(user.email)
     
     return {"message": "Password reset successfully"}
 
@@ -625,6 +692,7 @@ async def verify_email(request: VerifyEmailRequest, db: Session = Depends(get_db
     user.is_verified = True
     user.verification_token = None
     db.commit()
+    principals.invalidate(user.email)
     
     return {"message": "Email verified successfully"}
 
@@ -633,6 +701,24 @@ async def logout(current_user: User = Depends(get_current_user)):
     """Logout user (client-side token invalidation)"""
     return {"message": "Logged out successfully", "user": current_user.name}
 
+@app.get("/auth/timezone")
+async def get_timezone(current_user: User = Depends(get_current_user)):
+    """Get the timezone used to bucket the user's analytics"""
+    return {"timezone": timezones.get_zone(current_user.timezone).key}
+
+@app.put("/auth/timezone")
+async def update_timezone(timezone_data: TimezoneUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Set the IANA timezone (e.g. "America/New_York") used for daily and monthly analytics"""
+    if not timezones.is_valid_timezone(timezone_data.timezone):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {timezone_data.timezone}")
+    
+    # Rollups are stored in UTC, so changing the timezone needs no recomputation
+    user = db.get(User, current_user.id)
+    user.timezone = timezone_data.timezone
+    db.commit()
+    principals.invalidate(user.email)
+    return {"message": "Timezone updated successfully", "timezone": user.timezone}
+
 # Agent routes
 @app.get("/agents")
 async def get_agents(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -645,10 +731,12 @@ async def create_agent(agent_data: AgentCreate, current_user: User = Depends(get
     """Create a new agent using VAPI API"""
     try:
         # Handle knowledge base creation if provided
-        knowledge_base_id = None
-        if agent_data.knowledgeBaseName and agent_data.knowledgeBaseFile and agent_data.knowledgeBaseFileName:
+        knowledge_base_id = agent_data.knowledgeBaseId
+        if not knowledge_base_id and agent_data.knowledgeBaseName and agent_data.knowledgeBaseFile and agent_data.knowledgeBaseFileName:
             try:
                 kb_response = await create_knowledge_base(
+                    db=db,
+                    user_id=current_user.id,
                     name=agent_data.knowledgeBaseName,
                     file_content=agent_data.knowledgeBaseFile,
                     file_name=agent_data.knowledgeBaseFileName
@@ -748,6 +836,7 @@ async def create_agent(agent_data: AgentCreate, current_user: User = Depends(get
         db.add(agent)
         db.commit()
         db.refresh(agent)
+        owner_index.upsert_agent(agent)
         
         return agent
         
@@ -925,6 +1014,7 @@ async def update_agent(agent_id: str, agent_data: AgentUpdate, current_user: Use
     
     db.commit()
     db.refresh(agent)
+    owner_index.upsert_agent(agent)
     
     return agent
 
@@ -945,9 +1035,17 @@ async def delete_agent(agent_id: str, current_user: User = Depends(get_current_u
     # Delete from local database
     db.delete(agent)
     db.commit()
+    owner_index.remove_agent(agent)
     
     return {"message": "Agent deleted successfully"}
 
+async def acquire_call_slot(user_id: str, agent_id: Optional[str], phone_number_id: Optional[str]) -> str:
+    """Reserve a concurrent-call slot, waiting briefly if the number, agent or account is at capacity"""
+    try:
+        return await call_limits.limiter.acquire(call_limits.call_keys(user_id, agent_id, phone_number_id))
+    except call_limits.CallCapacityExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
 @app.post("/agents/{agent_id}/test")
 async def test_agent(
     agent_id: str, 
@@ -960,20 +1058,29 @@ async def test_agent(
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
     
+    # Validate phone number format
+    phone_number = test_data.get("phoneNumber")
+    if not phone_number:
+        raise HTTPException(status_code=400, detail="Phone number is required for test call")
+    
+    # Ensure phone number is in E.164 format
+    if not phone_number.startswith('+'):
+        # If it's a US number without +1, add it
+        if len(phone_number) == 10 and phone_number.isdigit():
+            phone_number = f"+1{phone_number}"
+        else:
+            raise HTTPException(status_code=400, detail="Phone number must be in E.164 format (e.g., +1234567890)")
+    
+    local_phone = None
+    if test_data.get("phoneNumberId"):
+        local_phone = db.query(PhoneNumber).filter(
+            and_(PhoneNumber.vapi_id == test_data.get("phoneNumberId"), PhoneNumber.user_id == current_user.id)
+        ).first()
+    
+    # Test calls count against the same concurrent-call limits as real ones; only valid requests take a slot
+    slot = await acquire_call_slot(current_user.id, agent.id, local_phone.id if local_phone else None)
+    
     try:
-        # Validate phone number format
-        phone_number = test_data.get("phoneNumber")
-        if not phone_number:
-            raise HTTPException(status_code=400, detail="Phone number is required for test call")
-        
-        # Ensure phone number is in E.164 format
-        if not phone_number.startswith('+'):
-            # If it's a US number without +1, add it
-            if len(phone_number) == 10 and phone_number.isdigit():
-                phone_number = f"+1{phone_number}"
-            else:
-                raise HTTPException(status_code=400, detail="Phone number must be in E.164 format (e.g., +1234567890)")
-        
         # Create a test call via VAPI
         vapi_payload = {
             "assistantId": agent.vapi_id or agent.id,
@@ -998,6 +1105,7 @@ async def test_agent(
             vapi_id=vapi_call.get("id"),
             user_id=current_user.id,
             agent_id=agent.id,
+            phone_number_id=local_phone.id if local_phone else None,
             phone_number=phone_number,
             direction="outbound",
             status="initiated",
@@ -1007,6 +1115,8 @@ async def test_agent(
         db.add(call)
         db.commit()
         db.refresh(call)
+        call_limits.limiter.bind(slot, call.id)
+        call_queues.index.track(call)
         
         return {
             "message": "Test call initiated successfully",
@@ -1016,6 +1126,7 @@ async def test_agent(
         }
         
     except Exception as e:
+        call_limits.limiter.release(slot)
         raise HTTPException(status_code=400, detail=f"Failed to initiate test call: {str(e)}")
 
 # Knowledge Base routes
@@ -1034,11 +1145,12 @@ async def create_knowledge_base_endpoint(
     name: str,
     file: str,  # Base64 encoded file
     filename: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """Create a knowledge base with file upload"""
     try:
-        kb_response = await create_knowledge_base(name, file, filename)
+        kb_response = await create_knowledge_base(db, current_user.id, name, file, filename)
         if kb_response:
             return kb_response
         else:
@@ -1046,6 +1158,91 @@ async def create_knowledge_base_endpoint(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Knowledge base creation failed: {str(e)}")
 
+@app.post("/knowledge-bases/upload")
+async def upload_knowledge_base(request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Create a knowledge base from a multipart upload, streamed to VAPI as it arrives.
+
+    Fields: ``name``, optional ``sha256`` (hex digest of the file) and ``file``, in that order.
+    Files already uploaded once reuse their VAPI file and knowledge base.
+    """
+    if not VAPI_API_KEY:
+        raise HTTPException(status_code=500, detail="VAPI API key not configured")
+    try:
+        stream = kb_upload.MultipartStream(request.stream(), request.headers.get("content-type"))
+        name = sha256 = None
+        kb_response = None
+        async for part in stream.parts():
+            if part.name == "name":
+                name = (await part.text()).strip()
+            elif part.name == "sha256":
+                sha256 = kb_upload.normalize_sha256(await part.text())
+            elif part.name == "file" and part.filename and not kb_response:
+                kb_response = await knowledge_base_for_file(
+                    db, name or os.path.splitext(part.filename)[0], kb_upload.limit_size(part.chunks()),
+                    part.filename, current_user.id, sha256
+                )
+    except kb_upload.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=503, detail=f"VAPI file upload failed: {str(e)}")
+
+    if not kb_response:
+        raise HTTPException(status_code=400, detail="A file is required")
+    return kb_response
+
+@app.post("/knowledge-bases/preview")
+async def preview_knowledge_base_chunks(
+    request: Request,
+    target_splits_per_chunk: Optional[int] = None,
+    split_delimiters: Optional[List[str]] = Query(None),
+    rebalance_chunks: Optional[bool] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Chunk a multipart ``file`` (text, Markdown or CSV) locally with a Trieve chunk plan.
+
+    Plan settings left out are those knowledge bases are created with. Returns chunk and
+    split counts, the chunk size distribution and the first chunk, without uploading
+    anything to VAPI.
+    """
+    started = time.perf_counter()
+    default = kb_chunking.DEFAULT_PLAN
+    try:
+        plan = kb_chunking.ChunkPlan(
+            default.target_splits_per_chunk if target_splits_per_chunk is None else target_splits_per_chunk,
+            split_delimiters or list(default.split_delimiters),
+            default.rebalance_chunks if rebalance_chunks is None else rebalance_chunks,
+        )
+        stream = kb_upload.MultipartStream(request.stream(), request.headers.get("content-type"))
+        summary = None
+        async for part in stream.parts():
+            if part.name == "file" and part.filename and summary is None:
+                fmt = kb_chunking.file_format(part.filename)
+                if not fmt:
+                    raise HTTPException(status_code=415, detail="Preview supports text, Markdown and CSV files")
+                preview = kb_chunking.ChunkPreview(fmt, plan)
+                # Splitting is CPU work: batch it up and keep it off the event loop
+                batch = bytearray()
+                async for chunk in kb_upload.limit_size(part.chunks()):
+                    batch += chunk
+                    if len(batch) >= kb_chunking.FEED_BYTES:
+                        await asyncio.to_thread(preview.feed, bytes(batch))
+                        batch.clear()
+                if batch:
+                    await asyncio.to_thread(preview.feed, bytes(batch))
+                summary = {"filename": part.filename, **await asyncio.to_thread(preview.finish)}
+    except kb_chunking.PreviewError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except kb_upload.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    if summary is None:
+        raise HTTPException(status_code=400, detail="A file is required")
+    summary["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    metrics.registry.observe("kb_chunking.preview", summary["elapsed_ms"] / 1000)
+    return summary
+
 # Phone number routes
 @app.get("/phone-numbers")
 async def get_phone_numbers(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -1253,6 +1450,7 @@ async def create_phone_number(phone_data: PhoneNumberCreate, current_user: User
         db.add(phone_number)
         db.commit()
         db.refresh(phone_number)
+        owner_index.upsert_phone(phone_number)
         
         # Determine warning messages and capabilities
         warning_message = None
@@ -1315,6 +1513,7 @@ async def delete_phone_number(phone_id: str, current_user: User = Depends(get_cu
     # Delete from local database
     db.delete(phone_number)
     db.commit()
+    owner_index.remove_phone(phone_number)
     
     return {"message": "Phone number deleted successfully"}
 
@@ -1357,6 +1556,7 @@ async def update_phone_number(
         # Update in local database
         phone_number.updated_at = datetime.utcnow()
         db.commit()
+        owner_index.upsert_phone(phone_number)
         
         return {
             "success": True,
@@ -1672,6 +1872,44 @@ async def get_calls(
             query = query.limit(limit)
         return query.all()
 
+@app.get("/calls/export")
+async def export_calls(
+    format: str = "parquet",
+    columns: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    chunk_size: int = call_export.DEFAULT_CHUNK_SIZE,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Stream the user's call history as Parquet, Arrow IPC or CSV from the local database"""
+    try:
+        selected_columns = call_export.parse_columns(columns)
+        call_export.check_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if chunk_size < 1 or chunk_size > 100000:
+        raise HTTPException(status_code=400, detail="chunk_size must be between 1 and 100000")
+    
+    stream = call_export.export_calls(
+        db.get_bind(),
+        current_user.id,
+        export_format=format,
+        columns=selected_columns,
+        start=start,
+        end=end,
+        chunk_size=chunk_size
+    )
+    
+    format_info = call_export.EXPORT_FORMATS[format]
+    filename = f"calls-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{format_info['extension']}"
+    return StreamingResponse(
+        stream,
+        media_type=format_info["media_type"],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @app.get("/calls/active")
 async def get_active_calls(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Get active calls - synced from VAPI"""
@@ -1696,6 +1934,31 @@ async def get_active_calls(current_user: User = Depends(get_current_user), db: S
         ).order_by(desc(Call.started_at)).all()
         return active_calls
 
+@app.get("/calls/live")
+async def stream_live_calls(token: str):
+    """Server-Sent Events stream of the user's call lifecycle and transcript events.
+
+    Starts with a ``snapshot`` of active calls, then pushes call-start,
+    status-update, transcript and call-end events as webhooks are applied.
+    EventSource can't send headers, so the JWT is passed as ``token``.
+    """
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    # Not Depends(get_db): that session would hold a pooled connection until the stream ends
+    with SessionLocal() as db:
+        user = get_current_user(verify_token(credentials), db)
+        user_id = user.id
+        active_calls = db.query(Call).filter(
+            and_(Call.user_id == user_id, Call.status.in_(live_events.ACTIVE_STATUSES))
+        ).order_by(desc(Call.started_at)).all()
+        snapshot = {"calls": [live_events.call_state(call) for call in active_calls]}
+
+    subscriber = live_events.broker.subscribe(user_id)
+    return StreamingResponse(
+        live_events.broker.stream(subscriber, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/calls/missed")
 async def get_missed_calls(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Get missed calls - synced from VAPI"""
@@ -1930,66 +2193,71 @@ async def get_recordings_by_agent(agent_id: str, current_user: User = Depends(ge
 
 @app.get("/calls/queues")
 async def get_call_queues(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Get queued calls - synced from VAPI"""
-    try:
-        # Sync calls from VAPI
-        all_calls = await sync_user_calls_from_vapi(current_user, db)
-        
-        # Filter for queued calls
-        queued_calls = [call for call in all_calls if call.status == "queued"]
-        
-        # Sort by created_at ascending (FIFO queue)
-        queued_calls.sort(key=lambda x: x.created_at or datetime.min)
-        
-        return {
-            "queued_calls": queued_calls,
-            "queue_length": len(queued_calls),
-            "total_wait_time": sum([
-                (datetime.utcnow() - (call.created_at or datetime.utcnow())).total_seconds() 
-                for call in queued_calls
-            ])
-        }
-        
-    except Exception as e:
-        print(f"Error fetching call queues: {str(e)}")
-        # Fallback to local database
-        queued_calls = db.query(Call).filter(
-            and_(Call.user_id == current_user.id, Call.status == "queued")
-        ).order_by(Call.created_at).all()
-        return {
-            "queued_calls": queued_calls,
-            "queue_length": len(queued_calls),
-            "total_wait_time": 0
-        }
+    """Queued calls in service order, with wait statistics per agent and phone number"""
+    entries = call_queues.index.user_queue(current_user.id)
+    calls_by_id = {
+        call.id: call for call in db.query(Call).filter(Call.id.in_([entry["call_id"] for entry in entries])).all()
+    } if entries else {}
+    
+    queued_calls = []
+    for entry in entries:
+        call = calls_by_id.get(entry["call_id"])
+        if call is None:
+            continue
+        queued_calls.append({
+            **{column.key: getattr(call, column.key) for column in Call.__table__.columns},
+            "queue_position": entry["position"],
+            "priority": entry["priority"],
+            "wait_seconds": entry["wait_seconds"]
+        })
+    
+    agent_ids = [agent_id for (agent_id,) in db.query(Agent.id).filter(Agent.user_id == current_user.id)]
+    phone_ids = [phone_id for (phone_id,) in db.query(PhoneNumber.id).filter(PhoneNumber.user_id == current_user.id)]
+    stats = call_queues.index.stats(current_user.id, agent_ids, phone_ids)
+    
+    return {
+        "queued_calls": queued_calls,
+        "queue_length": stats["user"]["length"],
+        "total_wait_time": stats["user"]["total_wait_seconds"],
+        "wait_stats": stats["user"],
+        "by_agent": stats["by_agent"],
+        "by_phone_number": stats["by_phone_number"]
+    }
 
 @app.post("/calls")
 async def create_call(call_data: CallCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Create a new outbound call"""
+    # Get agent and phone number
+    agent = db.query(Agent).filter(and_(Agent.id == call_data.agent_id, Agent.user_id == current_user.id)).first()
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    
+    phone_number = None
+    if call_data.phone_number_id:
+        phone_number = db.query(PhoneNumber).filter(
+            and_(PhoneNumber.id == call_data.phone_number_id, PhoneNumber.user_id == current_user.id)
+        ).first()
+        if not phone_number:
+            raise HTTPException(status_code=404, detail="Phone number not found")
+    
+    # Validate phone number format
+    customer_number = call_data.customer_number
+    if not customer_number.startswith('+'):
+        if len(customer_number) == 10 and customer_number.isdigit():
+            customer_number = f"+1{customer_number}"
+        else:
+            raise HTTPException(status_code=400, detail="Customer phone number must be in E.164 format (e.g., +1234567890)")
+    
+    # Only a valid call for the user's own agent and number takes a slot
+    slot = await acquire_call_slot(current_user.id, agent.id, phone_number.id if phone_number else None)
     try:
-        # Get agent and phone number
-        agent = db.query(Agent).filter(and_(Agent.id == call_data.agent_id, Agent.user_id == current_user.id)).first()
-        if not agent:
-            raise HTTPException(status_code=404, detail="Agent not found")
-        
-        # Validate phone number format
-        customer_number = call_data.customer_number
-        if not customer_number.startswith('+'):
-            if len(customer_number) == 10 and customer_number.isdigit():
-                customer_number = f"+1{customer_number}"
-            else:
-                raise HTTPException(status_code=400, detail="Customer phone number must be in E.164 format (e.g., +1234567890)")
-        
         vapi_payload = {
             "customer": {"number": customer_number},
             "assistantId": agent.vapi_id or agent.id
         }
         
-        if call_data.phone_number_id:
-            phone_number = db.query(PhoneNumber).filter(
-                and_(PhoneNumber.id == call_data.phone_number_id, PhoneNumber.user_id == current_user.id)
-            ).first()
-            if phone_number and phone_number.vapi_id:
-                vapi_payload["phoneNumberId"] = phone_number.vapi_id
+        if phone_number and phone_number.vapi_id:
+            vapi_payload["phoneNumberId"] = phone_number.vapi_id
         
         # Create call in VAPI
         vapi_call = await call_vapi_api("/call", method="POST", data=vapi_payload)
@@ -2011,12 +2279,62 @@ async def create_call(call_data: CallCreate, current_user: User = Depends(get_cu
         db.add(call)
         db.commit()
         db.refresh(call)
+        call_limits.limiter.bind(slot, call.id)
+        call_queues.index.track(call)
         
         return call
         
     except Exception as e:
+        call_limits.limiter.release(slot)
         raise HTTPException(status_code=400, detail=f"Failed to create call: {str(e)}")
 
+@app.get("/calls/analytics")
+async def get_call_analytics(
+    current_user: User = Depends(get_current_user), 
+    db: Session = Depends(get_db),
+    days: int = 30
+):
+    """Get call analytics for the user"""
+    try:
+        # Sync recent calls first
+        await sync_user_calls_from_vapi(current_user, db)
+        
+        # Calculate date range
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=days)
+        
+        # Pull only the analytics columns for calls in the date range
+        frame = analytics_engine.load_call_frame(db, current_user.id, start_date, end_date, time_column="started_at")
+        
+        user_tz = timezones.get_zone(current_user.timezone)
+        
+        # Agent statistics are computed per agent ID, then labelled by name
+        agent_stats = {}
+        per_agent = analytics_engine.agent_statistics(frame)
+        names = analytics_engine.agent_names(db, list(per_agent))
+        for agent_id, stats in per_agent.items():
+            if agent_id not in names:
+                continue
+            entry = agent_stats.setdefault(names[agent_id], {"total": 0, "successful": 0, "duration": 0})
+            entry["total"] += stats["total"]
+            entry["successful"] += stats["successful"]
+            entry["duration"] += stats["duration"]
+        
+        return {
+            "period_days": days,
+            "summary": analytics_engine.summary(frame),
+            "timezone": user_tz.key,
+            "calls_by_day": analytics_engine.calls_by_day(frame, tz=user_tz),
+            "calls_by_status": analytics_engine.calls_by_status(frame),
+            "agent_statistics": agent_stats,
+            "duration_histogram": analytics_engine.duration_histogram(frame),
+            "cost_distribution": analytics_engine.cost_distribution(frame),
+            "hourly_heatmap": analytics_engine.hourly_heatmap(frame, tz=user_tz)
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get analytics: {str(e)}")
+
 @app.get("/calls/{call_id}")
 async def get_call(call_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Get a specific call with latest data from VAPI"""
@@ -2158,6 +2476,36 @@ async def end_call(call_id: str, current_user: User = Depends(get_current_user),
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to end call: {str(e)}")
 
+def ensure_enrichment(call: Call):
+    """Queue background enrichment for an ended call whose artifacts were never fetched"""
+    if call.vapi_id and not call.enriched_at and call.status not in live_events.ACTIVE_STATUSES:
+        call_enrichment.enricher.schedule(call.id, delay=0)
+
+@app.get("/calls/{call_id}/live-transcript")
+async def get_live_transcript(call_id: str, since: int = 0, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Final transcript segments plus partial speech and function-call activity for a call.
+
+    While the call is live the activity comes from memory; once it has ended
+    it comes from what was flushed at call end. Pass the last ``seq`` seen as
+    ``since`` to only get newer activity.
+    """
+    call = db.query(Call).filter(and_(Call.id == call_id, Call.user_id == current_user.id)).first()
+    if not call:
+        raise HTTPException(status_code=404, detail="Call not found")
+    
+    live = live_transcripts.live_buffer.entries(call.id, since)
+    if not live:
+        live = live_transcripts.stored_entries(db, call.id, since)
+    return {
+        "call_id": call.id,
+        "status": call.status,
+        "segments": [
+            {"seq": segment.seq, "role": segment.role, "text": segment.text, "timestamp": segment.timestamp}
+            for segment in transcripts.load_segments(db, call.id)
+        ],
+        "live": live
+    }
+
 @app.get("/calls/{call_id}/transcript")
 async def get_call_transcript(call_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Get the transcript for a specific call"""
@@ -2165,28 +2513,17 @@ async def get_call_transcript(call_id: str, current_user: User = Depends(get_cur
     if not call:
         raise HTTPException(status_code=404, detail="Call not found")
     
-    try:
-        # Try to get latest transcript from VAPI
-        if call.vapi_id:
-            vapi_call = await call_vapi_api(f"/call/{call.vapi_id}")
-            if vapi_call and vapi_call.get("transcript"):
-                call.transcript = vapi_call.get("transcript")
-                call.updated_at = datetime.utcnow()
-                db.commit()
-        
-        return {
-            "call_id": call.id,
-            "transcript": call.transcript,
-            "has_transcript": bool(call.transcript and call.transcript.strip())
-        }
-        
-    except Exception as e:
-        print(f"Failed to get transcript from VAPI: {str(e)}")
-        return {
-            "call_id": call.id,
-            "transcript": call.transcript,
-            "has_transcript": bool(call.transcript and call.transcript.strip())
-        }
+    # Final artifacts are fetched in the background after the call ends; never wait on VAPI here
+    ensure_enrichment(call)
+    
+    # Calls still in progress are assembled from their live transcript segments
+    transcript = transcripts.transcript_for(db, call)
+    return {
+        "call_id": call.id,
+        "transcript": transcript,
+        "summary": call.summary,
+        "has_transcript": bool(transcript and transcript.strip())
+    }
 
 @app.get("/calls/{call_id}/recording")
 async def get_call_recording(call_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -2195,28 +2532,137 @@ async def get_call_recording(call_id: str, current_user: User = Depends(get_curr
     if not call:
         raise HTTPException(status_code=404, detail="Call not found")
     
+    ensure_enrichment(call)
+    return {
+        "call_id": call.id,
+        "recording_url": call.recording_url,
+        "has_recording": bool(call.recording_url and call.recording_url.strip())
+    }
+
+@app.get("/call-capacity")
+async def get_call_capacity(current_user: User = Depends(get_current_user)):
+    """Live calls against the concurrent-call limits for the user's numbers and agents"""
+    return call_limits.limiter.utilization(current_user.id)
+
+# Campaign routes
+MAX_CONTACT_LIST_BYTES = 5 * 1024 * 1024
+
+def get_user_campaign(campaign_id: str, current_user: User, db: Session) -> Campaign:
+    campaign = db.query(Campaign).filter(
+        and_(Campaign.id == campaign_id, Campaign.user_id == current_user.id)
+    ).first()
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign
+
+@app.post("/campaigns")
+async def create_campaign(
+    file: UploadFile = File(...),
+    name: str = Form(...),
+    agent_id: str = Form(...),
+    phone_number_id: str = Form(...),
+    max_concurrent: int = Form(2),
+    calls_per_minute: int = Form(10),
+    default_region: str = Form("US"),
+    start: bool = Form(False),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Create an outbound campaign from a CSV or JSON contact list"""
+    agent = db.query(Agent).filter(and_(Agent.id == agent_id, Agent.user_id == current_user.id)).first()
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    phone_number = db.query(PhoneNumber).filter(
+        and_(PhoneNumber.id == phone_number_id, PhoneNumber.user_id == current_user.id)
+    ).first()
+    if not phone_number:
+        raise HTTPException(status_code=404, detail="Phone number not found")
+    if not phone_number.vapi_id:
+        raise HTTPException(status_code=400, detail="Phone number is not registered with VAPI")
+    if not 1 <= max_concurrent <= campaigns.MAX_CONCURRENT:
+        raise HTTPException(status_code=400, detail=f"max_concurrent must be between 1 and {campaigns.MAX_CONCURRENT}")
+    if not 1 <= calls_per_minute <= campaigns.MAX_CALLS_PER_MINUTE:
+        raise HTTPException(status_code=400, detail=f"calls_per_minute must be between 1 and {campaigns.MAX_CALLS_PER_MINUTE}")
+    
+    content = await file.read(MAX_CONTACT_LIST_BYTES + 1)
+    if len(content) > MAX_CONTACT_LIST_BYTES:
+        raise HTTPException(status_code=413, detail="Contact list is too large")
     try:
-        # Try to get latest recording URL from VAPI
-        if call.vapi_id:
-            vapi_call = await call_vapi_api(f"/call/{call.vapi_id}")
-            if vapi_call and vapi_call.get("recordingUrl"):
-                call.recording_url = vapi_call.get("recordingUrl")
-                call.updated_at = datetime.utcnow()
-                db.commit()
-        
-        return {
-            "call_id": call.id,
-            "recording_url": call.recording_url,
-            "has_recording": bool(call.recording_url and call.recording_url.strip())
-        }
-        
-    except Exception as e:
-        print(f"Failed to get recording from VAPI: {str(e)}")
-        return {
-            "call_id": call.id,
-            "recording_url": call.recording_url,
-            "has_recording": bool(call.recording_url and call.recording_url.strip())
-        }
+        rows = campaigns.parse_contacts(content, file.filename or "")
+    except campaigns.ContactListError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(rows) > campaigns.MAX_CONTACTS:
+        raise HTTPException(status_code=400, detail=f"Campaigns are limited to {campaigns.MAX_CONTACTS} contacts")
+    
+    contacts, invalid, duplicates = campaigns.normalize_contacts(rows, default_region.upper())
+    if not contacts:
+        raise HTTPException(status_code=400, detail={"message": "No valid phone numbers in contact list", "invalid": invalid[:100]})
+    
+    campaign = campaigns.create_campaign(
+        db, current_user.id, name, agent_id, phone_number_id, contacts,
+        max_concurrent=max_concurrent, calls_per_minute=calls_per_minute
+    )
+    if start:
+        campaign.status = "running"
+        campaign.started_at = datetime.utcnow()
+        db.commit()
+        campaigns.dialer.notify()
+    
+    return {
+        **campaigns.campaign_dict(campaign, campaigns.progress(db, [campaign.id])[campaign.id]),
+        "accepted": len(contacts),
+        "duplicates": duplicates,
+        "invalid_count": len(invalid),
+        "invalid": invalid[:100]
+    }
+
+@app.get("/campaigns")
+async def get_campaigns(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """User's campaigns with progress counts"""
+    user_campaigns = db.query(Campaign).filter(
+        Campaign.user_id == current_user.id
+    ).order_by(desc(Campaign.created_at)).all()
+    counts = campaigns.progress(db, [campaign.id for campaign in user_campaigns])
+    return [campaigns.campaign_dict(campaign, counts[campaign.id]) for campaign in user_campaigns]
+
+@app.get("/campaigns/{campaign_id}")
+async def get_campaign(campaign_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    campaign = get_user_campaign(campaign_id, current_user, db)
+    return campaigns.campaign_dict(campaign, campaigns.progress(db, [campaign.id])[campaign.id])
+
+@app.post("/campaigns/{campaign_id}/start")
+async def start_campaign(campaign_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Start or resume dialing"""
+    campaign = get_user_campaign(campaign_id, current_user, db)
+    if campaign.status not in ("draft", "paused"):
+        raise HTTPException(status_code=400, detail=f"Campaign is {campaign.status}")
+    campaign.status = "running"
+    campaign.started_at = campaign.started_at or datetime.utcnow()
+    db.commit()
+    campaigns.dialer.notify()
+    return campaigns.campaign_dict(campaign, campaigns.progress(db, [campaign.id])[campaign.id])
+
+@app.post("/campaigns/{campaign_id}/pause")
+async def pause_campaign(campaign_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Stop placing new calls; calls in progress continue"""
+    campaign = get_user_campaign(campaign_id, current_user, db)
+    if campaign.status != "running":
+        raise HTTPException(status_code=400, detail=f"Campaign is {campaign.status}")
+    campaign.status = "paused"
+    db.commit()
+    return campaigns.campaign_dict(campaign, campaigns.progress(db, [campaign.id])[campaign.id])
+
+@app.post("/campaigns/{campaign_id}/cancel")
+async def cancel_campaign(campaign_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Drop contacts not yet dialed"""
+    campaign = get_user_campaign(campaign_id, current_user, db)
+    if campaign.status in ("completed", "cancelled"):
+        raise HTTPException(status_code=400, detail=f"Campaign is {campaign.status}")
+    campaigns.cancel_pending(db, campaign.id)
+    campaign.status = "cancelled"
+    campaign.completed_at = datetime.utcnow()
+    db.commit()
+    return campaigns.campaign_dict(campaign, campaigns.progress(db, [campaign.id])[campaign.id])
 
 # Analytics routes
 @app.get("/analytics/dashboard")
@@ -2224,98 +2670,22 @@ async def get_dashboard_analytics(current_user: User = Depends(get_current_user)
     """Get dashboard analytics data specific to the current user - synced from VAPI"""
     try:
         # Sync calls from VAPI first
-        all_calls = await sync_user_calls_from_vapi(current_user, db)
+        await sync_user_calls_from_vapi(current_user, db)
         
-        # Calculate statistics from synced data
-        total_calls = len(all_calls)
-        
-        # Calculate total duration and cost
-        total_duration = sum([call.duration or 0 for call in all_calls]) / 60  # Convert to minutes
-        total_cost = sum([float(call.cost or 0) for call in all_calls])
+        # Calculate statistics from synced data, using only the columns we need
+        frame = analytics_engine.load_call_frame(db, current_user.id)
+        dashboard = analytics_engine.dashboard_metrics(frame, tz=timezones.get_zone(current_user.timezone))
         
         # Get agent and phone number counts
         total_agents = db.query(Agent).filter(Agent.user_id == current_user.id).count()
         active_agents = db.query(Agent).filter(and_(Agent.user_id == current_user.id, Agent.status == "active")).count()
         active_phone_numbers = db.query(PhoneNumber).filter(and_(PhoneNumber.user_id == current_user.id, PhoneNumber.status == "active")).count()
         
-        # Calculate recent calls (last 7 days)
-        seven_days_ago = datetime.utcnow() - timedelta(days=7)
-        recent_calls = len([
-            call for call in all_calls 
-            if call.created_at and call.created_at >= seven_days_ago
-        ])
-        
-        # Calculate average call duration for completed calls
-        completed_calls = [
-            call for call in all_calls 
-            if call.status in ["completed", "ended"] and call.duration and call.duration > 0
-        ]
-        
-        avg_duration = 0
-        if completed_calls:
-            avg_duration = sum([call.duration or 0 for call in completed_calls]) / len(completed_calls) / 60  # in minutes
-        
-        # Calculate today's calls
-        today = datetime.utcnow().date()
-        calls_today = len([
-            call for call in all_calls 
-            if call.created_at and call.created_at.date() >= today
-        ])
-        
-        # Calculate this month's calls
-        this_month = datetime.utcnow().replace(day=1)
-        calls_this_month = len([
-            call for call in all_calls 
-            if call.created_at and call.created_at >= this_month
-        ])
-        
-        # Calculate active calls
-        active_statuses = ["queued", "ringing", "in-progress", "forwarding", "speaking"]
-        active_calls_count = len([
-            call for call in all_calls 
-            if call.status in active_statuses
-        ])
-        
-        # Calculate missed calls
-        missed_calls_count = len([
-            call for call in all_calls 
-            if call.ended_reason in ["no-answer", "missed", "busy"] or 
-               (call.status == "ended" and (call.duration or 0) == 0)
-        ])
-        
-        # Calculate recorded calls
-        recorded_calls_count = len([
-            call for call in all_calls 
-            if call.recording_url and call.recording_url.strip()
-        ])
-        
-        # Calculate queued calls
-        queued_calls_count = len([
-            call for call in all_calls 
-            if call.status == "queued"
-        ])
-        
-        # Average cost per call
-        avg_cost_per_call = 0
-        if total_calls > 0:
-            avg_cost_per_call = total_cost / total_calls
-        
         return {
             "totalAgents": total_agents,
             "activeAgents": active_agents,
-            "totalCalls": total_calls,
-            "recentCalls": recent_calls,
-            "totalCost": round(total_cost, 2),
-            "averageDuration": round(avg_duration, 2),
-            "totalCallMinutes": round(total_duration, 2),
             "activePhoneNumbers": active_phone_numbers,
-            "averageCostPerCall": round(avg_cost_per_call, 2),
-            "callsToday": calls_today,
-            "callsThisMonth": calls_this_month,
-            "activeCalls": active_calls_count,
-            "missedCalls": missed_calls_count,
-            "recordedCalls": recorded_calls_count,
-            "queuedCalls": queued_calls_count
+            **dashboard
         }
         
     except Exception as e:
@@ -2345,12 +2715,15 @@ async def get_dashboard_analytics(current_user: User = Depends(get_current_user)
         if completed_calls:
             avg_duration = sum([call.duration or 0 for call in completed_calls]) / len(completed_calls) / 60
         
-        today = datetime.utcnow().date()
+        # Local midnight and month start in the user's timezone, as UTC
+        user_tz = timezones.get_zone(current_user.timezone)
+        local_today = timezones.local_now(user_tz).date()
+        today = timezones.local_midnight_utc(local_today, user_tz)
         calls_today = db.query(Call).filter(
             and_(Call.user_id == current_user.id, Call.created_at >= today)
         ).count()
         
-        this_month = datetime.utcnow().replace(day=1)
+        this_month = timezones.local_midnight_utc(local_today.replace(day=1), user_tz)
         calls_this_month = db.query(Call).filter(
             and_(Call.user_id == current_user.id, Call.created_at >= this_month)
         ).count()
@@ -2379,113 +2752,71 @@ async def get_dashboard_analytics(current_user: User = Depends(get_current_user)
   
     
 
-# Webhook endpoint for VAPI events
-@app.post("/webhook/vapi")
-async def vapi_webhook(webhook_data: dict, db: Session = Depends(get_db)):
-    """Handle VAPI webhook events for call logging and status updates"""
+@app.get("/analytics/burn-rate")
+async def get_burn_rate(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Get cost burn rate per agent and phone number with a month-end spend forecast"""
     try:
-        print(f"Received VAPI webhook: {webhook_data}")
-        
-        # Extract event type and data
-        message_type = webhook_data.get("message", {}).get("type")
-        call_data = webhook_data.get("message", {}).get("call", {})
-        
-        if not call_data:
-            print("No call data in webhook")
-            return {"status": "ignored", "reason": "no call data"}
-        
-        vapi_call_id = call_data.get("id")
-        if not vapi_call_id:
-            print("No call ID in webhook")
-            return {"status": "ignored", "reason": "no call ID"}
-        
-        # Find or create call record
-        call = db.query(Call).filter(Call.vapi_id == vapi_call_id).first()
-        
-        if message_type == "call-start":
-            # Create new call record if it doesn't exist
-            if not call:
-                # Extract phone number and assistant info
-                phone_number_data = call_data.get("phoneNumber", {})
-                assistant_data = call_data.get("assistant", {})
-                customer_data = call_data.get("customer", {})
-                
-                # Find the phone number in our database
-                phone_number = None
-                if phone_number_data.get("id"):
-                    phone_number = db.query(PhoneNumber).filter(PhoneNumber.vapi_id == phone_number_data.get("id")).first()
-                
-                # Find the assistant in our database
-                agent = None
-                if assistant_data.get("id"):
-                    agent = db.query(Agent).filter(Agent.vapi_id == assistant_data.get("id")).first()
-                
-                # Determine user_id from phone number or agent
-                user_id = None
-                if phone_number:
-                    user_id = phone_number.user_id
-                elif agent:
-                    user_id = agent.user_id
-                
-                if user_id:
-                    call = Call(
-                        id=str(uuid.uuid4()),
-                        vapi_id=vapi_call_id,
-                        user_id=user_id,
-                        agent_id=agent.id if agent else None,
-                        phone_number_id=phone_number.id if phone_number else None,
-                        phone_number=phone_number_data.get("number"),
-                        customer_number=customer_data.get("number"),
-                        direction=call_data.get("type", "inbound"),
-                        status=call_data.get("status", "in-progress"),
-                        started_at=datetime.utcnow() if call_data.get("startedAt") else None,
-                        created_at=datetime.utcnow()
-                    )
-                    db.add(call)
-                    db.commit()
-                    print(f"Created new call record for {vapi_call_id}")
-        
-        elif message_type in ["call-end", "call-ended"]:
-            # Update call with end information
-            if call:
-                call.status = call_data.get("status", "completed")
-                call.ended_reason = call_data.get("endedReason")
-                call.ended_at = datetime.utcnow()
-                
-                # Calculate duration if we have start and end times
-                if call.started_at and call.ended_at:
-                    duration_seconds = (call.ended_at - call.started_at).total_seconds()
-                    call.duration = int(duration_seconds)
-                
-                # Extract cost information
-                if "cost" in call_data:
-                    call.cost = str(call_data.get("cost", 0))
-                
-                # Extract recording URL
-                if "recordingUrl" in call_data:
-                    call.recording_url = call_data.get("recordingUrl")
-                
-                # Extract transcript
-                if "transcript" in call_data:
-                    call.transcript = call_data.get("transcript")
-                
-                db.commit()
-                print(f"Updated call record for {vapi_call_id}")
-        
-        elif message_type == "transcript":
-            # Update transcript if call exists
-            if call:
-                transcript_text = webhook_data.get("message", {}).get("transcript", "")
-                if transcript_text:
-                    call.transcript = transcript_text
-                    db.commit()
-                    print(f"Updated transcript for call {vapi_call_id}")
+        now = datetime.utcnow()
+        user_tz = timezones.get_zone(current_user.timezone)
         
-        return {"status": "processed", "call_id": vapi_call_id}
+        # Bring the rollups up to date in a separate session and thread, then work only from them
+        try:
+            await asyncio.to_thread(rollups.refresh_in_own_session, SessionLocal, current_user.id, now)
+        except Exception as e:
+            # The last refresh is still a sound basis for the report
+            print(f"Rollup refresh failed, serving the last refresh: {str(e)}")
+        rows = rollups.load_rollups(db, current_user.id, cost_forecast.history_start(now, user_tz))
+        
+        agents = db.query(Agent.id, Agent.name).filter(Agent.user_id == current_user.id).all()
+        phone_numbers = db.query(PhoneNumber.id, PhoneNumber.name, PhoneNumber.number).filter(PhoneNumber.user_id == current_user.id).all()
+        
+        return cost_forecast.burn_rate_report(
+            rows,
+            now,
+            agent_labels={agent.id: agent.name for agent in agents},
+            phone_labels={phone.id: phone.name or phone.number for phone in phone_numbers},
+            tz=user_tz
+        )
         
     except Exception as e:
-        print(f"Error processing VAPI webhook: {str(e)}")
-        return {"status": "error", "error": str(e)}
+        print(f"Error computing burn rate: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to compute burn rate: {str(e)}")
+
+@app.get("/analytics/agents/leaderboard")
+async def get_agent_leaderboard(
+    days: int = 30,
+    rank_by: str = "volume",
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Compare agents over the last `days` days, with rank changes versus the period before"""
+    if days < 1 or days > 365:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 365")
+    
+    try:
+        agents = leaderboard.agent_leaderboard(db, current_user.id, days=days, rank_by=rank_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "period_days": days,
+        "rank_by": rank_by,
+        "agents": agents
+    }
+
+# Webhook endpoint for VAPI events
+@app.post("/webhook/vapi")
+async def vapi_webhook(request: Request, db: Session = Depends(get_db)):
+    """Queue a VAPI webhook event; it is applied to call records by the background consumer"""
+    try:
+        body = await request.body()
+        # The insert and commit run in a thread so a webhook burst doesn't stall the event loop
+        queue_id = await asyncio.to_thread(webhook_queue.enqueue, db, body)
+        webhook_consumer.notify()
+        return {"status": "queued", "id": queue_id}
+    except Exception as e:
+        print(f"Error queueing VAPI webhook: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to queue webhook")
 
 @app.post("/sync/calls")
 async def sync_calls_from_vapi(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -2565,6 +2896,46 @@ async def sync_calls_from_vapi(current_user: User = Depends(get_current_user), d
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
+@app.get("/health/webhooks")
+async def webhook_health_check(db: Session = Depends(get_db)):
+    """Webhook queue depth and lag, event counts and per-event-type processing latency"""
+    queue = webhook_queue.queue_stats(db)
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "queue": queue,
+        "resolver": owner_index.stats(),
+        "live_subscribers": live_events.broker.subscriber_count(),
+        "live_transcripts": live_transcripts.live_buffer.stats(),
+        **metrics.registry.snapshot("webhook.")
+    }
+
+@app.get("/health/passwords")
+async def password_pool_health_check():
+    """Password hashing pool occupancy, rejections and hash/verify/queue-wait timings"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "pool": passwords.hasher.stats(),
+        **metrics.registry.snapshot("passwords.")
+    }
+
+@app.get("/health/email")
+async def email_queue_health_check(db: Session = Depends(get_db)):
+    """Outbound email backlog, failures and SMTP send timings"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "queue": email_dispatcher.stats(db),
+        **metrics.registry.snapshot("email.")
+    }
+
+@app.get("/health/calls")
+async def call_capacity_health_check():
+    """Concurrent-call totals per limit scope, queued placements and wait timings (per-user detail: /call-capacity)"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "utilization": call_limits.limiter.totals(),
+        **metrics.registry.snapshot("call_limits.")
+    }
+
 @app.get("/health/vapi")
 async def vapi_health_check():
     """Check Vapi API connectivity"""
@@ -2683,194 +3054,6 @@ async def voice_check(current_user: User = Depends(get_current_user)):
 async def root():
     return {"message": "EmployAI API", "version": "1.0.0"}
 
-@app.post("/webhook/vapi")
-async def vapi_webhook(request: Request, db: Session = Depends(get_db)):
-    """Handle VAPI webhook events for real-time call updates"""
-    try:
-        data = await request.json()
-        message_type = data.get("message", {}).get("type")
-        call_data = data.get("message", {}).get("call", {})
-        
-        if not call_data or not message_type:
-            return {"status": "ignored", "reason": "no call data or message type"}
-        
-        vapi_id = call_data.get("id")
-        if not vapi_id:
-            return {"status": "ignored", "reason": "no VAPI call ID"}
-        
-        # Find the call in our database
-        call = db.query(Call).filter(Call.vapi_id == vapi_id).first()
-        
-        if not call:
-            # This might be a call initiated outside our system
-            # Try to create a record if we can determine the user
-            phone_number = call_data.get("phoneNumber", {}).get("number")
-            if phone_number:
-                # Try to find phone number in our system
-                local_phone = db.query(PhoneNumber).filter(PhoneNumber.number == phone_number).first()
-                if local_phone:
-                    # Create a new call record
-                    call_id = str(uuid.uuid4())
-                    call = Call(
-                        id=call_id,
-                        vapi_id=vapi_id,
-                        user_id=local_phone.user_id,
-                        phone_number_id=local_phone.id,
-                        customer_number=call_data.get("customer", {}).get("number", ""),
-                        direction="inbound" if call_data.get("type") == "inboundPhoneCall" else "outbound",
-                        status=call_data.get("status", "in-progress"),
-                        started_at=datetime.utcnow()
-                    )
-                    
-                    if call_data.get("assistantId"):
-                        agent = db.query(Agent).filter(
-                            and_(Agent.vapi_id == call_data.get("assistantId"), Agent.user_id == local_phone.user_id)
-                        ).first()
-                        if agent:
-                            call.agent_id = agent.id
-                    
-                    db.add(call)
-                    db.commit()
-                    db.refresh(call)
-            
-            if not call:
-                return {"status": "ignored", "reason": "call not found in system"}
-        
-        # Update call based on message type
-        if message_type == "status-update":
-            call.status = call_data.get("status", call.status)
-            
-        elif message_type == "transcript":
-            # Append to existing transcript or create new
-            new_transcript = call_data.get("transcript", "")
-            if new_transcript:
-                if call.transcript:
-                    call.transcript += "\n" + new_transcript
-                else:
-                    call.transcript = new_transcript
-            
-        elif message_type == "hang":
-            call.status = "completed"
-            call.ended_at = datetime.utcnow()
-            call.ended_reason = call_data.get("endedReason", "completed")
-            
-            # Update final call details
-            if call_data.get("duration"):
-                call.duration = call_data.get("duration")
-            if call_data.get("cost"):
-                call.cost = call_data.get("cost")
-            if call_data.get("recordingUrl"):
-                call.recording_url = call_data.get("recordingUrl")
-            if call_data.get("transcript"):
-                call.transcript = call_data.get("transcript")
-        
-        elif message_type == "speech-update":
-            # Handle speech updates (optional, for real-time transcription)
-            speech_data = call_data.get("speech", {})
-            if speech_data.get("text"):
-                # Could store intermediate transcripts here
-                pass
-        
-        elif message_type == "function-call":
-            # Handle function calls made by the assistant
-            function_data = call_data.get("functionCall", {})
-            # Log function calls for analytics
-            print(f"Function called: {function_data.get('name')} with args: {function_data.get('parameters')}")
-        
-        # Update timestamp
-        call.updated_at = datetime.utcnow()
-        
-        db.commit()
-        
-        return {
-            "status": "success", 
-            "message": f"Processed {message_type} for call {call.id}",
-            "call_id": call.id
-        }
-        
-    except Exception as e:
-        print(f"Webhook error: {str(e)}")
-        return {"status": "error", "message": str(e)}
-
-@app.get("/calls/analytics")
-async def get_call_analytics(
-    current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db),
-    days: int = 30
-):
-    """Get call analytics for the user"""
-    try:
-        # Sync recent calls first
-        await sync_user_calls_from_vapi(current_user.id, db)
-        
-        # Calculate date range
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=days)
-        
-        # Get calls in date range
-        calls = db.query(Call).filter(
-            and_(
-                Call.user_id == current_user.id,
-                Call.started_at >= start_date,
-                Call.started_at <= end_date
-            )
-        ).all()
-        
-        # Calculate analytics
-        total_calls = len(calls)
-        successful_calls = len([c for c in calls if c.status == "completed"])
-        failed_calls = len([c for c in calls if c.status in ["failed", "no-answer", "busy"]])
-        total_duration = sum([c.duration or 0 for c in calls])
-        total_cost = sum([c.cost or 0 for c in calls])
-        
-        # Calls by day
-        calls_by_day = {}
-        for call in calls:
-            day = call.started_at.date().isoformat()
-            if day not in calls_by_day:
-                calls_by_day[day] = {"inbound": 0, "outbound": 0}
-            calls_by_day[day][call.direction] += 1
-        
-        # Calls by status
-        calls_by_status = {}
-        for call in calls:
-            status = call.status or "unknown"
-            calls_by_status[status] = calls_by_status.get(status, 0) + 1
-        
-        # Top agents by call volume
-        agent_stats = {}
-        for call in calls:
-            if call.agent_id:
-                agent = db.query(Agent).filter(Agent.id == call.agent_id).first()
-                if agent:
-                    agent_name = agent.name
-                    if agent_name not in agent_stats:
-                        agent_stats[agent_name] = {"total": 0, "successful": 0, "duration": 0}
-                    agent_stats[agent_name]["total"] += 1
-                    if call.status == "completed":
-                        agent_stats[agent_name]["successful"] += 1
-                    agent_stats[agent_name]["duration"] += call.duration or 0
-        
-        return {
-            "period_days": days,
-            "summary": {
-                "total_calls": total_calls,
-                "successful_calls": successful_calls,
-                "failed_calls": failed_calls,
-                "success_rate": round((successful_calls / total_calls * 100) if total_calls > 0 else 0, 2),
-                "total_duration_minutes": round(total_duration / 60, 2) if total_duration else 0,
-                "average_duration_minutes": round((total_duration / total_calls / 60), 2) if total_calls > 0 else 0,
-                "total_cost": round(total_cost, 4) if total_cost else 0,
-                "average_cost_per_call": round((total_cost / total_calls), 4) if total_calls > 0 else 0
-            },
-            "calls_by_day": calls_by_day,
-            "calls_by_status": calls_by_status,
-            "agent_statistics": agent_stats
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get analytics: {str(e)}")
-
 @app.get("/voice-options")
 async def list_voice_options(current_user: User = Depends(get_current_user)):
     """
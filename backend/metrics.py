@@ -0,0 +1,95 @@
+"""
+In-process counters and latency timings.
+
+A single ``registry`` is shared by the webhook pipeline and other background
+work. Timings keep a bounded window of recent samples, so percentiles cost
+O(window) memory no matter how many events are observed.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict
+
+import numpy as np
+
+SAMPLE_WINDOW = 1024
+
+
+class Timing:
+    """Count, total and max of all observations plus percentiles over the recent window"""
+
+    def __init__(self, window: int = SAMPLE_WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def snapshot(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        p50, p95, p99 = np.percentile(np.fromiter(self.samples, dtype=np.float64), [50, 95, 99])
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3),
+            "p50_ms": round(float(p50) * 1000, 3),
+            "p95_ms": round(float(p95) * 1000, 3),
+            "p99_ms": round(float(p99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}
+        self.timings: Dict[str, Timing] = {}
+
+    def increment(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = Timing()
+            timing.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def snapshot(self, prefix: str = "") -> dict:
+        """Current values, optionally limited to metric names starting with ``prefix``"""
+        with self._lock:
+            return {
+                "counters": {name: value for name, value in self.counters.items() if name.startswith(prefix)},
+                "gauges": {name: value for name, value in self.gauges.items() if name.startswith(prefix)},
+                "timings": {name: timing.snapshot() for name, timing in self.timings.items() if name.startswith(prefix)},
+            }
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.timings.clear()
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Database migration to add post-call enrichment columns to calls
+"""
+
+import sqlite3
+import os
+
+def migrate_database():
+    """Add summary and enriched_at to the calls table"""
+    
+    # Database path
+    db_path = os.path.join(os.path.dirname(__file__), "EmployAI.db")
+    
+    if not os.path.exists(db_path):
+        print(f"Database not found at {db_path}")
+        return False
+    
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute("PRAGMA table_info(calls)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'summary' not in columns:
+            cursor.execute("ALTER TABLE calls ADD COLUMN summary TEXT")
+            print("Added summary column to calls table")
+        else:
+            print("summary column already exists in calls table")
+        
+        if 'enriched_at' not in columns:
+            cursor.execute("ALTER TABLE calls ADD COLUMN enriched_at DATETIME")
+            print("Added enriched_at column to calls table")
+        else:
+            print("enriched_at column already exists in calls table")
+        
+        conn.commit()
+        conn.close()
+        
+        print("Database migration completed successfully!")
+        return True
+        
+    except Exception as e:
+        print(f"Migration failed: {str(e)}")
+        return False
+
+if __name__ == "__main__":
+    migrate_database()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Database migration to add the 15-minute call rollups table
+"""
+
+import sqlite3
+import os
+
+def migrate_database():
+    """Create call_rollups and the calls index used to refresh it"""
+    
+    # Database path
+    db_path = os.path.join(os.path.dirname(__file__), "EmployAI.db")
+    
+    if not os.path.exists(db_path):
+        print(f"Database not found at {db_path}")
+        return False
+    
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS call_rollups (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                bucket_start DATETIME NOT NULL,
+                agent_id TEXT,
+                phone_number_id TEXT,
+                calls INTEGER,
+                duration INTEGER,
+                cost FLOAT,
+                refreshed_at DATETIME
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_call_rollups_user_bucket ON call_rollups (user_id, bucket_start)")
+        print("Created call_rollups table")
+        
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_calls_user_updated ON calls (user_id, updated_at)")
+        print("Created ix_calls_user_updated index on calls table")
+        
+        conn.commit()
+        conn.close()
+        
+        print("Database migration completed successfully!")
+        return True
+        
+    except Exception as e:
+        print(f"Migration failed: {str(e)}")
+        return False
+
+if __name__ == "__main__":
+    migrate_database()
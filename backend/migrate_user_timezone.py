@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Database migration to add the user timezone setting and move call rollups
+to quarter-hour buckets
+"""
+
+import sqlite3
+import os
+
+def migrate_database():
+    """Add timezone to users and clear hourly rollups so they rebuild at 15-minute granularity"""
+    
+    # Database path
+    db_path = os.path.join(os.path.dirname(__file__), "EmployAI.db")
+    
+    if not os.path.exists(db_path):
+        print(f"Database not found at {db_path}")
+        return False
+    
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        
+        # Check if timezone column already exists
+        cursor.execute("PRAGMA table_info(users)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        if 'timezone' not in columns:
+            cursor.execute("ALTER TABLE users ADD COLUMN timezone TEXT DEFAULT 'UTC'")
+            print("Added timezone column to users table")
+        else:
+            print("timezone column already exists in users table")
+        
+        # Hourly buckets can't be split into local days for :30/:45 offsets;
+        # the next refresh rebuilds everything from the calls table
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='call_rollups'")
+        if cursor.fetchone():
+            cursor.execute("DELETE FROM call_rollups")
+            print("Cleared call_rollups for rebuilding")
+        
+        conn.commit()
+        conn.close()
+        
+        print("Database migration completed successfully!")
+        return True
+        
+    except Exception as e:
+        print(f"Migration failed: {str(e)}")
+        return False
+
+if __name__ == "__main__":
+    migrate_database()
@@ -0,0 +1,104 @@
+"""
+Password hashing off the event loop.
+
+bcrypt costs hundreds of milliseconds of CPU per hash or verify. Running it
+inside an ``async def`` route stalls every other request, so ``hasher`` runs
+it on a small dedicated thread pool (bcrypt releases the GIL while hashing).
+At most ``MAX_PENDING`` operations may be queued or running; beyond that
+``PasswordPoolBusy`` is raised so a login burst is shed instead of building an
+unbounded backlog. Queue depth, wait time and hashing time are recorded in
+the metrics registry.
+
+The work factor is ``BCRYPT_ROUNDS``. Hashes made with fewer rounds still
+verify, and ``verify_and_update`` returns a fresh hash for them so the caller
+can store it: raising the setting upgrades users as they log in.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from metrics import registry
+
+WORK_FACTOR = int(os.getenv("BCRYPT_ROUNDS", "12"))
+WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "200"))
+
+
+class PasswordPoolBusy(Exception):
+    """Too many password operations are already waiting"""
+
+
+def make_context(rounds: int = WORK_FACTOR, scheme: str = "bcrypt") -> CryptContext:
+    # min_rounds marks weaker hashes as needing an update
+    return CryptContext(
+        schemes=[scheme],
+        deprecated="auto",
+        **{f"{scheme}__default_rounds": rounds, f"{scheme}__min_rounds": rounds},
+    )
+
+
+class PasswordHasher:
+    def __init__(self, context: CryptContext, workers: int = WORKERS, max_pending: int = MAX_PENDING):
+        self.context = context
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0  # Queued or running
+        self._running = 0
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.context.hash, password)
+
+    async def verify_and_update(self, password: str, password_hash: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """(valid, new hash to store if the old one used an outdated work factor)"""
+        if not password_hash:
+            # Accounts created through Google sign-in have no password
+            return False, None
+        return await self._run("verify", self.context.verify_and_update, password, password_hash)
+
+    async def _run(self, operation: str, function: Callable, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                registry.increment("passwords.rejected")
+                raise PasswordPoolBusy()
+            self._pending += 1
+            registry.set_gauge("passwords.queue_depth", self._pending - self._running)
+
+        queued = time.perf_counter()
+
+        def work():
+            with self._lock:
+                self._running += 1
+                registry.set_gauge("passwords.queue_depth", self._pending - self._running)
+            started = time.perf_counter()
+            registry.observe("passwords.wait", started - queued)
+            try:
+                return function(*args)
+            finally:
+                registry.observe(f"passwords.{operation}", time.perf_counter() - started)
+                with self._lock:
+                    self._running -= 1
+                    self._pending -= 1
+                    registry.set_gauge("passwords.queue_depth", self._pending - self._running)
+
+        # If the request goes away the work still finishes and releases its slot
+        return await asyncio.get_running_loop().run_in_executor(self._executor, work)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "max_pending": self.max_pending,
+            }
+
+
+hasher = PasswordHasher(make_context())
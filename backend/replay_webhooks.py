@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Replay logged VAPI webhooks for data repair or throughput benchmarking
+
+By default events are applied straight to the local database through the same
+code the webhook consumer uses, skipping events already processed. Use
+--no-dedup to re-apply them after fixing a handler bug, --include-dead-lettered
+to also retry events the queue gave up on, or --url to POST them to a running
+server instead.
+
+Usage:
+    python replay_webhooks.py --start 2024-05-17T14:00 --end 2024-05-17T15:00
+    python replay_webhooks.py --start 2024-05-17 --end 2024-05-18 --speed 10 --no-dedup
+    python replay_webhooks.py --start 2024-05-17 --end 2024-05-18 --include-dead-lettered
+    python replay_webhooks.py --start 2024-05-17 --end 2024-05-18 --speed max --url http://localhost:8000/webhook/vapi
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+import webhook_log
+import webhooks
+from database import SessionLocal
+from metrics import Timing
+from webhook_dedup import DedupIndex
+
+
+def parse_speed(value: str):
+    """'max' for no pacing, otherwise a multiple of real time"""
+    if value == "max":
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+def replay_to_database(events, dedup: bool = True, session_factory=SessionLocal):
+    """Apply events one transaction each, yielding (outcome, seconds) per event"""
+    index = DedupIndex() if dedup else None
+    db = session_factory()
+    try:
+        if index is not None:
+            index.warm(db)
+        for _, payload in events:
+            started = time.perf_counter()
+            try:
+                outcome = webhooks.process_webhook(db, payload, index)["status"]
+            except Exception as e:
+                db.rollback()
+                print(f"Replay failed for event: {str(e)}")
+                outcome = "failed"
+            yield outcome, time.perf_counter() - started
+    finally:
+        db.close()
+
+
+def replay_to_url(events, url: str):
+    """POST raw bodies to a webhook endpoint over one keep-alive connection, yielding (outcome, seconds)"""
+    with httpx.Client(timeout=30.0) as client:
+        for _, payload in events:
+            started = time.perf_counter()
+            try:
+                response = client.post(url, content=payload.encode("utf-8"), headers={"Content-Type": "application/json"})
+                outcome = "sent" if response.status_code < 400 else f"http_{response.status_code}"
+            except httpx.HTTPError as e:
+                print(f"Replay request failed: {str(e)}")
+                outcome = "failed"
+            yield outcome, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay raw webhook events from the event log")
+    parser.add_argument("--start", required=True, help="Replay events received on or after this UTC ISO date/time")
+    parser.add_argument("--end", required=True, help="Replay events received before this UTC ISO date/time")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="1 for real time, N for N times faster, or 'max'")
+    parser.add_argument("--url", default=None, help="POST events to this webhook URL instead of the local database")
+    parser.add_argument("--no-dedup", action="store_true", help="Re-apply events that were already processed")
+    parser.add_argument("--include-dead-lettered", action="store_true", help="Also replay events the queue gave up on")
+    parser.add_argument("--log-dir", default=None, help=f"Event log directory (default: {webhook_log.LOG_DIR})")
+    args = parser.parse_args()
+
+    try:
+        start = datetime.fromisoformat(args.start)
+        end = datetime.fromisoformat(args.end)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    logged = None if args.include_dead_lettered else (webhook_log.APPLIED,)
+    events = webhook_log.paced(webhook_log.read_events(start, end, args.log_dir, logged), args.speed)
+    if args.url:
+        outcomes = replay_to_url(events, args.url)
+    else:
+        outcomes = replay_to_database(events, dedup=not args.no_dedup)
+
+    counts = {}
+    timing = Timing()
+    started = time.perf_counter()
+    for outcome, seconds in outcomes:
+        timing.observe(seconds)
+        counts[outcome] = counts.get(outcome, 0) + 1
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"✅ Replayed {total} events in {elapsed:.2f}s ({rate:.1f} events/s)")
+    print(f"   Outcomes: {counts}")
+    if total:
+        print(f"   Per-event delivery time: {timing.snapshot()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
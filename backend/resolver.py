@@ -0,0 +1,196 @@
+"""
+In-memory indexes for resolving webhook calls to their owner.
+
+Every webhook needs (user_id, agent_id, phone_number_id) for the VAPI call it
+describes. Instead of up to three queries per event, ``owner_index`` keeps
+dictionaries keyed by VAPI phone number ID, phone number string and VAPI
+assistant ID. It is warmed at startup and kept current by the agent and phone
+number routes. A key that isn't indexed is looked up in the database once, so
+rows created by another process are still found; if it isn't there either,
+the miss is remembered for ``MISS_TTL`` so webhooks for unknown numbers and
+assistants don't query on every event. The route hooks clear a remembered miss
+as soon as a row with that key is created here.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from database import Agent, PhoneNumber
+
+MISS_TTL = float(os.getenv("RESOLVER_MISS_TTL", "60"))  # seconds
+MISS_CAPACITY = int(os.getenv("RESOLVER_MISS_CACHE_SIZE", "10000"))
+
+
+class PhoneEntry(NamedTuple):
+    user_id: str
+    phone_number_id: str
+    agent_id: Optional[str]  # Agent the number is connected to, if any
+
+
+class AgentEntry(NamedTuple):
+    user_id: str
+    agent_id: str
+
+
+class OwnerIndex:
+    def __init__(self, miss_ttl: float = MISS_TTL, miss_capacity: int = MISS_CAPACITY, clock=time.monotonic):
+        self.miss_ttl = miss_ttl
+        self.miss_capacity = miss_capacity
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.phones_by_vapi_id: Dict[str, PhoneEntry] = {}
+        self.phones_by_number: Dict[str, PhoneEntry] = {}
+        self.agents_by_vapi_id: Dict[str, AgentEntry] = {}
+        # Keys currently indexed for each row, so updates can drop stale ones
+        self._phone_keys: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        self._agent_keys: Dict[str, Optional[str]] = {}
+        # Keys known not to be in the database: (kind, key) -> expires
+        self._misses: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+
+    def warm(self, db):
+        """Load every phone number and agent with a VAPI ID"""
+        phones = db.query(PhoneNumber).all()
+        agents = db.query(Agent).filter(Agent.vapi_id.isnot(None)).all()
+        with self._lock:
+            self.phones_by_vapi_id.clear()
+            self.phones_by_number.clear()
+            self.agents_by_vapi_id.clear()
+            self._phone_keys.clear()
+            self._agent_keys.clear()
+            self._misses.clear()
+        for phone in phones:
+            self.upsert_phone(phone)
+        for agent in agents:
+            self.upsert_agent(agent)
+        print(f"Resolver index warmed with {len(phones)} phone numbers and {len(agents)} agents")
+
+    def upsert_phone(self, phone: PhoneNumber):
+        entry = PhoneEntry(phone.user_id, phone.id, phone.assistant_id)
+        with self._lock:
+            self._drop_phone(phone.id)
+            self._misses.pop(("phone", phone.vapi_id), None)
+            self._misses.pop(("number", phone.number), None)
+            if phone.vapi_id:
+                self.phones_by_vapi_id[phone.vapi_id] = entry
+            if phone.number:
+                self.phones_by_number[phone.number] = entry
+            self._phone_keys[phone.id] = (phone.vapi_id, phone.number)
+
+    def remove_phone(self, phone: PhoneNumber):
+        with self._lock:
+            self._drop_phone(phone.id)
+
+    def _drop_phone(self, phone_id: str):
+        vapi_id, number = self._phone_keys.pop(phone_id, (None, None))
+        for index, key in ((self.phones_by_vapi_id, vapi_id), (self.phones_by_number, number)):
+            entry = index.get(key)
+            if entry is not None and entry.phone_number_id == phone_id:
+                del index[key]
+
+    def upsert_agent(self, agent: Agent):
+        with self._lock:
+            self._drop_agent(agent.id)
+            self._misses.pop(("assistant", agent.vapi_id), None)
+            if agent.vapi_id:
+                self.agents_by_vapi_id[agent.vapi_id] = AgentEntry(agent.user_id, agent.id)
+                self._agent_keys[agent.id] = agent.vapi_id
+
+    def remove_agent(self, agent: Agent):
+        with self._lock:
+            self._drop_agent(agent.id)
+
+    def _drop_agent(self, agent_id: str):
+        vapi_id = self._agent_keys.pop(agent_id, None)
+        entry = self.agents_by_vapi_id.get(vapi_id)
+        if entry is not None and entry.agent_id == agent_id:
+            del self.agents_by_vapi_id[vapi_id]
+
+    def _known_missing(self, kind: str, key: str) -> bool:
+        with self._lock:
+            expires = self._misses.get((kind, key))
+            if expires is None:
+                return False
+            if self.clock() >= expires:
+                del self._misses[(kind, key)]
+                return False
+            return True
+
+    def _remember_miss(self, kind: str, key: str):
+        with self._lock:
+            self._misses[(kind, key)] = self.clock() + self.miss_ttl
+            self._misses.move_to_end((kind, key))
+            if len(self._misses) > self.miss_capacity:
+                self._misses.popitem(last=False)
+
+    def _lookup(self, db, model, column, kind: str, key: Optional[str]):
+        """The row for a key missing from the index, unless it was missing from the database recently"""
+        if not key or self._known_missing(kind, key):
+            return None
+        row = db.query(model).filter(column == key).first()
+        if row is None:
+            self._remember_miss(kind, key)
+        return row
+
+    def _phone(self, db, phone_vapi_id: Optional[str], phone_number: Optional[str]) -> Optional[PhoneEntry]:
+        entry = None
+        if phone_vapi_id:
+            entry = self.phones_by_vapi_id.get(phone_vapi_id)
+        if entry is None and phone_number:
+            entry = self.phones_by_number.get(phone_number)
+        if entry is not None:
+            return entry
+
+        # Index miss: the row may have been created by another worker
+        phone = self._lookup(db, PhoneNumber, PhoneNumber.vapi_id, "phone", phone_vapi_id)
+        if phone is None:
+            phone = self._lookup(db, PhoneNumber, PhoneNumber.number, "number", phone_number)
+        if phone is None:
+            return None
+        self.upsert_phone(phone)
+        return PhoneEntry(phone.user_id, phone.id, phone.assistant_id)
+
+    def _agent(self, db, assistant_id: Optional[str]) -> Optional[AgentEntry]:
+        if not assistant_id:
+            return None
+        entry = self.agents_by_vapi_id.get(assistant_id)
+        if entry is not None:
+            return entry
+
+        agent = self._lookup(db, Agent, Agent.vapi_id, "assistant", assistant_id)
+        if agent is None:
+            return None
+        self.upsert_agent(agent)
+        return AgentEntry(agent.user_id, agent.id)
+
+    def resolve(
+        self,
+        db,
+        phone_vapi_id: Optional[str] = None,
+        phone_number: Optional[str] = None,
+        assistant_id: Optional[str] = None,
+    ) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """(user_id, agent_id, phone_number_id) for a call's phone number and assistant"""
+        phone = self._phone(db, phone_vapi_id, phone_number)
+        agent = self._agent(db, assistant_id)
+
+        if phone is not None:
+            # Only trust the assistant if it belongs to the number's owner
+            agent_id = agent.agent_id if agent is not None and agent.user_id == phone.user_id else phone.agent_id
+            return phone.user_id, agent_id, phone.phone_number_id
+        if agent is not None:
+            return agent.user_id, agent.agent_id, None
+        return None, None, None
+
+    def stats(self) -> dict:
+        return {
+            "phones_by_vapi_id": len(self.phones_by_vapi_id),
+            "phones_by_number": len(self.phones_by_number),
+            "agents_by_vapi_id": len(self.agents_by_vapi_id),
+            "misses": len(self._misses),
+        }
+
+
+owner_index = OwnerIndex()
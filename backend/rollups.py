@@ -0,0 +1,157 @@
+"""
+Quarter-hour call rollups.
+
+Calls are aggregated per (user, 15-minute UTC bucket, agent, phone number)
+into the ``call_rollups`` table so cost and volume reporting runs over
+O(buckets) rows instead of scanning raw calls. Refreshes are incremental:
+only buckets that contain calls created or updated since the last refresh
+are recomputed. A call's ``updated_at`` is set before its transaction
+commits, so a call written just before a refresh can become visible only
+after it; every refresh therefore re-scans the ``OVERLAP`` before its
+watermark.
+
+Every real-world UTC offset is a multiple of 15 minutes, so the same rows
+can be re-bucketed into any user's local days (see ``local_day_totals``)
+without touching the calls table again.
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import Float, Integer, String, and_, cast, delete, func, insert, select
+
+import timezones
+from database import Call, CallRollup
+
+BUCKET_MINUTES = 15
+OVERLAP = timedelta(seconds=int(os.getenv("ROLLUP_OVERLAP_SECONDS", "300")))
+
+
+def time_bucket(column, dialect_name: str):
+    """SQL expression truncating a DateTime column to its 15-minute bucket"""
+    if dialect_name == "sqlite":
+        minute = (cast(func.strftime("%M", column), Integer) // BUCKET_MINUTES) * BUCKET_MINUTES
+        return func.strftime("%Y-%m-%d %H:", column, type_=String).concat(func.printf("%02d:00", minute))
+    minute = cast(func.floor(func.extract("minute", column) / BUCKET_MINUTES) * BUCKET_MINUTES, Integer)
+    return func.date_trunc("hour", column) + func.make_interval(0, 0, 0, 0, 0, minute)
+
+
+def floor_bucket(moment: datetime) -> datetime:
+    return moment.replace(minute=moment.minute - moment.minute % BUCKET_MINUTES, second=0, microsecond=0)
+
+
+def _as_datetime(value) -> datetime:
+    # SQLite returns the truncated bucket as a string
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def refresh_user_rollups(db, user_id: str, now: Optional[datetime] = None) -> int:
+    """Recompute rollups for buckets touched since the last refresh; returns the number of rows written
+
+    ``now`` is taken before anything is read and becomes the watermark, so it
+    never runs ahead of the calls the refresh could see.
+    """
+    now = now or datetime.utcnow()
+    dialect_name = db.get_bind().dialect.name
+
+    watermark = db.execute(
+        select(func.max(CallRollup.refreshed_at)).where(CallRollup.user_id == user_id)
+    ).scalar()
+
+    conditions = [Call.user_id == user_id]
+    if watermark:
+        conditions.append(func.coalesce(Call.updated_at, Call.created_at) >= watermark - OVERLAP)
+    earliest_change = db.execute(select(func.min(Call.created_at)).where(and_(*conditions))).scalar()
+    if earliest_change is None:
+        return 0
+
+    start = floor_bucket(earliest_change)
+    bucket = time_bucket(Call.created_at, dialect_name)
+    aggregates = db.execute(
+        select(
+            bucket,
+            Call.agent_id,
+            Call.phone_number_id,
+            func.count(Call.id),
+            func.coalesce(func.sum(Call.duration), 0),
+            func.coalesce(func.sum(cast(Call.cost, Float)), 0.0),
+        )
+        .where(and_(Call.user_id == user_id, Call.created_at >= start))
+        .group_by(bucket, Call.agent_id, Call.phone_number_id)
+    ).all()
+
+    db.execute(delete(CallRollup).where(and_(CallRollup.user_id == user_id, CallRollup.bucket_start >= start)))
+    rows = [
+        {
+            "user_id": user_id,
+            "bucket_start": _as_datetime(bucket_start),
+            "agent_id": agent_id,
+            "phone_number_id": phone_number_id,
+            "calls": calls,
+            "duration": int(duration or 0),
+            "cost": float(cost or 0),
+            "refreshed_at": now,
+        }
+        for bucket_start, agent_id, phone_number_id, calls, duration, cost in aggregates
+    ]
+    if rows:
+        db.execute(insert(CallRollup), rows)
+    else:
+        # Keep a watermark even when the changed calls are gone
+        db.execute(insert(CallRollup), [{
+            "user_id": user_id, "bucket_start": start, "calls": 0, "duration": 0, "cost": 0.0, "refreshed_at": now
+        }])
+    db.commit()
+    return len(rows)
+
+
+def refresh_in_own_session(session_factory, user_id: str, now: Optional[datetime] = None) -> int:
+    """``refresh_user_rollups`` in a session of its own, so the caller's session never writes"""
+    db = session_factory()
+    try:
+        return refresh_user_rollups(db, user_id, now)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def load_rollups(db, user_id: str, start: datetime, end: Optional[datetime] = None) -> List[tuple]:
+    """Rollup rows (bucket_start, agent_id, phone_number_id, calls, duration, cost) in [start, end)"""
+    conditions = [CallRollup.user_id == user_id, CallRollup.bucket_start >= start, CallRollup.calls > 0]
+    if end:
+        conditions.append(CallRollup.bucket_start < end)
+
+    return db.execute(
+        select(
+            CallRollup.bucket_start,
+            CallRollup.agent_id,
+            CallRollup.phone_number_id,
+            CallRollup.calls,
+            CallRollup.duration,
+            CallRollup.cost,
+        )
+        .where(and_(*conditions))
+        .order_by(CallRollup.bucket_start)
+    ).all()
+
+
+def local_day_totals(rows: List[tuple], first_day, last_day, tz: ZoneInfo) -> Dict[str, dict]:
+    """Calls, duration and cost per local calendar day in ``tz`` from rollup rows.
+
+    Day boundaries are local midnights converted to UTC, so days that
+    gain or lose an hour at a DST transition are bucketed correctly.
+    """
+    days, boundaries = timezones.local_day_boundaries(first_day, last_day, tz)
+    totals = {day.isoformat(): {"calls": 0, "duration": 0, "cost": 0.0} for day in days}
+    for bucket_start, _agent_id, _phone_number_id, calls, duration, cost in rows:
+        index = timezones.bucket_index(boundaries, bucket_start)
+        if 0 <= index < len(days):
+            entry = totals[days[index].isoformat()]
+            entry["calls"] += calls
+            entry["duration"] += duration
+            entry["cost"] += cost
+    return totals
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test the NumPy analytics engine against the list-comprehension implementation
+"""
+
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+import analytics_engine
+import benchmark_analytics
+from database import Agent, Call
+
+
+def test_dashboard_metrics_match_legacy(engine, db):
+    benchmark_analytics.populate(engine, 500)
+    # Calls with missing fields must be handled the same way
+    db.add(Call(id=str(uuid.uuid4()), user_id=benchmark_analytics.USER_ID, direction="inbound", status="ended"))
+    db.commit()
+
+    legacy = benchmark_analytics.legacy_dashboard_metrics(db)
+    vectorized = benchmark_analytics.engine_dashboard_metrics(db)
+    for key, value in legacy.items():
+        assert vectorized[key] == value, f"{key}: {vectorized[key]} != {value}"
+
+
+def test_grouping_and_binning(db):
+    agent_id = str(uuid.uuid4())
+    db.add(Agent(id=agent_id, user_id="u1", name="Reception", industry="Health"))
+    monday_9am = datetime(2024, 1, 1, 9, 30)
+    for i, (status, duration, cost) in enumerate([("completed", 45, "0.10"), ("completed", 700, "0.90"), ("failed", 0, None)]):
+        db.add(Call(
+            id=str(uuid.uuid4()), user_id="u1", agent_id=agent_id if i < 2 else None,
+            direction="outbound" if i else "inbound", status=status, duration=duration, cost=cost,
+            started_at=monday_9am + timedelta(days=i), created_at=monday_9am + timedelta(days=i)
+        ))
+    db.commit()
+
+    frame = analytics_engine.load_call_frame(db, "u1")
+    assert analytics_engine.summary(frame)["successful_calls"] == 2
+    assert analytics_engine.calls_by_status(frame) == {"completed": 2, "failed": 1}
+    assert analytics_engine.calls_by_day(frame)["2024-01-01"] == {"inbound": 1, "outbound": 0}
+    assert analytics_engine.agent_statistics(frame)[agent_id] == {"total": 2, "successful": 2, "duration": 745, "cost": 1.0}
+
+    histogram = analytics_engine.duration_histogram(frame)
+    assert histogram["counts"][histogram["buckets"].index("0-30")] == 1
+    assert histogram["counts"][histogram["buckets"].index("600-1800")] == 1
+
+    heatmap = analytics_engine.hourly_heatmap(frame)
+    assert heatmap[0][9] == 1 and heatmap[1][9] == 1 and heatmap[2][9] == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
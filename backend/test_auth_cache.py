@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test the authenticated-principal cache
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from auth_cache import PrincipalCache
+from database import User
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_user(**fields):
+    values = {"id": "u1", "name": "Ada", "email": "ada@example.com", "password_hash": "x", "timezone": "UTC"}
+    values.update(fields)
+    return User(**values)
+
+
+def test_tokens_expire_with_ttl_or_token():
+    clock = FakeClock()
+    cache = PrincipalCache(ttl=60, clock=clock)
+    cache.remember_token("token-a", "ada@example.com", time.time() + 3600)
+    # A token that expires in 5 seconds is only cached for 5 seconds
+    cache.remember_token("token-b", "bob@example.com", time.time() + 5)
+    cache.remember_token("token-c", "eve@example.com", time.time() - 1)
+
+    assert cache.token_email("token-a") == "ada@example.com"
+    assert cache.token_email("token-b") == "bob@example.com"
+    assert cache.token_email("token-c") is None
+    clock.now += 10
+    assert cache.token_email("token-b") is None
+    clock.now += 60
+    assert cache.token_email("token-a") is None
+
+
+def test_user_snapshots_are_copies_and_invalidated():
+    clock = FakeClock()
+    cache = PrincipalCache(ttl=60, capacity=2, clock=clock)
+    cache.remember_user(make_user())
+
+    first = cache.user("ada@example.com")
+    first.timezone = "Europe/Paris"
+    # Each hit is a fresh detached object; changing one doesn't leak into the cache
+    assert cache.user("ada@example.com").timezone == "UTC"
+
+    cache.invalidate("ada@example.com")
+    assert cache.user("ada@example.com") is None
+
+    # Bounded: the least recently used snapshot goes first
+    for index in range(3):
+        cache.remember_user(make_user(id=f"u{index}", email=f"user{index}@example.com"))
+    assert cache.user("user0@example.com") is None
+    assert cache.user("user2@example.com").id == "u2"
+    assert cache.stats()["users"] == 2
+
+
+if __name__ == "__main__":
+    test_tokens_expire_with_ttl_or_token()
+    test_user_snapshots_are_copies_and_invalidated()
+    print("🎉 Auth cache tests passed!")
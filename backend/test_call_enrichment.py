@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test background post-call enrichment
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import call_enrichment
+import webhooks
+from database import Call
+
+READY = {
+    "status": "ended",
+    "recordingUrl": "https://example.com/rec.wav",
+    "artifact": {"transcript": "AI: Hello!\nUser: Bye"},
+    "analysis": {"summary": "Caller said goodbye."},
+    "cost": 0.31,
+}
+
+
+async def wait_for(condition, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+def test_enrichment_retries_until_artifacts_are_ready(session_factory, webhook_event):
+    fetched = []
+
+    async def fetch(vapi_id):
+        fetched.append(vapi_id)
+        # The recording isn't uploaded yet on the first attempt
+        return READY if len(fetched) > 1 else {"status": "ended"}
+
+    async def scenario():
+        enricher = call_enrichment.CallEnricher(initial_delay=0, retry_delays=(0, 0), concurrency=2)
+        enricher.start(session_factory, fetch)
+        db = session_factory()
+        # Ended calls are scheduled once their end event commits
+        webhooks.process_webhook(db, webhook_event("status-update", status="in-progress"))
+        original, call_enrichment.enricher = call_enrichment.enricher, enricher
+        try:
+            webhooks.process_webhook(db, webhook_event("hang"))
+            webhooks.process_webhook(db, webhook_event("end-of-call-report"))
+        finally:
+            call_enrichment.enricher = original
+        call_id = db.query(Call).one().id
+        db.close()
+
+        def enriched():
+            check = session_factory()
+            try:
+                return check.get(Call, call_id).enriched_at is not None
+            finally:
+                check.close()
+
+        assert await wait_for(enriched)
+        await enricher.stop()
+        return call_id
+
+    call_id = asyncio.run(scenario())
+    # Two end events, one enrichment: a retry after the first fetch came back incomplete
+    assert fetched == ["vapi-call-1", "vapi-call-1"]
+    db = session_factory()
+    call = db.get(Call, call_id)
+    assert (call.recording_url, call.summary, call.cost) == ("https://example.com/rec.wav", "Caller said goodbye.", "0.31")
+    assert call.transcript == "AI: Hello!\nUser: Bye"
+
+
+def test_enrichment_stores_what_it_has_after_last_attempt(session_factory, webhook_event):
+    db = session_factory()
+    webhooks.process_webhook(db, webhook_event("hang", recordingUrl="https://example.com/early.wav"))
+    call_id = db.query(Call).one().id
+
+    async def fetch(vapi_id):
+        return {"status": "ended", "analysis": {"summary": "Short call."}}
+
+    enricher = call_enrichment.CallEnricher(retry_delays=())
+    enricher.session_factory, enricher.fetch = session_factory, fetch
+    assert asyncio.run(enricher.enrich(call_id)) is True
+
+    db.expire_all()
+    call = db.get(Call, call_id)
+    assert call.enriched_at is not None and call.summary == "Short call."
+    assert call.recording_url == "https://example.com/early.wav"
+    assert enricher.sweep(db) == 0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
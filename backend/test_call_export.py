@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test streaming call export
+"""
+
+import csv
+import io
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+import call_export
+from database import Call
+
+
+def add_calls(db, num_calls=25):
+    """Some calls for two users"""
+    base_time = datetime(2024, 1, 1)
+    for i in range(num_calls):
+        db.add(Call(
+            id=str(uuid.uuid4()),
+            user_id="user-1" if i % 5 else "user-2",
+            direction="inbound",
+            status="ended",
+            duration=i * 10,
+            cost=f"{i * 0.05:.2f}",
+            transcript="hello " * 10,
+            created_at=base_time + timedelta(hours=i)
+        ))
+    db.commit()
+
+
+def test_csv_export_streams_in_chunks(engine, db):
+    add_calls(db)
+    chunks = list(call_export.export_calls(engine, "user-1", "csv", ["id", "duration", "cost"], chunk_size=4))
+
+    # Header plus one chunk per 4 rows
+    assert len(chunks) == 1 + 5
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+    assert rows[0] == ["id", "duration", "cost"]
+    assert len(rows) == 1 + 20
+
+
+def test_parquet_and_arrow_exports(engine, db):
+    if call_export.pa is None:
+        print("⚠️  pyarrow not installed, skipping columnar export test")
+        return
+
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+
+    add_calls(db)
+    start = datetime(2024, 1, 1, 5)
+    end = datetime(2024, 1, 1, 15)
+
+    data = b"".join(call_export.export_calls(engine, "user-1", "parquet", start=start, end=end, chunk_size=3))
+    table = pq.read_table(io.BytesIO(data))
+    assert table.num_rows == 8
+    assert "transcript" not in table.column_names
+    assert table.schema.field("cost").type == call_export.pa.float64()
+
+    data = b"".join(call_export.export_calls(engine, "user-1", "arrow", ["id", "transcript"], chunk_size=3))
+    table = pa_ipc.open_stream(io.BytesIO(data)).read_all()
+    assert table.num_rows == 20
+    assert table.column_names == ["id", "transcript"]
+
+
+def test_rejects_unknown_columns_and_formats():
+    for bad_call in (
+        lambda: call_export.parse_columns("id,password_hash"),
+        lambda: call_export.check_format("xlsx"),
+    ):
+        try:
+            bad_call()
+        except ValueError:
+            continue
+        raise AssertionError("expected ValueError")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
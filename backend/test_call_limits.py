@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test concurrent-call limits: admit, queue and reject, driven by webhooks
+"""
+
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import call_limits
+import webhooks
+
+LIMITS = {"org": 10, "user": 10, "agent": 10, "phone": 1}
+
+
+def test_admit_queue_reject():
+    limiter = call_limits.CallLimiter(LIMITS, queue_timeout=2.0, max_queued=1)
+    keys = call_limits.call_keys("u1", "agent-1", "phone-1")
+
+    async def scenario():
+        first = await limiter.acquire(keys)
+        limiter.bind(first, "call-1")
+
+        # The number is busy: the next placement waits, the one after that is turned away
+        waiting = asyncio.create_task(limiter.acquire(keys))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        try:
+            await limiter.acquire(keys)
+        except call_limits.CallCapacityExceeded as e:
+            rejected = e.scope
+        # The non-blocking dialer path yields to placements waiting in line
+        assert limiter.try_acquire(call_limits.call_keys("u1", "agent-1", "phone-2")) is None
+
+        # The end webhook arrives on the consumer thread and frees the slot
+        ender = threading.Thread(target=limiter.ended, args=("call-1",))
+        ender.start()
+        ender.join()
+        second = await asyncio.wait_for(waiting, 1.0)
+        limiter.bind(second, "call-2")
+        utilization = limiter.utilization("u1")
+
+        # Nothing frees up in time
+        try:
+            await limiter.acquire(keys, timeout=0.05)
+        except call_limits.CallCapacityExceeded:
+            timed_out = True
+        return rejected, utilization, timed_out
+
+    rejected, utilization, timed_out = asyncio.run(scenario())
+    assert rejected == "phone"
+    assert utilization["phone"] == {"phone-1": {"active": 1, "limit": 1, "utilization": 1.0}}
+    assert utilization["user"]["u1"]["active"] == 1
+    assert timed_out
+    # The timed-out placement left nothing behind
+    assert limiter.utilization()["queued"] == 0
+    assert limiter.utilization()["org"]["vapi"]["active"] == 1
+    # The unauthenticated health view only has totals
+    totals = limiter.totals()
+    assert totals["active_calls"] == 1 and totals["by_scope"]["phone"] == {"keys": 1, "active": 1, "at_limit": 1}
+    assert "phone-1" not in str(totals)
+
+
+def test_webhooks_track_live_calls(db, webhook_event, monkeypatch):
+    monkeypatch.setattr(call_limits, "limiter", call_limits.CallLimiter(LIMITS))
+    webhooks.process_webhook(db, webhook_event("status-update", status="in-progress"))
+    live = call_limits.limiter.utilization("u1")
+    webhooks.process_webhook(db, webhook_event("transcript", role="user", transcript="Hi", transcriptType="final"))
+    webhooks.process_webhook(db, webhook_event("hang"))
+    ended = call_limits.limiter.utilization("u1")
+
+    # Inbound calls count against the number they came in on
+    assert live["phone"]["phone-1"]["active"] == 1
+    assert ended["phone"] == {} and ended["org"] == {}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test the queued-call index behind /calls/queues
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import call_queues
+import webhooks
+from database import Call
+
+START = datetime(2024, 3, 1, 12, 0, 0)
+
+
+class FakeClock:
+    def __init__(self, moment: datetime):
+        self.now = call_queues._epoch(moment)
+
+    def __call__(self):
+        return self.now
+
+
+def test_positions_and_wait_statistics():
+    clock = FakeClock(START + timedelta(seconds=100))
+    index = call_queues.CallQueueIndex(clock=clock)
+    # Enqueued 100s, 90s, ... 10s ago; the campaign call waits behind calls placed by hand
+    for i in range(10):
+        priority = call_queues.CAMPAIGN_PRIORITY if i == 0 else call_queues.NORMAL_PRIORITY
+        index.enqueue(f"call-{i}", "u1", "agent-1", "phone-1" if i % 2 else "phone-2",
+                      START + timedelta(seconds=10 * i), priority)
+    index.enqueue("call-1", "u1", "agent-1", "phone-1", START + timedelta(seconds=99))  # Repeated: keeps its place
+
+    queue = index.user_queue("u1")
+    assert [entry["call_id"] for entry in queue] == [f"call-{i}" for i in range(1, 10)] + ["call-0"]
+    assert queue[-1] == {"call_id": "call-0", "position": 10, "priority": -1,
+                         "enqueued_at": START.isoformat(), "wait_seconds": 100.0}
+
+    stats = index.stats("u1", ["agent-1"], ["phone-1", "phone-2"])
+    assert stats["user"]["length"] == 10
+    assert stats["user"]["oldest_wait_seconds"] == 100.0
+    assert stats["user"]["average_wait_seconds"] == 55.0
+    assert stats["user"]["total_wait_seconds"] == 550.0
+    assert stats["user"]["p50_wait_seconds"] == 50.0
+    assert stats["user"]["p90_wait_seconds"] == 90.0
+    assert stats["by_phone_number"]["phone-1"]["length"] == 5
+    assert stats["by_phone_number"]["phone-1"]["oldest_wait_seconds"] == 90.0
+
+    # Answered calls leave the queue with their wait recorded
+    assert index.dequeue("call-0") == 100.0
+    assert index.dequeue("call-0") is None
+    stats = index.stats("u1", ["agent-1"], [])
+    assert stats["user"]["length"] == 9 and stats["user"]["oldest_wait_seconds"] == 90.0
+    assert stats["by_agent"]["agent-1"]["completed_waits"]["count"] == 1
+
+    # Calls nobody reported on for too long drop off, however recently they were enqueued
+    clock.now += call_queues.MAX_QUEUE_AGE.total_seconds() / 2
+    index.enqueue("call-1", "u1", "agent-1", "phone-1", START + timedelta(seconds=10))  # Still queued
+    clock.now += call_queues.MAX_QUEUE_AGE.total_seconds() / 2 + 1
+    assert [entry["call_id"] for entry in index.user_queue("u1")] == ["call-1"]
+    assert index.stats("u1", [], [])["user"]["completed_waits"]["count"] == 1
+
+
+def test_seeded_calls_expire_from_their_last_update(db):
+    now = START + call_queues.MAX_QUEUE_AGE * 2
+    db.add_all([
+        # Waiting a long time, but reported on recently
+        Call(id="call-1", user_id="u1", direction="outbound", status="queued", created_at=START, updated_at=now - timedelta(minutes=50)),
+        Call(id="call-2", user_id="u1", direction="outbound", status="queued", created_at=START, updated_at=now - timedelta(hours=2)),
+        Call(id="call-3", user_id="u1", direction="outbound", status="in-progress", created_at=START, updated_at=now),
+    ])
+    db.commit()
+    clock = FakeClock(now)
+    index = call_queues.CallQueueIndex(clock=clock)
+
+    assert index.seed(db, now) == 1
+    assert index.user_queue("u1")[0]["wait_seconds"] == 2 * call_queues.MAX_QUEUE_AGE.total_seconds()
+    clock.now += timedelta(minutes=15).total_seconds()
+    assert index.user_queue("u1") == []
+
+
+def test_webhooks_move_calls_through_the_queue(db, webhook_event, monkeypatch):
+    monkeypatch.setattr(call_queues, "index", call_queues.CallQueueIndex())
+    webhooks.process_webhook(db, webhook_event("status-update", status="queued"))
+    queued = call_queues.index.user_queue("u1")
+    webhooks.process_webhook(db, webhook_event("status-update", status="in-progress"))
+    answered = call_queues.index.stats("u1", [], ["phone-1"])
+
+    assert len(queued) == 1 and queued[0]["position"] == 1
+    assert answered["user"]["length"] == 0
+    assert answered["by_phone_number"]["phone-1"]["completed_waits"]["count"] == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Test campaign contact lists and the dialer's concurrency and pacing limits
+"""
+
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import call_limits
+import campaigns
+from database import Agent, Call, CampaignContact
+
+
+class RateLimited(Exception):
+    status_code = 429
+    detail = "Too many calls"
+
+
+def test_contact_lists_are_parsed_and_normalized():
+    csv_upload = b"\xef\xbb\xbfName,Phone\nAda,(415) 555-2671\nBob,+44 20 7946 0958\nEve,12345\nAda again,415-555-2671\n,\n"
+    rows = campaigns.parse_contacts(csv_upload, "contacts.csv")
+    assert [row["name"] for row in rows] == ["Ada", "Bob", "Eve", "Ada again"]
+
+    valid, invalid, duplicates = campaigns.normalize_contacts(rows)
+    assert [contact["customer_number"] for contact in valid] == ["+14155552671", "+442079460958"]
+    assert [(row["row"], row["number"]) for row in invalid] == [(3, "12345")]
+    assert duplicates == 1
+
+    # Headerless CSV and JSON in either shape
+    assert campaigns.parse_contacts(b"4155552671,Ada\n")[0] == {"number": "4155552671", "name": "Ada"}
+    json_upload = json.dumps(["+14155552671", {"number": "4155552672", "name": "Bob"}]).encode()
+    valid, _, _ = campaigns.normalize_contacts(campaigns.parse_contacts(json_upload, "list.json"))
+    assert [contact["name"] for contact in valid] == [None, "Bob"]
+
+
+def test_dialer_respects_concurrency_and_pacing(session_factory, db, monkeypatch):
+    db.add(Agent(id="agent-1", vapi_id="vapi-agent-1", user_id="u1", name="Reminders", industry="health"))
+    contacts = [{"customer_number": f"+1415555{2600 + i}", "name": None} for i in range(6)]
+    campaign = campaigns.create_campaign(db, "u1", "Reminders", "agent-1", "phone-1", contacts,
+                                         max_concurrent=2, calls_per_minute=60)
+    campaign.status = "running"
+    db.commit()
+    campaign_id = campaign.id
+    db.close()
+
+    placed_payloads = []
+
+    async def place(payload):
+        placed_payloads.append(payload)
+        if len(placed_payloads) == 3:
+            raise RateLimited()
+        return {"id": f"vapi-call-{len(placed_payloads)}", "status": "queued"}
+
+    monkeypatch.setattr(campaigns, "limiter", call_limits.CallLimiter())
+    dialer = campaigns.CampaignDialer(tick=1.0)
+    dialer.session_factory, dialer.place = session_factory, place
+    start = datetime.utcnow() + timedelta(seconds=1)
+
+    def end_calls(count):
+        db = session_factory()
+        for call in db.query(Call).filter(Call.status == "queued").limit(count):
+            call.status = "ended"
+            # As the webhook pipeline would
+            campaigns.limiter.ended(call.id)
+        db.commit()
+        db.close()
+
+    async def scenario():
+        # One call per second at 60/min, never more than two in flight
+        assert await dialer.tick(start) == 1
+        assert await dialer.tick(start) == 0
+        assert await dialer.tick(start + timedelta(seconds=1)) == 1
+        assert await dialer.tick(start + timedelta(seconds=2)) == 0
+
+        # A call ends (via webhook), freeing a slot; VAPI rate limits this placement
+        end_calls(1)
+        assert await dialer.tick(start + timedelta(seconds=3)) == 0
+        db = session_factory()
+        retried = db.query(CampaignContact).filter(CampaignContact.attempts == 1, CampaignContact.status == "pending",
+                                                   CampaignContact.last_error.isnot(None)).one()
+        assert retried.next_attempt_at == start + timedelta(seconds=3) + campaigns.RETRY_DELAY
+        db.close()
+
+        end_calls(2)
+        now = start + timedelta(seconds=4)
+        while await dialer.tick(now) or now < start + campaigns.RETRY_DELAY + timedelta(seconds=10):
+            end_calls(2)
+            now += timedelta(seconds=1)
+
+        db = session_factory()
+        counts = campaigns.progress(db, [campaign_id])[campaign_id]
+        status = db.get(campaigns.Campaign, campaign_id).status
+        db.close()
+        return counts, status
+
+    counts, status = asyncio.run(scenario())
+    assert counts["completed"] == 6 and counts["total"] == 6 and counts["percent_done"] == 100.0
+    assert status == "completed"
+    assert len(placed_payloads) == 7
+    assert placed_payloads[0] == {
+        "customer": {"number": "+14155552600"},
+        "assistantId": "vapi-agent-1",
+        "phoneNumberId": "vapi-phone-1",
+    }
+
+
+
+def test_recover_reconciles_interrupted_placements(session_factory, db):
+    contacts = [{"customer_number": f"+1415555{2700 + i}", "name": None} for i in range(3)]
+    campaigns.create_campaign(db, "u1", "Reminders", "agent-1", "phone-1", contacts)
+    now = datetime.utcnow()
+
+    # Crashed mid-placement: each contact was claimed with its call recorded, but no VAPI result
+    rows = db.query(CampaignContact).order_by(CampaignContact.id).all()
+    dialed = [now - timedelta(minutes=10), now - timedelta(seconds=30), now - timedelta(minutes=10)]
+    for contact, dialed_at in zip(rows, dialed):
+        call = Call(id=f"local-{contact.id}", user_id="u1", agent_id="agent-1", phone_number_id="phone-1",
+                    customer_number=contact.customer_number, direction="outbound", status="initiated")
+        db.add(call)
+        contact.status, contact.call_id, contact.dialed_at, contact.attempts = "dialing", call.id, dialed_at, 1
+    # VAPI did place the first call: its webhook created the call before the restart
+    db.add(Call(id="from-webhook", vapi_id="vapi-call-1", user_id="u1", phone_number_id="phone-1",
+                customer_number=rows[0].customer_number, direction="outbound", status="ringing",
+                created_at=dialed[0] + timedelta(seconds=2)))
+    db.commit()
+    contact_ids = [contact.id for contact in rows]
+    db.close()
+
+    db = session_factory()
+    assert campaigns.CampaignDialer().recover(db, now) == 2
+    placed, waiting, unplaced = (db.get(CampaignContact, contact_id) for contact_id in contact_ids)
+    # The placed call is followed, not dialed again
+    assert (placed.status, placed.call_id) == ("in_progress", "from-webhook")
+    # A recent placement gets time for its webhook to arrive
+    assert (waiting.status, waiting.call_id) == ("dialing", f"local-{contact_ids[1]}")
+    # Nothing came of the old one: dial it again
+    assert (unplaced.status, unplaced.call_id, unplaced.attempts) == ("pending", None, 1)
+    assert {call.id for call in db.query(Call)} == {"from-webhook", f"local-{contact_ids[1]}"}
+    db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
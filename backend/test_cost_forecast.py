@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test quarter-hour call rollups and the burn-rate forecast
+"""
+
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+import cost_forecast
+import rollups
+from database import Call, CallRollup
+
+
+def add_call(db, created_at, cost, agent_id="agent-1"):
+    call = Call(
+        id=str(uuid.uuid4()), user_id="u1", agent_id=agent_id, direction="outbound", status="ended",
+        duration=60, cost=str(cost), created_at=created_at, updated_at=created_at
+    )
+    db.add(call)
+    db.commit()
+    return call
+
+
+def test_rollups_refresh_incrementally(db):
+    base = datetime(2024, 3, 10, 9, 15)
+    add_call(db, base, 0.5)
+    add_call(db, base + timedelta(minutes=10), 0.25)
+    late_call = add_call(db, base + timedelta(hours=3), 1.0, agent_id="agent-2")
+
+    first_refresh = datetime(2024, 3, 10, 13)
+    assert rollups.refresh_user_rollups(db, "u1", first_refresh) == 2
+    rows = rollups.load_rollups(db, "u1", datetime(2024, 3, 10))
+    assert [(row.bucket_start.hour, row.calls, row.cost) for row in rows] == [(9, 2, 0.75), (12, 1, 1.0)]
+
+    # Nothing changed, nothing recomputed
+    assert rollups.refresh_user_rollups(db, "u1", first_refresh + timedelta(minutes=5)) == 0
+
+    # A cost update only recomputes from the changed call's bucket onwards
+    late_call.cost = "2.0"
+    late_call.updated_at = first_refresh + timedelta(minutes=10)
+    db.commit()
+    assert rollups.refresh_user_rollups(db, "u1", first_refresh + timedelta(minutes=15)) == 1
+    rows = rollups.load_rollups(db, "u1", datetime(2024, 3, 10))
+    assert [(row.bucket_start.hour, row.cost) for row in rows] == [(9, 0.75), (12, 2.0)]
+    assert db.query(CallRollup).filter(CallRollup.calls > 0).count() == 2
+
+    # A call stamped before that refresh but committed after it is still picked up
+    add_call(db, first_refresh + timedelta(minutes=13), 0.5)
+    # The overlap also takes in the cost update at 13:10, so the 12:00 bucket is rewritten too
+    assert rollups.refresh_user_rollups(db, "u1", first_refresh + timedelta(minutes=20)) == 2
+    rows = rollups.load_rollups(db, "u1", datetime(2024, 3, 10))
+    assert [(row.bucket_start.hour, row.calls, row.cost) for row in rows] == [(9, 2, 0.75), (12, 1, 2.0), (13, 1, 0.5)]
+
+
+def test_burn_rate_report():
+    now = datetime(2024, 3, 15, 12)
+    rows = []
+    # $10/day for the last 28 days, split over two agents, with the buckets after noon
+    for day in range(28):
+        bucket = datetime(2024, 3, 15) - timedelta(days=28 - day) + timedelta(hours=13)
+        rows.append((bucket, "agent-1", "phone-1", 3, 300, 6.0))
+        rows.append((bucket, "agent-2", "phone-1", 2, 200, 4.0))
+
+    report = cost_forecast.burn_rate_report(rows, now, agent_labels={"agent-1": "Sales"})
+    assert report["burn_rate"]["cost_per_day"] == 10.0
+    assert report["burn_rate"]["by_agent"][0]["name"] == "Sales"
+    assert report["burn_rate"]["by_agent"][0]["cost_per_day"] == 6.0
+    assert report["burn_rate"]["by_phone_number"][0]["cost"] == 70.0
+
+    month = report["month"]
+    assert month["spend_to_date"] == 140.0
+    assert month["daily_std"] == 0
+    assert month["projected_spend"] == round(140 + 10 * 16.5, 2)
+    assert month["confidence_bands"]["95"]["low"] == month["projected_spend"]
+
+    assert report["week_over_week"]["cost_change_percent"] == 0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
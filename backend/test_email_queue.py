@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test queued email delivery against a local SMTP server
+"""
+
+import os
+import socket
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiosmtpd.controller import Controller
+
+import email_queue
+from auth_utils import EmailService
+from database import OutboundEmail
+
+
+class CollectingHandler:
+    def __init__(self, refuse=()):
+        self.messages = []
+        self.sessions = set()
+        self.refuse = refuse
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refuse:
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.extend(envelope.rcpt_tos)
+        return "250 Message accepted"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_dispatcher(session_factory, port: int, pool_size: int = 2):
+
+    service = EmailService()
+    service.smtp_server, service.smtp_port = "127.0.0.1", port
+    service.smtp_username, service.use_starttls = "", False
+    return email_queue.EmailDispatcher(session_factory, service, pool_size=pool_size, batch_size=50)
+
+
+def test_batch_reuses_pooled_connections(session_factory):
+    port = free_port()
+    handler = CollectingHandler(refuse=("nobody@example.com",))
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        dispatcher = make_dispatcher(session_factory, port)
+        db = session_factory()
+        for i in range(10):
+            email_queue.enqueue(db, f"user{i}@example.com", "Verify", "<p>hi</p>")
+        email_queue.enqueue(db, "nobody@example.com", "Verify", "<p>hi</p>")
+
+        assert dispatcher.process_batch() == 11
+        assert len(handler.messages) == 10
+        # Eleven emails, two SMTP sessions
+        assert dispatcher.pool.opened == 2
+        assert len(handler.sessions) <= 2
+
+        # The next batch goes out on the same connections
+        email_queue.enqueue(db, "late@example.com", "Verify", "<p>hi</p>")
+        dispatcher.process_batch()
+        assert dispatcher.pool.opened == 2
+
+        # Sent emails are removed; a refused recipient is not retried
+        db.expire_all()
+        remaining = db.query(OutboundEmail).all()
+        assert [e.to_email for e in remaining] == ["nobody@example.com"]
+        assert remaining[0].failed_at is not None and "550" in remaining[0].last_error
+        db.close()
+    finally:
+        dispatcher.pool.close_all()
+        controller.stop()
+
+
+def test_retries_with_backoff_until_server_is_back(session_factory):
+    port = free_port()
+    dispatcher = make_dispatcher(session_factory, port, pool_size=1)
+    db = session_factory()
+    email_queue.enqueue(db, "user@example.com", "Reset", "<p>reset</p>")
+
+    # No server listening yet
+    now = datetime.utcnow() + timedelta(seconds=1)
+    assert dispatcher.process_batch(now) == 1
+    db.expire_all()
+    email = db.query(OutboundEmail).one()
+    assert email.attempts == 1 and email.failed_at is None
+    assert email.next_attempt_at == now + email_queue.BACKOFF_BASE
+    # Not due again until the backoff has passed
+    assert dispatcher.process_batch(now + timedelta(seconds=10)) == 0
+
+    now += email_queue.BACKOFF_BASE
+    dispatcher.process_batch(now)
+    db.expire_all()
+    email = db.query(OutboundEmail).one()
+    assert email.attempts == 2
+    assert email.next_attempt_at == now + 2 * email_queue.BACKOFF_BASE
+
+    handler = CollectingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    try:
+        assert dispatcher.process_batch(email.next_attempt_at) == 1
+        assert handler.messages == ["user@example.com"]
+        db.expire_all()
+        assert db.query(OutboundEmail).count() == 0
+        db.close()
+    finally:
+        dispatcher.pool.close_all()
+        controller.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Test local Google ID token verification with locally generated keys
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import google_tokens
+from auth_utils import GoogleAuth
+
+CLIENT_ID = "test-client.apps.googleusercontent.com"
+
+
+class FakeGoogle:
+    """Serves a JWKS document and signs ID tokens with its current keys"""
+
+    def __init__(self):
+        self.keys = {}
+        self.fetches = 0
+        self.down = False
+        self.rotate()
+
+    def rotate(self) -> str:
+        kid = f"key-{len(self.keys) + 1}"
+        self.keys[kid] = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        return kid
+
+    async def fetch(self):
+        self.fetches += 1
+        if self.down:
+            raise ConnectionError("certs endpoint unreachable")
+        keys = []
+        for kid, private_key in self.keys.items():
+            jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+            keys.append({**jwk, "kid": kid, "alg": "RS256", "use": "sig"})
+        return {"keys": keys}, 300.0
+
+    def sign(self, kid: str, **claims) -> str:
+        now = int(time.time())
+        payload = {
+            "iss": "https://accounts.google.com",
+            "aud": CLIENT_ID,
+            "sub": "10769150350006150715113082367",
+            "email": "jane@example.com",
+            "email_verified": True,
+            "name": "Jane Doe",
+            "iat": now,
+            "exp": now + 3600,
+            **claims,
+        }
+        return jwt.encode(payload, self.keys[kid], algorithm="RS256", headers={"kid": kid})
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_verifies_locally_and_validates_claims():
+    google = FakeGoogle()
+    auth = GoogleAuth(jwks=google_tokens.JwksCache(fetch=google.fetch))
+    auth.client_id = CLIENT_ID
+
+    async def scenario():
+        user_info = await auth.verify_google_token(google.sign("key-1"))
+        # Later sign-ins reuse the cached keys
+        await auth.verify_google_token(google.sign("key-1"))
+        rejected = [
+            await auth.verify_google_token(google.sign("key-1", aud="someone-else")),
+            await auth.verify_google_token(google.sign("key-1", iss="https://evil.example.com")),
+            await auth.verify_google_token(google.sign("key-1", exp=int(time.time()) - 3600)),
+            await auth.verify_google_token(google.sign("key-1")[:-4] + "AAAA"),
+        ]
+        return user_info, rejected
+
+    user_info, rejected = asyncio.run(scenario())
+    assert user_info == {
+        "google_id": "10769150350006150715113082367",
+        "email": "jane@example.com",
+        "name": "Jane Doe",
+        "verified_email": True,
+    }
+    assert rejected == [None, None, None, None]
+    assert google.fetches == 1
+
+
+def test_key_rotation_and_ttl():
+    google = FakeGoogle()
+    clock = FakeClock()
+    jwks = google_tokens.JwksCache(fetch=google.fetch, clock=clock)
+
+    async def verify(token):
+        try:
+            return await google_tokens.verify_id_token(token, CLIENT_ID, jwks)
+        except google_tokens.InvalidIdToken:
+            return None
+
+    async def scenario():
+        assert await verify(google.sign("key-1"))
+        assert google.fetches == 1
+
+        # Google publishes a new key: the unknown kid triggers a refresh
+        clock.now += google_tokens.MIN_REFRESH_INTERVAL
+        new_kid = google.rotate()
+        assert await verify(google.sign(new_kid))
+        assert google.fetches == 2
+
+        # Unknown kids can't force a refetch more than once per interval
+        stranger = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        forged = jwt.encode(jwt.decode(google.sign("key-1"), options={"verify_signature": False}), stranger,
+                            algorithm="RS256", headers={"kid": "bogus"})
+        assert await verify(forged) is None
+        assert google.fetches == 2
+
+        # Past max-age the keys are refetched; if Google is down the old ones are kept
+        clock.now += 301
+        google.down = True
+        assert await verify(google.sign("key-1"))
+        assert google.fetches == 3
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_verifies_locally_and_validates_claims()
+    test_key_rotation_and_ttl()
+    print("🎉 Google token tests passed!")
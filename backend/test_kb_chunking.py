@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test the local Trieve chunk-plan preview: splitting, rebalancing and streamed input
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import kb_chunking
+from kb_chunking import ChunkPlan, ChunkPreview
+
+
+def streamed(data: bytes, fmt: str, plan: ChunkPlan, size: int) -> dict:
+    preview = ChunkPreview(fmt, plan)
+    for start in range(0, len(data), size):
+        preview.feed(data[start:start + size])
+    return preview.finish()
+
+
+def test_plan_splits_and_rebalances():
+    # 101 sentences of 10 characters, with the odd delimiter run and blank line
+    text = "".join("Sentence!" + ("?\n\n" if i % 7 == 0 else " ") for i in range(101))
+    rebalanced = kb_chunking.preview_text(text, plan=ChunkPlan(target_splits_per_chunk=50))
+    assert rebalanced["splits"] == 101 and rebalanced["chunks"] == 3
+    assert rebalanced["splits_per_chunk"] == {"min": 33, "max": 34}
+
+    stub = kb_chunking.preview_text(text, plan=ChunkPlan(target_splits_per_chunk=50, rebalance_chunks=False))
+    assert stub["chunks"] == 3 and stub["splits_per_chunk"] == {"min": 1, "max": 50}
+    assert stub["chunk_characters"]["min"] < 15 and stub["chunk_characters"]["max"] > 500
+    assert sum(bucket["chunks"] for bucket in stub["histogram"]) == 3
+    # Every character lands in some chunk
+    assert round(stub["chunk_characters"]["mean"] * 3) == len(text)
+
+    # Chunks come out the same however the file is cut up in transit, even mid-character
+    data = ("Café au lait… " + text).encode()
+    whole = kb_chunking.preview_text(data.decode(), plan=ChunkPlan(target_splits_per_chunk=10))
+    for size in (1, 3, 64):
+        assert streamed(data, "text", ChunkPlan(target_splits_per_chunk=10), size) == whole
+    assert whole["sample"].startswith("Café au lait… Sentence!?\n\n")
+
+    # Only the listed characters split
+    assert kb_chunking.preview_text("a.b.c;d", plan=ChunkPlan(split_delimiters=[";"]))["splits"] == 2
+    assert kb_chunking.preview_text("")["chunks"] == 0
+    try:
+        ChunkPlan(target_splits_per_chunk=0)
+        assert False, "empty chunks accepted"
+    except kb_chunking.PreviewError:
+        pass
+
+
+def test_markdown_and_csv():
+    markdown = (
+        "# Opening hours\n"
+        "1. Weekdays: nine to five\n"
+        "2. See [our site](https://example.com/hours.html)\n"
+        "```\n"
+        "---\n"
+    ).encode()
+    result = streamed(markdown, "markdown", ChunkPlan(target_splits_per_chunk=50), 5)
+    assert result["splits"] == 3
+    assert result["sample"] == "Opening hours\nWeekdays: nine to five\nSee our site\n"
+
+    # A quoted newline doesn't end a record; each row is one split
+    rows = 'question,answer\n"When","Nine to five,\nweekdays"\r\n"Where","Main St"\n'.encode()
+    result = streamed(rows, "csv", ChunkPlan(target_splits_per_chunk=2), 4)
+    assert result["splits"] == 3 and result["chunks"] == 2
+    assert result["sample"].startswith("question, answer\nWhen, Nine to five, weekdays\n")
+
+    assert kb_chunking.file_format("notes.MD") == "markdown"
+    assert kb_chunking.file_format("faq.csv") == "csv"
+    assert kb_chunking.file_format("manual.pdf") is None
+
+
+if __name__ == "__main__":
+    test_plan_splits_and_rebalances()
+    test_markdown_and_csv()
+    print("🎉 Knowledge base chunking tests passed!")
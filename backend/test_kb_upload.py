@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Test streaming knowledge-base uploads: multipart parsing in small chunks, the streamed VAPI upload
+and reuse of identical files
+"""
+
+import asyncio
+import base64
+import hashlib
+import itertools
+import os
+import sys
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import kb_upload
+from database import KnowledgeBaseFile
+
+BOUNDARY = "----boundary1234"
+CONTENT = b"".join(f"Line {i}. Our opening hours are nine to five!\n".encode() for i in range(20000))
+
+
+def request_body() -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="name"\r\n\r\n'
+        "Opening hours\r\n"
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="hours.md"\r\n'
+        "Content-Type: text/markdown\r\n\r\n"
+    ).encode() + CONTENT + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def in_chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def test_streams_file_part_to_vapi():
+    received = {}
+
+    async def handler(request: httpx.Request):
+        # The upload is sent chunked, not as one buffered body
+        received["chunked"] = request.headers.get("transfer-encoding") == "chunked"
+        received["body"] = await request.aread()
+        received["content_type"] = request.headers["content-type"]
+        return httpx.Response(201, json={"id": "file-1"})
+
+    async def scenario():
+        stream = kb_upload.MultipartStream(in_chunks(request_body(), 1000),
+                                           f"multipart/form-data; boundary={BOUNDARY}")
+        largest = 0
+        name = None
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            async for part in stream.parts():
+                if part.name == "name":
+                    name = await part.text()
+                else:
+                    async def watched(chunks):
+                        nonlocal largest
+                        async for chunk in chunks:
+                            largest = max(largest, len(chunk))
+                            yield chunk
+                    file_id, _ = await kb_upload.upload_file(watched(part.chunks()), part.filename,
+                                                             "https://vapi.test", "key", client=client)
+        return name, file_id, largest
+
+    name, file_id, largest = asyncio.run(scenario())
+    assert name == "Opening hours" and file_id == "file-1"
+    # The file never sits in memory whole
+    assert largest <= 1000
+    assert received["chunked"]
+
+    # VAPI gets a well-formed multipart body with the file intact
+    async def parse_sent():
+        boundary = received["content_type"].split("boundary=")[1]
+        stream = kb_upload.MultipartStream(in_chunks(received["body"], 4096),
+                                           f"multipart/form-data; boundary={boundary}")
+        async for part in stream.parts():
+            data = b"".join([chunk async for chunk in part.chunks()])
+            return part.filename, data
+    filename, data = asyncio.run(parse_sent())
+    assert filename == "hours.md" and data == CONTENT
+
+
+def test_limits_and_base64():
+    async def oversized():
+        try:
+            async for _ in kb_upload.limit_size(in_chunks(CONTENT, 4096), limit=10000):
+                pass
+        except kb_upload.UploadError as e:
+            return e.status_code
+    assert asyncio.run(oversized()) == 413
+
+    encoded = base64.b64encode(CONTENT).decode()
+    chunks = list(kb_upload.base64_chunks(encoded, chunk_size=3000))
+    assert b"".join(chunks) == CONTENT and max(len(chunk) for chunk in chunks) <= 3000
+    # Line-wrapped base64 decodes too
+    wrapped = "\n".join(encoded[i:i + 76] for i in range(0, len(encoded), 76))
+    assert b"".join(kb_upload.base64_chunks(wrapped)) == CONTENT
+    try:
+        list(kb_upload.base64_chunks("not base64!"))
+        assert False, "invalid base64 accepted"
+    except kb_upload.UploadError:
+        pass
+
+    try:
+        kb_upload.MultipartStream(in_chunks(b"", 1), "application/json")
+        assert False, "non-multipart body accepted"
+    except kb_upload.UploadError as e:
+        assert e.status_code == 415
+
+
+def test_identical_files_reuse_knowledge_base(db):
+    log = []
+    uploads = itertools.count(1)
+
+    async def upload(chunks, filename):
+        data = b"".join([chunk async for chunk in chunks])
+        log.append(("upload", data))
+        return f"file-{next(uploads)}"
+
+    async def create_knowledge_base(name, file_id):
+        log.append(("create", file_id))
+        return {"id": f"kb-{file_id}", "name": name}
+
+    async def delete_file(file_id):
+        log.append(("delete", file_id))
+
+    deleted_in_vapi = set()
+
+    async def knowledge_base_exists(known):
+        return known.knowledge_base_id not in deleted_in_vapi
+
+    def run(data, sha256=None, user_id="u1"):
+        return asyncio.run(kb_upload.upload_deduplicated(
+            db, in_chunks(data, 4096), "handbook.txt", "Handbook", user_id,
+            upload=upload, create_knowledge_base=create_knowledge_base, delete_file=delete_file,
+            knowledge_base_exists=knowledge_base_exists, sha256=sha256,
+        ))
+
+    digest = hashlib.sha256(CONTENT).hexdigest()
+    first = run(CONTENT)
+    assert first["id"] == "kb-file-1" and first["sha256"] == digest and not first["reused"]
+    assert db.get(KnowledgeBaseFile, ("u1", digest)).size == len(CONTENT)
+
+    # Announced digest of a known file: nothing is uploaded or rebuilt
+    log.clear()
+    second = run(CONTENT, sha256=digest)
+    assert second["id"] == "kb-file-1" and second["reused"] and log == []
+
+    # No digest up front: the duplicate upload is discarded
+    third = run(CONTENT)
+    assert third["id"] == "kb-file-1" and third["reused"]
+    assert [step for step, _ in log] == ["upload", "delete"]
+    assert db.get(KnowledgeBaseFile, ("u1", digest)).reuse_count == 2
+
+    # Another user's identical file gets its own VAPI file and knowledge base
+    log.clear()
+    other = run(CONTENT, sha256=digest, user_id="u2")
+    assert other["id"] == "kb-file-3" and not other["reused"] and [step for step, _ in log] == ["upload", "create"]
+
+    # A knowledge base deleted in VAPI is forgotten and the file uploaded again
+    deleted_in_vapi.add("kb-file-1")
+    log.clear()
+    rebuilt = run(CONTENT, sha256=digest)
+    assert not rebuilt["reused"] and [step for step, _ in log] == ["upload", "create"]
+    assert db.get(KnowledgeBaseFile, ("u1", digest)).knowledge_base_id == rebuilt["id"]
+
+    # A digest that doesn't match the bytes is refused
+    try:
+        run(CONTENT + b"tampered", sha256=digest)
+        assert False, "mismatched digest accepted"
+    except kb_upload.UploadError:
+        pass
+    assert kb_upload.normalize_sha256(digest.upper()) == digest
+    assert kb_upload.normalize_sha256("abc") is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test the windowed-SQL agent leaderboard
+"""
+
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+import leaderboard
+from database import Agent, Call
+
+NOW = datetime(2024, 6, 30, 12)
+
+
+def add_agents_and_calls(db):
+
+    # Two agents with the same name must not be merged
+    for agent_id in ("a1", "a2", "a3"):
+        db.add(Agent(id=agent_id, user_id="u1", name="Support" if agent_id != "a3" else "Sales", industry="Retail"))
+
+    def add_calls(agent_id, days_ago, durations, status="completed", ended_reason=None):
+        for duration in durations:
+            db.add(Call(
+                id=str(uuid.uuid4()), user_id="u1", agent_id=agent_id, direction="inbound", status=status,
+                duration=duration, cost=str(duration / 60 * 0.1), ended_reason=ended_reason,
+                created_at=NOW - timedelta(days=days_ago)
+            ))
+
+    # Current period: a1 busiest, a2 next; previous period: a2 was ahead of a1
+    add_calls("a1", 1, range(10, 210, 10))
+    add_calls("a1", 2, [0, 0], status="ended", ended_reason="no-answer")
+    add_calls("a2", 3, [60] * 5)
+    add_calls("a3", 4, [120])
+    add_calls("a1", 40, [30] * 2)
+    add_calls("a2", 40, [30] * 6)
+    # Another user's calls are ignored
+    db.add(Call(id=str(uuid.uuid4()), user_id="u2", agent_id="a1", direction="inbound", status="completed", created_at=NOW))
+    db.commit()
+
+
+def test_leaderboard_by_volume(db):
+    add_agents_and_calls(db)
+    board = leaderboard.agent_leaderboard(db, "u1", days=30, now=NOW)
+
+    assert [entry["agent_id"] for entry in board] == ["a1", "a2", "a3"]
+    first = board[0]
+    assert first["calls"] == 22
+    assert first["successful_calls"] == 20
+    assert first["missed_calls"] == 2
+    assert first["success_rate"] == round(20 / 22 * 100, 2)
+    # 22 durations (0, 0, 10..200): nearest-rank p95 is the 21st value
+    assert first["p95_duration_seconds"] == 190
+    assert first["cost_per_minute"] == 0.1
+    assert first["previous_rank"] == 2 and first["rank_change"] == 1
+    assert board[1]["rank_change"] == -1
+    assert board[2]["previous_rank"] is None and board[2]["rank_change"] is None
+
+
+def test_leaderboard_rank_by_success_rate(db):
+    add_agents_and_calls(db)
+    board = leaderboard.agent_leaderboard(db, "u1", days=30, rank_by="success_rate", now=NOW)
+    assert [entry["agent_id"] for entry in board] == ["a2", "a3", "a1"]
+    assert board[0]["success_rate"] == 100.0
+
+    try:
+        leaderboard.agent_leaderboard(db, "u1", rank_by="name")
+    except ValueError:
+        return
+    raise AssertionError("expected ValueError")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test the live call event broker and its wiring into the webhook queue
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import live_events
+import webhook_queue
+from database import Base, Call, User
+from webhook_dedup import DedupIndex
+
+
+def parse(frame):
+    lines = dict(line.split(": ", 1) for line in frame.strip().split("\n"))
+    return lines["event"], json.loads(lines["data"])
+
+
+def test_slow_subscriber_is_told_to_resync():
+    async def scenario():
+        broker = live_events.LiveEventBroker(buffer_size=2)
+        subscriber = broker.subscribe("u1")
+        stream = broker.stream(subscriber, {"calls": []}, heartbeat=0.05)
+        assert parse(await stream.__anext__()) == ("snapshot", {"calls": []})
+
+        for number in range(5):
+            broker.publish("u1", {"type": "status-update", "number": number})
+        broker.publish("u2", {"type": "status-update", "number": 99})
+        await asyncio.sleep(0)
+
+        # Only the newest events fit in the buffer; the client hears it missed some
+        assert parse(await stream.__anext__())[0] == "resync"
+        assert parse(await stream.__anext__())[1]["number"] == 3
+        assert parse(await stream.__anext__())[1]["number"] == 4
+        assert await stream.__anext__() == ": heartbeat\n\n"
+
+        await stream.aclose()
+        return broker.subscriber_count()
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_stuck_subscriber_is_disconnected():
+    async def scenario():
+        broker = live_events.LiveEventBroker(buffer_size=1)
+        subscriber = broker.subscribe("u1")
+        for number in range(live_events.MAX_DROPPED_EVENTS + 2):
+            broker.publish("u1", {"type": "status-update", "number": number})
+        await asyncio.sleep(0)
+        frames = [frame async for frame in broker.stream(subscriber, heartbeat=0.05)]
+        return frames, broker.subscriber_count()
+
+    frames, remaining = asyncio.run(scenario())
+    assert frames == [] and remaining == 0
+
+
+def test_committed_webhooks_are_published(session_factory, webhook_event):
+
+    async def scenario():
+        subscriber = live_events.broker.subscribe("u1")
+        db = session_factory()
+        webhook_queue.enqueue(db, webhook_event("status-update", status="in-progress"))
+        webhook_queue.enqueue(db, webhook_event("transcript", role="user", transcript="Hello"))
+        webhook_queue.enqueue(db, webhook_event("transcript", role="user", transcript="Hel", transcriptType="partial"))
+        webhook_queue.enqueue(db, webhook_event("end-of-call-report", durationSeconds=42))
+        db.close()
+
+        # Processed on a worker thread, like the consumer does
+        await asyncio.to_thread(webhook_queue.process_batch, session_factory, 10, DedupIndex())
+        await asyncio.sleep(0)
+        received = []
+        while not subscriber.queue.empty():
+            received.append(subscriber.queue.get_nowait())
+        live_events.broker.unsubscribe(subscriber)
+        return received
+
+    received = asyncio.run(scenario())
+    assert [item["type"] for item in received] == ["call-start", "transcript", "call-end"]
+    assert received[1]["text"] == "Hello"
+    assert received[2]["call"]["duration"] == 42
+
+
+
+def test_open_stream_holds_no_database_connection(tmp_path, monkeypatch):
+    import main
+
+    # A file database, so the engine has a real connection pool
+    engine = create_engine(f"sqlite:///{tmp_path / 'live.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = session_factory()
+    db.add(User(id="u-live", name="Live", email="live@example.com", password_hash="x"))
+    db.add(Call(id="call-live", user_id="u-live", direction="outbound", status="in-progress"))
+    db.commit()
+    db.close()
+
+    async def scenario():
+        response = await main.stream_live_calls(main.create_access_token({"sub": "live@example.com"}))
+        frame = await response.body_iterator.__anext__()
+        checked_out = engine.pool.checkedout()
+        await response.body_iterator.aclose()
+        return frame, checked_out
+
+    monkeypatch.setattr(main, "SessionLocal", session_factory)
+    frame, checked_out = asyncio.run(scenario())
+    # The connection went back to the pool before the first event was sent
+    assert checked_out == 0
+    kind, snapshot = parse(frame)
+    assert kind == "snapshot" and [call["id"] for call in snapshot["calls"]] == ["call-live"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
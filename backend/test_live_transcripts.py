@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test the in-memory live transcript ring buffers
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import live_transcripts
+import webhooks
+from database import Call, CallActivity, TranscriptSegment
+
+
+def test_ring_and_global_cap():
+    buffer = live_transcripts.LiveTranscriptBuffer(ring_size=3, max_bytes=10 * live_transcripts.ENTRY_OVERHEAD)
+    for number in range(5):
+        buffer.record("call-1", "partial", "user", f"word {number}")
+    # Only the newest entries stay, but sequence numbers keep counting
+    assert [entry["seq"] for entry in buffer.entries("call-1")] == [3, 4, 5]
+    assert [entry["seq"] for entry in buffer.entries("call-1", since=4)] == [5]
+
+    # Filling other calls past the byte cap evicts from the least recently active call first
+    for call_id in ("call-2", "call-3", "call-4"):
+        for _ in range(3):
+            buffer.record(call_id, "speech", "assistant", data={"status": "started"})
+    assert buffer.total_bytes <= buffer.max_bytes
+    assert buffer.entries("call-1") == []
+    assert len(buffer.entries("call-4")) == 3
+    # A call whose entries were all evicted carries on from where it was, so `since=` readers see what comes next
+    buffer.record("call-1", "partial", "user", "word 5")
+    assert [entry["seq"] for entry in buffer.entries("call-1", since=5)] == [6]
+
+    buffer.discard("call-4")
+    assert buffer.stats()["calls"] == 3
+    assert buffer.total_bytes == sum(
+        size for call_buffer in buffer._calls.values() for size, _ in call_buffer.entries
+    )
+
+
+def test_entries_larger_than_the_cap_are_truncated():
+    buffer = live_transcripts.LiveTranscriptBuffer(max_bytes=2 * live_transcripts.ENTRY_OVERHEAD)
+    buffer.record("call-1", "partial", "user", "hello")
+    buffer.record("call-1", "function-call", data={"name": "lookup", "result": "x" * 10_000})
+    buffer.record("call-1", "partial", "user", "y" * 10_000)
+
+    entries = buffer.entries("call-1")
+    assert [entry["seq"] for entry in entries] == [3]
+    assert entries[0]["data"] == {"truncated": True}
+    assert len(entries[0]["text"]) < 10_000
+    assert buffer.total_bytes <= buffer.max_bytes
+
+
+def test_live_activity_is_flushed_once_at_call_end(db, webhook_event):
+    webhooks.process_webhook(db, webhook_event("status-update", status="in-progress"))
+    call = db.query(Call).one()
+
+    webhooks.process_webhook(db, webhook_event("speech-update", role="user", status="started"))
+    webhooks.process_webhook(db, webhook_event("transcript", role="user", transcriptType="partial", transcript="I'd"))
+    webhooks.process_webhook(db, webhook_event("transcript", role="user", transcriptType="final", transcript="I'd like a table"))
+    webhooks.process_webhook(db, webhook_event("function-call", functionCall={"name": "book", "parameters": {"guests": 2}}))
+
+    live = live_transcripts.live_buffer.entries(call.id)
+    assert [entry["kind"] for entry in live] == ["speech", "partial", "function-call"]
+    assert live[2]["data"]["name"] == "book"
+    # Nothing but the final utterance was written while the call was live
+    assert db.query(TranscriptSegment).count() == 1
+    assert db.query(CallActivity).count() == 0
+
+    webhooks.process_webhook(db, webhook_event("end-of-call-report", {"status": "ended"}))
+    assert live_transcripts.live_buffer.entries(call.id) == []
+    assert [entry["kind"] for entry in live_transcripts.stored_entries(db, call.id)] == ["speech", "partial", "function-call"]
+    assert [entry["seq"] for entry in live_transcripts.stored_entries(db, call.id, since=2)] == [3]
+
+    # Events for a call that has ended are not buffered again
+    webhooks.process_webhook(db, webhook_event("speech-update", role="user", status="stopped"))
+    assert live_transcripts.live_buffer.entries(call.id) == []
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
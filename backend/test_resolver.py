@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test the in-memory webhook owner resolver
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event
+
+from database import Agent, PhoneNumber
+from resolver import OwnerIndex
+
+
+@pytest.fixture
+def db(make_session_factory):
+    db = make_session_factory(phone_number=False)()
+    db.add(PhoneNumber(id="phone-1", vapi_id="vp-1", user_id="u1", number="+15550000001", name="Main", assistant_id="agent-1"))
+    db.add(Agent(id="agent-1", vapi_id="va-1", user_id="u1", name="Reception", industry="Health"))
+    db.add(Agent(id="agent-2", vapi_id="va-2", user_id="u2", name="Sales", industry="Retail"))
+    db.commit()
+    yield db
+    db.close()
+
+
+def count_queries(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_warm_index_resolves_without_queries(db):
+    index = OwnerIndex()
+    index.warm(db)
+    statements = count_queries(db.get_bind())
+
+    assert index.resolve(db, phone_vapi_id="vp-1") == ("u1", "agent-1", "phone-1")
+    assert index.resolve(db, phone_number="+15550000001", assistant_id="va-1") == ("u1", "agent-1", "phone-1")
+    assert index.resolve(db, assistant_id="va-2") == ("u2", "agent-2", None)
+    # Another user's assistant on this number falls back to the number's own agent
+    assert index.resolve(db, phone_vapi_id="vp-1", assistant_id="va-2") == ("u1", "agent-1", "phone-1")
+    assert statements == []
+
+
+def test_updates_and_misses(db):
+    index = OwnerIndex()
+    index.warm(db)
+
+    phone = db.get(PhoneNumber, "phone-1")
+    phone.number = "+15550000002"
+    db.commit()
+    index.upsert_phone(phone)
+    assert "+15550000001" not in index.phones_by_number
+    assert index.resolve(db, phone_number="+15550000001") == (None, None, None)
+    assert index.resolve(db, phone_number="+15550000002")[2] == "phone-1"
+
+    agent = db.get(Agent, "agent-2")
+    db.delete(agent)
+    db.commit()
+    index.remove_agent(agent)
+    assert index.resolve(db, assistant_id="va-2") == (None, None, None)
+
+    # Rows created elsewhere are found through the database and then cached
+    db.add(PhoneNumber(id="phone-3", vapi_id="vp-3", user_id="u3", number="+15550000003", name="Other"))
+    db.commit()
+    assert index.resolve(db, phone_vapi_id="vp-3") == ("u3", None, "phone-3")
+    assert "vp-3" in index.phones_by_vapi_id
+
+
+
+def test_misses_are_remembered(db):
+    now = [0.0]
+    index = OwnerIndex(miss_ttl=60, clock=lambda: now[0])
+    index.warm(db)
+    statements = count_queries(db.get_bind())
+
+    # Unknown keys cost one query each, then nothing until the TTL runs out
+    assert index.resolve(db, phone_vapi_id="vp-9", assistant_id="va-9") == (None, None, None)
+    assert len(statements) == 2
+    for _ in range(3):
+        assert index.resolve(db, phone_vapi_id="vp-9", assistant_id="va-9") == (None, None, None)
+    assert len(statements) == 2
+
+    # A row created through the routes clears the remembered miss at once
+    agent = Agent(id="agent-9", vapi_id="va-9", user_id="u9", name="New", industry="Retail")
+    db.add(agent)
+    db.commit()
+    index.upsert_agent(agent)
+    assert index.resolve(db, assistant_id="va-9") == ("u9", "agent-9", None)
+
+    # A row created by another process is found once the miss expires
+    db.add(PhoneNumber(id="phone-9", vapi_id="vp-9", user_id="u9", number="+15550000009", name="New"))
+    db.commit()
+    statements.clear()
+    assert index.resolve(db, phone_vapi_id="vp-9") == (None, None, None)
+    assert statements == []
+    now[0] += 61
+    assert index.resolve(db, phone_vapi_id="vp-9") == ("u9", None, "phone-9")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
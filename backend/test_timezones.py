@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test user-timezone-aware analytics bucketing
+"""
+
+import os
+import sys
+import uuid
+from datetime import date, datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+import analytics_engine
+import cost_forecast
+import rollups
+import timezones
+from database import Call
+
+NEW_YORK = timezones.get_zone("America/New_York")
+KATHMANDU = timezones.get_zone("Asia/Kathmandu")
+
+
+def add_calls(db, created_times):
+    for created_at in created_times:
+        db.add(Call(
+            id=str(uuid.uuid4()), user_id="u1", direction="inbound", status="ended", duration=60,
+            cost="1.0", started_at=created_at, created_at=created_at, updated_at=created_at
+        ))
+    db.commit()
+
+
+def test_local_boundaries_follow_dst():
+    # US clocks went forward on 2024-03-10 and back on 2024-11-03
+    _days, boundaries = timezones.local_day_boundaries(date(2024, 3, 9), date(2024, 3, 10), NEW_YORK)
+    assert boundaries == [datetime(2024, 3, 9, 5), datetime(2024, 3, 10, 5), datetime(2024, 3, 11, 4)]
+
+    hours, _boundaries = timezones.local_hour_boundaries(datetime(2024, 11, 3, 4), datetime(2024, 11, 3, 7), NEW_YORK)
+    assert [hour.hour for hour in hours] == [0, 1, 1, 2]
+
+    assert timezones.get_zone("Not/AZone").key == "UTC"
+    assert not timezones.is_valid_timezone("")
+
+
+def test_rollups_rebucket_into_local_days(db):
+    # 18:15 UTC on the 14th is midnight on the 15th in Kathmandu (UTC+5:45)
+    add_calls(db, [datetime(2024, 3, 14, 18, 10), datetime(2024, 3, 14, 18, 20), datetime(2024, 3, 14, 18, 50)])
+    rollups.refresh_user_rollups(db, "u1", datetime(2024, 3, 15))
+    rows = rollups.load_rollups(db, "u1", datetime(2024, 3, 14))
+    assert [row.bucket_start.minute for row in rows] == [0, 15, 45]
+
+    local = rollups.local_day_totals(rows, date(2024, 3, 14), date(2024, 3, 15), KATHMANDU)
+    assert local["2024-03-14"]["calls"] == 1
+    assert local["2024-03-15"]["calls"] == 2
+
+    utc = rollups.local_day_totals(rows, date(2024, 3, 14), date(2024, 3, 15), timezones.get_zone("UTC"))
+    assert utc["2024-03-14"]["calls"] == 3
+
+
+def test_engine_uses_local_days_and_hours(db):
+    # 02:30 UTC on the 15th is still the evening of the 14th in New York (EDT, UTC-4)
+    now = datetime(2024, 3, 15, 3)
+    add_calls(db, [datetime(2024, 3, 14, 5), datetime(2024, 3, 15, 2, 30)])
+    frame = analytics_engine.load_call_frame(db, "u1")
+
+    assert analytics_engine.dashboard_metrics(frame, now)["callsToday"] == 1
+    assert analytics_engine.dashboard_metrics(frame, now, NEW_YORK)["callsToday"] == 2
+
+    assert analytics_engine.calls_by_day(frame) == {
+        "2024-03-14": {"inbound": 1, "outbound": 0},
+        "2024-03-15": {"inbound": 1, "outbound": 0},
+    }
+    assert analytics_engine.calls_by_day(frame, tz=NEW_YORK) == {"2024-03-14": {"inbound": 2, "outbound": 0}}
+
+    heatmap = analytics_engine.hourly_heatmap(frame, tz=NEW_YORK)
+    # Thursday 01:00 and 22:30 local time
+    assert heatmap[3][1] == 1 and heatmap[3][22] == 1
+
+
+def test_burn_rate_month_is_local():
+    # 03:00 UTC on April 1st is still March in New York
+    now = datetime(2024, 4, 1, 3)
+    rows = [(datetime(2024, 3, 31, 20), "agent-1", "phone-1", 1, 60, 5.0)]
+
+    assert cost_forecast.burn_rate_report(rows, now)["month"]["spend_to_date"] == 0
+    report = cost_forecast.burn_rate_report(rows, now, tz=NEW_YORK)
+    assert report["month"]["month"] == "2024-03"
+    assert report["month"]["spend_to_date"] == 5.0
+    assert report["month"]["days_remaining"] == 0.04
+    assert cost_forecast.history_start(now, NEW_YORK) == datetime(2024, 3, 1, 5)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test idempotent webhook processing
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import transcripts
+import webhook_queue
+import webhooks
+from database import Call, ProcessedWebhookEvent
+from metrics import registry
+from webhook_dedup import DedupIndex
+
+
+def test_redelivered_events_are_skipped(session_factory, db, webhook_event):
+    registry.reset()
+    dedup = DedupIndex()
+
+    hello = webhook_event("transcript", timestamp=1000, role="user", transcript="Hello")
+    for payload in [hello, hello, webhook_event("transcript", timestamp=2000, role="user", transcript="Hello")]:
+        webhook_queue.enqueue(db, payload)
+    webhook_queue.process_batch(session_factory, dedup=dedup)
+
+    # Same utterance said twice is kept; the retry of the first is not
+    db.expire_all()
+    assert transcripts.transcript_for(db, db.query(Call).one()) == "User: Hello\nUser: Hello"
+
+    # A retry after the batch committed is an O(1) LRU hit
+    assert webhooks.process_webhook(db, hello, dedup)["status"] == "duplicate"
+    assert registry.snapshot()["counters"]["webhook.dedup.hits"] == 2
+
+
+def test_persisted_index_survives_restart_and_expires(session_factory, db, webhook_event):
+    end = webhook_event("end-of-call-report", timestamp=5000, durationSeconds=30)
+    assert webhooks.process_webhook(db, end, DedupIndex())["status"] == "processed"
+
+    # A fresh process loads recent fingerprints from the table
+    warmed = DedupIndex()
+    assert warmed.warm(db) == 1
+    assert webhooks.process_webhook(db, end, warmed)["status"] == "duplicate"
+
+    # One that doesn't know the fingerprint is stopped by the table's key at commit
+    restarted = DedupIndex()
+    assert webhooks.process_webhook(db, end, restarted)["status"] == "duplicate"
+    db.expire_all()
+    assert db.query(Call).one().duration == 30
+
+    # Same for a queued redelivery: the batch is retried and the event skipped
+    hello = webhook_event("transcript", timestamp=6000, role="user", transcript="Hello")
+    webhooks.process_webhook(db, hello, DedupIndex())
+    webhook_queue.enqueue(db, hello)
+    webhook_queue.enqueue(db, webhook_event("transcript", timestamp=6001, role="user", transcript="Bye"))
+    assert webhook_queue.process_batch(session_factory, dedup=DedupIndex()) == 2
+    db.expire_all()
+    assert transcripts.transcript_for(db, db.query(Call).one()) == "User: Hello\nUser: Bye"
+    assert webhook_queue.queue_stats(db)["depth"] == 0
+
+    # Past the TTL the fingerprint is purged
+    assert restarted.purge_expired(db, datetime.utcnow() + timedelta(days=3)) == 3
+    assert db.query(ProcessedWebhookEvent).count() == 0
+
+
+def test_rolled_back_events_are_not_remembered(db, webhook_event):
+    dedup = DedupIndex()
+    payload = webhook_event("status-update", timestamp=7000, status="in-progress")
+
+    db.commit = lambda: (_ for _ in ()).throw(RuntimeError("disk full"))
+    try:
+        webhooks.process_webhook(db, payload, dedup)
+    except RuntimeError:
+        pass
+    db.rollback()
+    del db.commit
+
+    assert webhooks.process_webhook(db, payload, dedup)["status"] == "processed"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test the raw webhook event log and replay pacing
+"""
+
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import replay_webhooks
+import webhook_log
+import webhook_queue
+from database import Call
+from webhook_dedup import DedupIndex
+
+
+def test_append_and_read_across_partitions(tmp_path):
+    log_dir = str(tmp_path)
+    base = datetime(2024, 5, 17, 13, 59, 58)
+    records = [(base + timedelta(seconds=offset), f'{{"n": {offset}}}') for offset in range(4)]
+
+    # Two appends to the same hour become two gzip members in one file
+    webhook_log.append(records[:3], log_dir)
+    webhook_log.append(records[3:], log_dir)
+    path = webhook_log.partition_path(datetime(2024, 5, 17, 14), log_dir)
+    assert path.endswith(os.path.join("2024", "05", "17", "14.jsonl.gz"))
+    with gzip.open(path, "rt") as f:
+        assert len(f.readlines()) == 2
+
+    read = list(webhook_log.read_events(base, base + timedelta(hours=2), log_dir))
+    assert read == records
+    # The range is half open and spans the hour boundary
+    middle = list(webhook_log.read_events(base + timedelta(seconds=1), base + timedelta(seconds=3), log_dir))
+    assert [payload for _, payload in middle] == ['{"n": 1}', '{"n": 2}']
+
+
+def test_dead_lettered_events_are_read_on_request(tmp_path):
+    log_dir = str(tmp_path)
+    received_at = datetime(2024, 5, 17, 14)
+    webhook_log.append([(received_at, '{"n": 0}')], log_dir)
+    webhook_log.append([(received_at, "not json")], log_dir, outcome=webhook_log.DEAD_LETTERED)
+    # Lines from before outcomes were recorded count as applied
+    with gzip.open(webhook_log.partition_path(received_at, log_dir), "at") as f:
+        f.write(json.dumps({"received_at": received_at.isoformat(), "payload": '{"n": 1}'}) + "\n")
+
+    window = (received_at, received_at + timedelta(hours=1))
+    assert [payload for _, payload in webhook_log.read_events(*window, log_dir)] == ['{"n": 0}', '{"n": 1}']
+    assert [payload for _, payload in webhook_log.read_events(*window, log_dir, outcomes=None)] == [
+        '{"n": 0}', "not json", '{"n": 1}'
+    ]
+
+
+def test_paced_replay_keeps_original_spacing():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(round(seconds, 6))
+        now[0] += seconds
+
+    base = datetime(2024, 5, 17, 14)
+    events = [(base + timedelta(seconds=offset), "{}") for offset in (0, 10, 10, 30)]
+    assert len(list(webhook_log.paced(events, 10, clock=lambda: now[0], sleep=sleep))) == 4
+    assert sleeps == [1.0, 2.0]
+
+    sleeps.clear()
+    list(webhook_log.paced(events, None, clock=lambda: now[0], sleep=sleep))
+    assert sleeps == []
+
+
+def test_consumed_events_can_be_replayed_into_fresh_database(session_factory, make_session_factory, webhook_event, log_dir):
+    db = session_factory()
+    webhook_queue.enqueue(db, webhook_event("status-update", status="in-progress"))
+    webhook_queue.enqueue(db, webhook_event("end-of-call-report", durationSeconds=42))
+    db.close()
+    webhook_queue.process_batch(session_factory, dedup=DedupIndex())
+
+    # Rebuild call state from the log alone
+    rebuilt = make_session_factory()
+    logged = list(webhook_log.read_events(datetime.utcnow() - timedelta(hours=1), datetime.utcnow() + timedelta(hours=1), log_dir))
+    assert len(logged) == 2
+
+    outcomes = [outcome for outcome, _ in replay_webhooks.replay_to_database(logged, session_factory=rebuilt)]
+    assert outcomes == ["processed", "processed"]
+    db = rebuilt()
+    call = db.query(Call).one()
+    assert (call.status, call.duration) == ("completed", 42)
+
+    # Replaying again skips what was applied, unless dedup is turned off for a repair
+    outcomes = [outcome for outcome, _ in replay_webhooks.replay_to_database(logged, session_factory=rebuilt)]
+    assert outcomes == ["duplicate", "duplicate"]
+    outcomes = [outcome for outcome, _ in replay_webhooks.replay_to_database(logged, dedup=False, session_factory=rebuilt)]
+    # The lifecycle state machine still won't move the ended call back to in-progress
+    assert outcomes == ["stale", "processed"]
+    assert db.query(Call).count() == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
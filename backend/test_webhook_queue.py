@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test the acknowledge-then-process webhook queue
+"""
+
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import transcripts
+import webhook_log
+import webhook_queue
+import webhooks
+from database import Call, WebhookQueueItem
+from webhook_dedup import DedupIndex
+
+
+def logged_types():
+    now = datetime.utcnow()
+    return [json.loads(body)["message"]["type"]
+            for _, body in webhook_log.read_events(now - timedelta(hours=1), now + timedelta(hours=1))]
+
+
+def test_batch_applies_events_in_order(session_factory, db, webhook_event):
+    webhook_queue.enqueue(db, webhook_event("status-update", status="in-progress"))
+    for text in ["Hello", "Hi there", "Goodbye"]:
+        webhook_queue.enqueue(db, webhook_event("transcript", role="user", transcript=text))
+    webhook_queue.enqueue(db, b"not json")
+    assert webhook_queue.queue_stats(db)["depth"] == 5
+
+    assert webhook_queue.process_batch(session_factory, batch_size=10, dedup=DedupIndex()) == 5
+    db.expire_all()
+    calls = db.query(Call).all()
+    assert len(calls) == 1
+    assert transcripts.transcript_for(db, calls[0]) == "User: Hello\nUser: Hi there\nUser: Goodbye"
+
+    # The undecodable event is parked instead of blocking the queue
+    stats = webhook_queue.queue_stats(db)
+    assert (stats["depth"], stats["failed"]) == (0, 1)
+    assert db.query(WebhookQueueItem).one().attempts == 1
+
+    # It still reaches the event log, marked so replays leave it out unless asked
+    assert len(logged_types()) == 4
+    now = datetime.utcnow()
+    logged = list(webhook_log.read_events(now - timedelta(hours=1), now + timedelta(hours=1), outcomes=None))
+    assert logged[-1][1] == "not json"
+
+
+def test_failing_event_does_not_block_batch(session_factory, db, webhook_event, monkeypatch):
+    webhook_queue.enqueue(db, webhook_event("status-update", status="in-progress"))
+    webhook_queue.enqueue(db, webhook_event("function-call", functionCall={"name": "book"}))
+    webhook_queue.enqueue(db, webhook_event("status-update", status="ended"))
+    dedup = DedupIndex()
+
+    def broken_handler(db, message, call):
+        # A ValueError from a handler may be transient: only undecodable bodies are parked at once
+        raise ValueError("handler bug")
+
+    with monkeypatch.context() as patch:
+        patch.setitem(webhooks.EVENT_HANDLERS, "function-call", broken_handler)
+        webhook_queue.process_batch(session_factory, dedup=dedup)
+
+    db.expire_all()
+    assert db.query(Call).one().status == "ended"
+    item = db.query(WebhookQueueItem).one()
+    assert item.attempts == 1 and item.failed_at is None and "handler bug" in item.last_error
+
+    # Only committed events reach the log: the rolled-back batch adds nothing of its own
+    assert sorted(logged_types()) == ["status-update", "status-update"]
+
+    # Retried successfully on the next pass, and logged then
+    assert webhook_queue.process_batch(session_factory, dedup=dedup) == 1
+    assert webhook_queue.queue_stats(db)["depth"] == 0
+    assert sorted(logged_types()) == ["function-call", "status-update", "status-update"]
+
+
+def test_post_commit_failure_keeps_batch(session_factory, db, webhook_event, monkeypatch):
+    webhook_queue.enqueue(db, webhook_event("status-update", status="in-progress"))
+    webhook_queue.enqueue(db, webhook_event("transcript", role="user", transcript="Hello"))
+
+    def broken_after_commit(results):
+        raise RuntimeError("publisher down")
+
+    monkeypatch.setattr(webhooks, "after_commit", broken_after_commit)
+    assert webhook_queue.process_batch(session_factory, dedup=DedupIndex()) == 2
+
+    # Committed events are not replayed or counted as failures
+    stats = webhook_queue.queue_stats(db)
+    assert (stats["depth"], stats["failed"]) == (0, 0)
+    assert db.query(Call).count() == 1
+
+
+def test_consumer_drains_queue(session_factory, webhook_event):
+
+    async def scenario():
+        consumer = webhook_queue.WebhookQueueConsumer(session_factory, poll_interval=5, dedup=DedupIndex())
+        consumer.start()
+        db = session_factory()
+        webhook_queue.enqueue(db, webhook_event("status-update", status="in-progress"))
+        consumer.notify()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if webhook_queue.queue_stats(db)["depth"] == 0:
+                break
+        await consumer.stop()
+        return db.query(Call).count()
+
+    assert asyncio.run(scenario()) == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
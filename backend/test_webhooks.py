@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Test the VAPI webhook dispatch pipeline
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import transcripts
+import webhooks
+from database import Agent, Call
+from metrics import registry
+
+
+@pytest.fixture(autouse=True)
+def agent(db):
+    db.add(Agent(id="agent-1", vapi_id="vapi-assistant-1", user_id="u1", name="Reception", industry="Health"))
+    db.commit()
+
+
+@pytest.fixture
+def event(webhook_event):
+    """Bodies for calls answered by the ``agent-1`` assistant"""
+    def build(message_type, call=None, **fields):
+        return webhook_event(message_type, {"assistantId": "vapi-assistant-1", **(call or {})}, **fields)
+    return build
+
+
+def test_call_lifecycle_through_dispatch_table(db, event):
+    registry.reset()
+
+    result = webhooks.process_webhook(db, event("status-update", {"type": "inboundPhoneCall"}, status="in-progress"))
+    assert result["status"] == "processed"
+    call = db.query(Call).filter(Call.vapi_id == "vapi-call-1").one()
+    assert (call.user_id, call.agent_id, call.phone_number_id) == ("u1", "agent-1", "phone-1")
+    assert call.status == "in-progress" and call.direction == "inbound"
+
+    webhooks.process_webhook(db, event("transcript", role="assistant", transcriptType="final", transcript="Hello!"))
+    webhooks.process_webhook(db, event("transcript", role="user", transcriptType="partial", transcript="I'd"))
+    webhooks.process_webhook(db, event("transcript", role="user", transcriptType="final", transcript="I'd like a booking"))
+    assert call.transcript is None
+    assert transcripts.transcript_for(db, call) == "AI: Hello!\nUser: I'd like a booking"
+
+    webhooks.process_webhook(db, event(
+        "end-of-call-report",
+        {"status": "ended"},
+        endedReason="customer-ended-call",
+        durationSeconds=42.4,
+        cost=0.17,
+        artifact={"recordingUrl": "https://example.com/rec.wav", "transcript": "AI: Hello!\nUser: I'd like a booking"},
+    ))
+    db.refresh(call)
+    assert (call.status, call.ended_reason, call.duration, call.cost) == ("ended", "customer-ended-call", 42, "0.17")
+    assert call.recording_url == "https://example.com/rec.wav"
+    assert db.query(Call).count() == 1
+
+    snapshot = registry.snapshot("webhook.")
+    assert snapshot["counters"]["webhook.events.transcript"] == 3
+    assert snapshot["timings"]["webhook.latency.end-of-call-report"]["count"] == 1
+
+
+def test_ignored_and_invalid_events(db, event):
+    registry.reset()
+
+    assert webhooks.process_webhook(db, event("model-output"))["status"] == "ignored"
+    assert webhooks.process_webhook(db, event("status-update", {"phoneNumberId": "other", "assistantId": None}))["status"] == "ignored"
+    assert db.query(Call).count() == 0
+    assert registry.snapshot()["counters"]["webhook.ignored.unknown_call"] == 1
+
+    try:
+        webhooks.process_webhook(db, b'{"message": {}}')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError for a message without a type")
+
+
+def test_transcript_segments_materialize_at_call_end(db, event):
+    webhooks.process_webhook(db, event("status-update", status="in-progress"))
+    for seq, (role, text) in enumerate([("assistant", "Hi"), ("user", "Hello"), ("assistant", "Bye")]):
+        webhooks.process_webhook(db, event("transcript", role=role, transcript=text, timestamp=1700000000000 + seq))
+
+    call = db.query(Call).one()
+    segments = transcripts.load_segments(db, call.id)
+    assert [(segment.seq, segment.role) for segment in segments] == [(1, "assistant"), (2, "user"), (3, "assistant")]
+    assert segments[0].timestamp.year == 2023
+
+    # Without a final transcript from VAPI the segments are stored once on the call
+    webhooks.process_webhook(db, event("end-of-call-report", {"status": "ended"}))
+    db.refresh(call)
+    assert call.transcript == "AI: Hi\nUser: Hello\nAI: Bye"
+
+
+def test_stale_lifecycle_events_are_rejected(db, event):
+    registry.reset()
+    at = 1700000000000
+
+    webhooks.process_webhook(db, event("status-update", status="ringing", timestamp=at))
+    webhooks.process_webhook(db, event("status-update", status="in-progress", timestamp=at + 2000))
+    # Arrived late: older than what was applied, and a step backwards
+    assert webhooks.process_webhook(db, event("status-update", status="ringing", timestamp=at + 1000))["status"] == "stale"
+    # Redelivered with a new timestamp but no change
+    assert webhooks.process_webhook(db, event("status-update", status="in-progress", timestamp=at + 2500))["status"] == "stale"
+
+    webhooks.process_webhook(db, event("hang", {"status": "ended"}, timestamp=at + 60000))
+    call = db.query(Call).one()
+    ended_at = call.ended_at
+    assert webhooks.process_webhook(db, event("status-update", status="in-progress", timestamp=at + 61000))["status"] == "stale"
+
+    # The end-of-call report still fills in the final details
+    result = webhooks.process_webhook(db, event("end-of-call-report", {"status": "ended"}, cost=0.2, timestamp=at + 65000))
+    assert result["status"] == "processed"
+    db.refresh(call)
+    assert (call.status, call.cost, call.event_seq) == ("ended", "0.2", 4)
+    assert call.ended_at >= ended_at
+    assert registry.snapshot()["counters"]["webhook.stale.status-update"] == 3
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,88 @@
+"""
+User timezone helpers for analytics bucketing.
+
+Calls and rollups are stored in naive UTC. To report in a user's local time
+we convert local calendar boundaries (midnights, hour starts) to UTC with
+zoneinfo, which accounts for DST, and bucket UTC timestamps against them.
+"""
+
+from bisect import bisect_right
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+
+DEFAULT_TIMEZONE = "UTC"
+
+
+def is_valid_timezone(name: str) -> bool:
+    if not name:
+        return False
+    try:
+        ZoneInfo(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+
+def get_zone(name: Optional[str]) -> ZoneInfo:
+    """ZoneInfo for an IANA name, falling back to UTC for unknown or empty names"""
+    if is_valid_timezone(name):
+        return ZoneInfo(name)
+    return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def list_timezones() -> List[str]:
+    return sorted(available_timezones())
+
+
+def to_utc_naive(local: datetime) -> datetime:
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def local_now(tz: ZoneInfo, now: Optional[datetime] = None) -> datetime:
+    """Local wall-clock time for a naive UTC ``now``"""
+    now = now or datetime.utcnow()
+    return now.replace(tzinfo=timezone.utc).astimezone(tz)
+
+
+def local_midnight_utc(day: date, tz: ZoneInfo) -> datetime:
+    """The naive UTC instant at which ``day`` starts in ``tz``"""
+    return to_utc_naive(datetime(day.year, day.month, day.day, tzinfo=tz))
+
+
+def local_day_boundaries(first_day: date, last_day: date, tz: ZoneInfo) -> Tuple[List[date], List[datetime]]:
+    """Local days from first_day to last_day inclusive and the UTC start of each, plus the end of the last"""
+    days = []
+    day = first_day
+    while day <= last_day:
+        days.append(day)
+        day += timedelta(days=1)
+    boundaries = [local_midnight_utc(day, tz) for day in days + [day]]
+    return days, boundaries
+
+
+def local_hour_boundaries(start: datetime, end: datetime, tz: ZoneInfo) -> Tuple[List[datetime], List[datetime]]:
+    """Local hour starts covering the naive UTC range [start, end) and their UTC instants.
+
+    Stepping in UTC and converting each instant keeps repeated or skipped
+    local hours at DST transitions correct.
+    """
+    utc_start = start.replace(minute=0, second=0, microsecond=0)
+    local_hours = []
+    boundaries = []
+    moment = utc_start
+    while moment < end + timedelta(hours=1):
+        local = moment.replace(tzinfo=timezone.utc).astimezone(tz)
+        # Zones with :30/:45 offsets start local hours off the UTC hour
+        local_start = local.replace(minute=0, second=0, microsecond=0)
+        utc_boundary = to_utc_naive(local_start)
+        if not boundaries or utc_boundary > boundaries[-1]:
+            local_hours.append(local_start)
+            boundaries.append(utc_boundary)
+        moment += timedelta(hours=1)
+    return local_hours, boundaries
+
+
+def bucket_index(boundaries: List[datetime], moment: datetime) -> int:
+    """Index of the bucket containing ``moment``, -1 before the first boundary"""
+    return bisect_right(boundaries, moment) - 1
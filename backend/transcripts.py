@@ -0,0 +1,75 @@
+"""
+Append-only call transcripts.
+
+Live transcript events are stored as ``transcript_segments`` rows, one
+constant-size insert per utterance, instead of rewriting a growing Text
+column. The full transcript is materialized from the segments on read, and
+stored on the call once when it ends.
+"""
+
+from datetime import datetime, timezone
+from typing import List, Optional, Union
+
+from sqlalchemy import func
+
+from database import Call, TranscriptSegment
+
+ROLE_LABELS = {"assistant": "AI", "bot": "AI", "user": "User", "customer": "User"}
+
+
+def event_time(timestamp: Optional[Union[float, str]]) -> datetime:
+    """Naive UTC time of a VAPI event timestamp (epoch milliseconds or ISO 8601)"""
+    if isinstance(timestamp, (int, float)):
+        return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).replace(tzinfo=None)
+    if isinstance(timestamp, str):
+        try:
+            moment = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+            return moment.astimezone(timezone.utc).replace(tzinfo=None) if moment.tzinfo else moment
+        except ValueError:
+            pass
+    return datetime.utcnow()
+
+
+def append_segment(db, call_id: str, role: Optional[str], text: str, timestamp: Optional[datetime] = None) -> TranscriptSegment:
+    """Add the next segment of a call's transcript"""
+    last_seq = db.query(func.max(TranscriptSegment.seq)).filter(TranscriptSegment.call_id == call_id).scalar()
+    segment = TranscriptSegment(
+        call_id=call_id,
+        seq=(last_seq or 0) + 1,
+        role=role,
+        text=text,
+        timestamp=timestamp or datetime.utcnow(),
+    )
+    db.add(segment)
+    # Sessions don't autoflush; the next segment in the same batch needs this seq
+    db.flush()
+    return segment
+
+
+def load_segments(db, call_id: str) -> List[TranscriptSegment]:
+    return db.query(TranscriptSegment).filter(TranscriptSegment.call_id == call_id).order_by(TranscriptSegment.seq).all()
+
+
+def format_segments(segments: List[TranscriptSegment]) -> str:
+    lines = []
+    for segment in segments:
+        label = ROLE_LABELS.get(segment.role)
+        lines.append(f"{label}: {segment.text}" if label else segment.text)
+    return "\n".join(lines)
+
+
+def transcript_for(db, call: Call) -> Optional[str]:
+    """The call's stored transcript, or one assembled from its live segments while it is in progress"""
+    if call.transcript:
+        return call.transcript
+    segments = load_segments(db, call.id)
+    return format_segments(segments) if segments else call.transcript
+
+
+def materialize(db, call: Call) -> Optional[str]:
+    """Store the transcript assembled from segments on the call, unless it already has one"""
+    if not call.transcript:
+        segments = load_segments(db, call.id)
+        if segments:
+            call.transcript = format_segments(segments)
+    return call.transcript
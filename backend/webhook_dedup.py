@@ -0,0 +1,128 @@
+"""
+Duplicate detection for VAPI webhook retries.
+
+Each event is fingerprinted from its call id, message type and VAPI
+timestamp. Recently seen fingerprints live in a bounded in-memory LRU, which
+is the only thing consulted while events are applied. Fingerprints are also
+written to the ``processed_webhook_events`` table, pruned after
+``DEDUP_TTL``, in the same transaction as the event's effects; they only
+enter the LRU once that transaction commits, so a rolled-back batch is never
+mistaken for processed.
+
+At startup the LRU is loaded from the table. A duplicate older than what the
+LRU holds is caught by the table's primary key when its transaction commits:
+``rolled_back(db)`` then looks up the staged fingerprints and remembers the
+ones already processed, so the retry skips them.
+"""
+
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from database import ProcessedWebhookEvent
+from metrics import registry
+
+LRU_SIZE = 50000
+DEDUP_TTL = timedelta(days=2)
+
+
+def fingerprint(event) -> str:
+    """call id + message type + timestamp, with a content hash when VAPI sends no timestamp"""
+    message = event.message
+    marker = message.timestamp
+    if marker is None:
+        marker = hashlib.sha256(message.model_dump_json().encode("utf-8")).hexdigest()
+    call_id = message.call.id if message.call else ""
+    return f"{call_id}:{message.type}:{marker}"
+
+
+class DedupIndex:
+    def __init__(self, capacity: int = LRU_SIZE, ttl: timedelta = DEDUP_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._recent: "OrderedDict[str, datetime]" = OrderedDict()
+        self._pending = {}
+
+    def _remember(self, key: str, processed_at: datetime):
+        self._recent[key] = processed_at
+        self._recent.move_to_end(key)
+        if len(self._recent) > self.capacity:
+            self._recent.popitem(last=False)
+
+    def warm(self, db, now: Optional[datetime] = None) -> int:
+        """Load the most recent unexpired fingerprints from the table"""
+        now = now or datetime.utcnow()
+        rows = (
+            db.query(ProcessedWebhookEvent.fingerprint, ProcessedWebhookEvent.processed_at)
+            .filter(ProcessedWebhookEvent.processed_at >= now - self.ttl)
+            .order_by(ProcessedWebhookEvent.processed_at.desc())
+            .limit(self.capacity)
+            .all()
+        )
+        for key, processed_at in reversed(rows):
+            self._remember(key, processed_at)
+        registry.set_gauge("webhook.dedup.lru_size", len(self._recent))
+        return len(rows)
+
+    def seen(self, key: str, now: Optional[datetime] = None) -> bool:
+        """Whether the event was processed recently (or staged earlier in this transaction)"""
+        now = now or datetime.utcnow()
+        if key in self._pending:
+            registry.increment("webhook.dedup.hits")
+            return True
+
+        processed_at = self._recent.get(key)
+        if processed_at is not None:
+            if now - processed_at < self.ttl:
+                self._recent.move_to_end(key)
+                registry.increment("webhook.dedup.hits")
+                return True
+            del self._recent[key]
+        return False
+
+    def stage(self, db, key: str, now: Optional[datetime] = None):
+        """Record the fingerprint as part of the current transaction"""
+        now = now or datetime.utcnow()
+        # A plain insert: if the fingerprint is already persisted, the commit fails on its primary key
+        db.add(ProcessedWebhookEvent(fingerprint=key, processed_at=now))
+        self._pending[key] = now
+
+    def committed(self):
+        for key, processed_at in self._pending.items():
+            self._remember(key, processed_at)
+        self._pending.clear()
+        registry.set_gauge("webhook.dedup.lru_size", len(self._recent))
+
+    def rolled_back(self, db=None, now: Optional[datetime] = None) -> int:
+        """Forget what the failed transaction staged; returns how many of its events were already processed.
+
+        With ``db`` (already rolled back), staged fingerprints found in the
+        table are remembered so retrying the events skips them, and expired
+        ones not yet purged are deleted so the events can be applied.
+        """
+        pending, self._pending = self._pending, {}
+        if db is None or not pending:
+            return 0
+        now = now or datetime.utcnow()
+        duplicates = expired = 0
+        for row in db.query(ProcessedWebhookEvent).filter(ProcessedWebhookEvent.fingerprint.in_(list(pending))):
+            if now - row.processed_at < self.ttl:
+                self._remember(row.fingerprint, row.processed_at)
+                duplicates += 1
+            else:
+                db.delete(row)
+                expired += 1
+        if expired:
+            db.commit()
+        registry.increment("webhook.dedup.table_hits", duplicates)
+        return duplicates
+
+    def purge_expired(self, db, now: Optional[datetime] = None) -> int:
+        """Delete persisted fingerprints older than the TTL; returns how many were removed"""
+        cutoff = (now or datetime.utcnow()) - self.ttl
+        removed = db.query(ProcessedWebhookEvent).filter(ProcessedWebhookEvent.processed_at < cutoff).delete(
+            synchronize_session=False
+        )
+        db.commit()
+        return removed
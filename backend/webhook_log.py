@@ -0,0 +1,106 @@
+"""
+Append-only log of raw VAPI webhook bodies.
+
+Every body taken off the webhook queue is appended, exactly as received, to a
+gzip file for the UTC hour it arrived in::
+
+    <WEBHOOK_LOG_DIR>/2024/05/17/14.jsonl.gz
+
+Each line is ``{"received_at": ..., "payload": ..., "outcome": ...}``, where
+the outcome is ``applied`` or, for a body the queue gave up on,
+``dead_lettered``; lines written before outcomes were recorded count as
+applied. A batch is written as one gzip member appended to the file;
+concatenated members are still a valid gzip stream, so files never need
+rewriting and old hours can be archived or deleted as whole files.
+``read_events`` yields a time range back in arrival order for
+``replay_webhooks.py``.
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Collection, Iterable, Iterator, Optional, Tuple
+
+LOG_DIR = os.getenv("WEBHOOK_LOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "webhook_log"))
+
+APPLIED = "applied"
+DEAD_LETTERED = "dead_lettered"
+
+_write_lock = threading.Lock()
+
+
+def partition_path(moment: datetime, log_dir: Optional[str] = None) -> str:
+    """The hourly file a naive-UTC receive time belongs to"""
+    return os.path.join(
+        log_dir or LOG_DIR,
+        f"{moment.year:04d}", f"{moment.month:02d}", f"{moment.day:02d}", f"{moment.hour:02d}.jsonl.gz",
+    )
+
+
+def append(records: Iterable[Tuple[datetime, str]], log_dir: Optional[str] = None, outcome: str = APPLIED) -> int:
+    """Append (received_at, raw body) records with one outcome; returns how many were written"""
+    partitions = {}
+    for received_at, payload in records:
+        line = json.dumps({"received_at": received_at.isoformat(), "payload": payload, "outcome": outcome}) + "\n"
+        partitions.setdefault(partition_path(received_at, log_dir), []).append(line)
+
+    written = 0
+    with _write_lock:
+        for path, lines in partitions.items():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with gzip.open(path, "at", encoding="utf-8") as f:
+                f.writelines(lines)
+            written += len(lines)
+    return written
+
+
+def read_events(
+    start: datetime,
+    end: datetime,
+    log_dir: Optional[str] = None,
+    outcomes: Optional[Collection[str]] = (APPLIED,),
+) -> Iterator[Tuple[datetime, str]]:
+    """(received_at, raw body) for events received in [start, end), oldest first.
+
+    Only applied events by default; ``outcomes=None`` includes dead-lettered ones too.
+    """
+    hour = start.replace(minute=0, second=0, microsecond=0)
+    while hour < end:
+        path = partition_path(hour, log_dir)
+        if os.path.exists(path):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    received_at = datetime.fromisoformat(record["received_at"])
+                    if not start <= received_at < end:
+                        continue
+                    if outcomes is None or record.get("outcome", APPLIED) in outcomes:
+                        yield received_at, record["payload"]
+        hour += timedelta(hours=1)
+
+
+def paced(
+    events: Iterable[Tuple[datetime, str]],
+    speed: Optional[float],
+    clock: Callable[[], float] = time.monotonic,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Iterator[Tuple[datetime, str]]:
+    """Yield events spaced as they originally arrived, ``speed`` times faster.
+
+    ``speed=1`` replays in real time; ``None`` replays as fast as possible.
+    Lateness doesn't accumulate: each event is due at its original offset from
+    the first one, however long the previous events took to deliver.
+    """
+    first = started = None
+    for received_at, payload in events:
+        if speed is not None:
+            if first is None:
+                first, started = received_at, clock()
+            due = started + (received_at - first).total_seconds() / speed
+            delay = due - clock()
+            if delay > 0:
+                sleep(delay)
+        yield received_at, payload
@@ -0,0 +1,255 @@
+"""
+Acknowledge-then-process queue for VAPI webhooks.
+
+The webhook endpoint only appends the raw body to the ``webhook_queue``
+table and returns. A background consumer drains the queue in delivery order,
+applying up to ``BATCH_SIZE`` events per transaction, so a burst of events
+costs one commit per batch instead of one per event.
+
+If anything in a batch fails, the batch is rolled back and replayed one event
+per transaction so a single bad event can't hold back the others. Events that
+keep failing are marked ``failed_at`` after ``MAX_ATTEMPTS`` and left in the
+table for inspection. Redelivered events are skipped using the dedup index
+in ``webhook_dedup.py``. Raw bodies are appended to the event log in
+``webhook_log.py`` once the transaction that applied or dead-lettered them has
+committed, so a rolled-back or retried batch doesn't log the same event twice
+and a parked event can still be replayed once its handler is fixed.
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func
+
+import webhook_log
+import webhooks
+from database import WebhookQueueItem
+from metrics import registry
+from webhook_dedup import DedupIndex
+
+BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "200"))
+POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "0.5"))  # seconds
+MAX_ATTEMPTS = 5
+LOG_EVENTS = os.getenv("WEBHOOK_LOG_ENABLED", "true").lower() == "true"
+PURGE_INTERVAL = timedelta(hours=1)
+
+# Shared by every consumer in this process
+dedup_index = DedupIndex()
+
+
+def enqueue(db, payload: bytes) -> int:
+    """Durably store a raw webhook body; returns its queue id"""
+    item = WebhookQueueItem(payload=payload.decode("utf-8", errors="replace"), received_at=datetime.utcnow())
+    db.add(item)
+    db.commit()
+    registry.increment("webhook.queue.enqueued")
+    return item.id
+
+
+def _pending(db, limit: int) -> List[WebhookQueueItem]:
+    return (
+        db.query(WebhookQueueItem)
+        .filter(WebhookQueueItem.failed_at.is_(None))
+        .order_by(WebhookQueueItem.id)
+        .limit(limit)
+        .all()
+    )
+
+
+class InvalidPayload(ValueError):
+    """A queued body that can never be decoded into a webhook event"""
+
+
+def _apply(db, item: WebhookQueueItem, now: datetime, dedup: DedupIndex) -> dict:
+    try:
+        event = webhooks.decode(item.payload)
+    except ValueError as e:
+        raise InvalidPayload(str(e)) from e
+    result = webhooks.apply_event(db, event, dedup)
+    db.delete(item)
+    registry.observe("webhook.queue.lag", (now - item.received_at).total_seconds())
+    return result
+
+
+def _record_failure(db, item_id: int, error: Exception, now: datetime):
+    item = db.get(WebhookQueueItem, item_id)
+    if item is None:
+        return  # Already applied and removed
+    item.attempts = (item.attempts or 0) + 1
+    item.last_error = str(error)
+    # Undecodable payloads will never succeed, so don't retry them; anything else may be transient
+    dead_lettered = item.attempts >= MAX_ATTEMPTS or isinstance(error, InvalidPayload)
+    if dead_lettered:
+        item.failed_at = now
+        registry.increment("webhook.queue.dead_lettered")
+    raw = (item.received_at, item.payload)
+    db.commit()
+    if dead_lettered:
+        _log_raw_events([raw], webhook_log.DEAD_LETTERED)
+
+
+def _log_raw_events(records: List[Tuple[datetime, str]], outcome: str = webhook_log.APPLIED):
+    if not LOG_EVENTS or not records:
+        return
+    try:
+        registry.increment("webhook.log.appended", webhook_log.append(records, outcome=outcome))
+    except OSError as e:
+        # The log is for replays; never let it hold up ingestion
+        print(f"Failed to append to webhook event log: {str(e)}")
+        registry.increment("webhook.log.errors")
+
+
+def _after_commit(results: List[dict]):
+    # The events are already durable; a failure here must not send them back through the retry path
+    try:
+        webhooks.after_commit(results)
+    except Exception as e:
+        print(f"Webhook post-commit hooks failed: {str(e)}")
+        registry.increment("webhook.queue.after_commit_errors")
+
+
+def process_batch(session_factory, batch_size: int = BATCH_SIZE, dedup: Optional[DedupIndex] = None) -> int:
+    """Apply the next batch of queued events; returns how many were taken off the queue"""
+    dedup = dedup or dedup_index
+    db = session_factory()
+    try:
+        started = time.perf_counter()
+        items = _pending(db, batch_size)
+        if not items:
+            return 0
+
+        now = datetime.utcnow()
+        item_ids = [item.id for item in items]
+        # Applied items are deleted, so keep what the log needs before applying them
+        raw = {item.id: (item.received_at, item.payload) for item in items}
+        try:
+            results = [_apply(db, item, now, dedup) for item in items]
+            db.commit()
+            dedup.committed()
+            batch_error = None
+        except Exception as e:
+            batch_error = e
+
+        if batch_error is None:
+            # Dashboards and the event log only hear about events once they are durable
+            _log_raw_events(list(raw.values()))
+            _after_commit(results)
+            processed = len(items)
+        else:
+            print(f"Webhook batch failed, retrying events one at a time: {str(batch_error)}")
+            db.rollback()
+            # Fingerprints already in the table are remembered, so the retry skips those events
+            dedup.rolled_back(db)
+            processed = 0
+            for item_id in item_ids:
+                item = db.get(WebhookQueueItem, item_id)
+                if item is None:
+                    continue
+                try:
+                    result = _apply(db, item, now, dedup)
+                    db.commit()
+                    dedup.committed()
+                except Exception as e:
+                    db.rollback()
+                    dedup.rolled_back(db)
+                    print(f"Webhook event {item_id} failed: {str(e)}")
+                    registry.increment("webhook.queue.failed_events")
+                    _record_failure(db, item_id, e, now)
+                    continue
+                _log_raw_events([raw[item_id]])
+                _after_commit([result])
+                processed += 1
+
+        registry.increment("webhook.queue.processed", processed)
+        registry.observe("webhook.queue.batch", time.perf_counter() - started)
+        return len(items)
+    finally:
+        db.close()
+
+
+def queue_stats(db, now: Optional[datetime] = None) -> dict:
+    """Current queue depth and how long the oldest pending event has been waiting"""
+    now = now or datetime.utcnow()
+    depth, oldest = db.query(func.count(WebhookQueueItem.id), func.min(WebhookQueueItem.received_at)).filter(
+        WebhookQueueItem.failed_at.is_(None)
+    ).one()
+    failed = db.query(func.count(WebhookQueueItem.id)).filter(WebhookQueueItem.failed_at.isnot(None)).scalar()
+    lag = (now - oldest).total_seconds() if oldest else 0.0
+
+    registry.set_gauge("webhook.queue.depth", depth)
+    registry.set_gauge("webhook.queue.lag_seconds", lag)
+    return {
+        "depth": depth,
+        "failed": failed,
+        "oldest_received_at": oldest.isoformat() if oldest else None,
+        "lag_seconds": round(lag, 3),
+    }
+
+
+class WebhookQueueConsumer:
+    """Background task draining the webhook queue"""
+
+    def __init__(
+        self,
+        session_factory,
+        batch_size: int = BATCH_SIZE,
+        poll_interval: float = POLL_INTERVAL,
+        dedup: Optional[DedupIndex] = None,
+    ):
+        self.session_factory = session_factory
+        self.dedup = dedup or dedup_index
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_purge = datetime.utcnow()
+
+    def notify(self):
+        """Wake the consumer early, e.g. right after an enqueue"""
+        self._wakeup.set()
+
+    async def run(self):
+        while True:
+            try:
+                # Database work runs in a thread so the event loop keeps acknowledging webhooks
+                taken = await asyncio.to_thread(process_batch, self.session_factory, self.batch_size, self.dedup)
+            except Exception as e:
+                print(f"Webhook consumer error: {str(e)}")
+                taken = 0
+
+            if datetime.utcnow() - self._last_purge >= PURGE_INTERVAL:
+                self._last_purge = datetime.utcnow()
+                try:
+                    await asyncio.to_thread(self._purge_fingerprints)
+                except Exception as e:
+                    print(f"Webhook fingerprint purge error: {str(e)}")
+
+            if taken < self.batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _purge_fingerprints(self):
+        db = self.session_factory()
+        try:
+            self.dedup.purge_expired(db)
+        finally:
+            db.close()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,387 @@
+"""
+VAPI webhook ingestion.
+
+Every VAPI server message is decoded once into typed Pydantic models and
+routed through ``EVENT_HANDLERS``, a table from message type to handler.
+Each handler receives the session, the decoded message and the local call
+record, and leaves committing to the caller, so events can be applied one
+per request or many per transaction (see ``webhook_queue.py``). Per-event-type
+counts and latencies are recorded in the shared metrics registry. Status and
+end-of-call events first pass the lifecycle check in ``call_lifecycle.py``,
+so stale or out-of-order ones never touch the call. Partial transcripts,
+speech updates and function calls only go to the in-memory ring buffers in
+``live_transcripts.py`` until the call ends.
+"""
+
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Tuple, Union
+
+from pydantic import BaseModel, ConfigDict
+
+import call_enrichment
+import call_limits
+import call_queues
+import call_lifecycle
+import live_events
+import live_transcripts
+import transcripts
+from database import Call
+from metrics import registry
+from resolver import owner_index
+from webhook_dedup import DedupIndex, fingerprint
+
+class VapiModel(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+
+class VapiPhoneNumber(VapiModel):
+    id: Optional[str] = None
+    number: Optional[str] = None
+
+
+class VapiCustomer(VapiModel):
+    number: Optional[str] = None
+
+
+class VapiAssistant(VapiModel):
+    id: Optional[str] = None
+
+
+class VapiCall(VapiModel):
+    id: Optional[str] = None
+    type: Optional[str] = None
+    status: Optional[str] = None
+    phoneNumberId: Optional[str] = None
+    phoneNumber: Optional[VapiPhoneNumber] = None
+    assistantId: Optional[str] = None
+    assistant: Optional[VapiAssistant] = None
+    customer: Optional[VapiCustomer] = None
+    startedAt: Optional[datetime] = None
+    endedAt: Optional[datetime] = None
+    endedReason: Optional[str] = None
+    duration: Optional[float] = None
+    cost: Optional[float] = None
+    recordingUrl: Optional[str] = None
+    transcript: Optional[str] = None
+
+
+class VapiArtifact(VapiModel):
+    transcript: Optional[str] = None
+    recordingUrl: Optional[str] = None
+
+
+class VapiAnalysis(VapiModel):
+    summary: Optional[str] = None
+
+
+class VapiMessage(VapiModel):
+    type: str
+    call: Optional[VapiCall] = None
+    timestamp: Optional[Union[float, str]] = None
+    status: Optional[str] = None
+    endedReason: Optional[str] = None
+    role: Optional[str] = None
+    transcript: Optional[str] = None
+    transcriptType: Optional[str] = None
+    durationSeconds: Optional[float] = None
+    cost: Optional[float] = None
+    recordingUrl: Optional[str] = None
+    artifact: Optional[VapiArtifact] = None
+    analysis: Optional[VapiAnalysis] = None
+    functionCall: Optional[dict] = None
+
+
+class VapiWebhook(VapiModel):
+    message: VapiMessage
+
+
+def decode(payload: Union[bytes, str, dict]) -> VapiWebhook:
+    """Decode a raw webhook body; raises ValueError for malformed payloads"""
+    if isinstance(payload, dict):
+        return VapiWebhook.model_validate(payload)
+    return VapiWebhook.model_validate_json(payload)
+
+
+def _utc(moment: Optional[datetime]) -> Optional[datetime]:
+    # Calls are stored as naive UTC
+    if moment is not None and moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _direction(call_type: Optional[str]) -> str:
+    if call_type in ("inbound", "outbound"):
+        return call_type
+    return "outbound" if call_type == "outboundPhoneCall" else "inbound"
+
+
+def _event_at(message: VapiMessage) -> Optional[datetime]:
+    """Naive UTC time VAPI sent the message, if it says"""
+    return transcripts.event_time(message.timestamp) if message.timestamp is not None else None
+
+
+def _resolve_owner(db, vapi_call: VapiCall) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """(user_id, agent_id, phone_number_id) for a VAPI call, from its phone number or assistant"""
+    return owner_index.resolve(
+        db,
+        phone_vapi_id=vapi_call.phoneNumberId or (vapi_call.phoneNumber.id if vapi_call.phoneNumber else None),
+        phone_number=vapi_call.phoneNumber.number if vapi_call.phoneNumber else None,
+        assistant_id=vapi_call.assistantId or (vapi_call.assistant.id if vapi_call.assistant else None),
+    )
+
+
+def resolve_call(db, vapi_call: VapiCall) -> Optional[Call]:
+    """The local call for a VAPI call, created on first sight if we know whose call it is"""
+    return _find_or_create_call(db, vapi_call)[0]
+
+
+def _find_or_create_call(db, vapi_call: VapiCall) -> Tuple[Optional[Call], bool]:
+    call = db.query(Call).filter(Call.vapi_id == vapi_call.id).first()
+    if call:
+        return call, False
+
+    user_id, agent_id, phone_number_id = _resolve_owner(db, vapi_call)
+    if not user_id:
+        return None, False
+
+    call = Call(
+        id=str(uuid.uuid4()),
+        vapi_id=vapi_call.id,
+        user_id=user_id,
+        agent_id=agent_id,
+        phone_number_id=phone_number_id,
+        phone_number=vapi_call.phoneNumber.number if vapi_call.phoneNumber else None,
+        customer_number=vapi_call.customer.number if vapi_call.customer else None,
+        direction=_direction(vapi_call.type),
+        status=vapi_call.status or "in-progress",
+        started_at=_utc(vapi_call.startedAt) or datetime.utcnow(),
+        created_at=datetime.utcnow(),
+    )
+    db.add(call)
+    # Sessions don't autoflush; later events in the same batch must find this call
+    db.flush()
+    return call, True
+
+
+def handle_status_update(db, message: VapiMessage, call: Call):
+    call.status = message.status or message.call.status or call.status
+    if call.status == "in-progress" and not call.started_at:
+        call.started_at = _utc(message.call.startedAt) or datetime.utcnow()
+    if call.status == "ended":
+        call.ended_at = call.ended_at or _utc(message.call.endedAt) or datetime.utcnow()
+        call.ended_reason = message.endedReason or message.call.endedReason or call.ended_reason
+    call.updated_at = datetime.utcnow()
+
+
+def _is_live(call: Call) -> bool:
+    return call_lifecycle.stage(call.status) < call_lifecycle.ENDED
+
+
+def handle_transcript(db, message: VapiMessage, call: Call):
+    text = message.transcript or message.call.transcript
+    if not text:
+        return
+    # Partial transcripts are superseded by the final one for the same utterance, so they stay in memory
+    if message.transcriptType == "partial":
+        if _is_live(call):
+            live_transcripts.live_buffer.record(call.id, "partial", message.role, text, at=_event_at(message))
+        return
+
+    # One segment row per utterance; the call row itself is not rewritten
+    transcripts.append_segment(db, call.id, message.role, text, transcripts.event_time(message.timestamp))
+
+
+def handle_call_end(db, message: VapiMessage, call: Call):
+    vapi_call = message.call
+    artifact = message.artifact or VapiArtifact()
+
+    call.status = vapi_call.status if vapi_call.status not in (None, "in-progress") else "completed"
+    call.ended_reason = message.endedReason or vapi_call.endedReason or call.ended_reason or "completed"
+    call.ended_at = _utc(vapi_call.endedAt) or datetime.utcnow()
+
+    duration = message.durationSeconds if message.durationSeconds is not None else vapi_call.duration
+    if duration is not None:
+        call.duration = int(duration)
+    elif call.started_at:
+        call.duration = int((call.ended_at - call.started_at).total_seconds())
+
+    cost = message.cost if message.cost is not None else vapi_call.cost
+    if cost is not None:
+        call.cost = str(cost)
+
+    recording_url = message.recordingUrl or artifact.recordingUrl or vapi_call.recordingUrl
+    if recording_url:
+        call.recording_url = recording_url
+
+    # VAPI's final transcript wins; otherwise assemble it once from the live segments
+    transcript = artifact.transcript or message.transcript or vapi_call.transcript
+    if transcript:
+        call.transcript = transcript
+    else:
+        transcripts.materialize(db, call)
+    if message.analysis and message.analysis.summary:
+        call.summary = message.analysis.summary
+    live_transcripts.flush(db, live_transcripts.live_buffer, call.id)
+    call.updated_at = datetime.utcnow()
+
+
+def handle_speech_update(db, message: VapiMessage, call: Call):
+    if _is_live(call):
+        live_transcripts.live_buffer.record(
+            call.id, "speech", message.role, data={"status": message.status}, at=_event_at(message)
+        )
+
+
+def handle_function_call(db, message: VapiMessage, call: Call):
+    if _is_live(call):
+        live_transcripts.live_buffer.record(call.id, "function-call", data=message.functionCall or {}, at=_event_at(message))
+
+
+EVENT_HANDLERS: Dict[str, Callable] = {
+    "call-start": handle_status_update,
+    "status-update": handle_status_update,
+    "transcript": handle_transcript,
+    "speech-update": handle_speech_update,
+    "function-call": handle_function_call,
+    "hang": handle_call_end,
+    "call-end": handle_call_end,
+    "call-ended": handle_call_end,
+    "end-of-call-report": handle_call_end,
+}
+
+# Event pushed to live dashboards for each message type; others aren't pushed
+LIVE_EVENT_TYPES: Dict[str, str] = {
+    "call-start": "call-start",
+    "status-update": "status-update",
+    "transcript": "transcript",
+    "hang": "call-end",
+    "call-end": "call-end",
+    "call-ended": "call-end",
+    "end-of-call-report": "call-end",
+}
+
+
+def apply_event(db, event: VapiWebhook, dedup: Optional[DedupIndex] = None) -> dict:
+    """Apply one decoded event to the session without committing, recording its latency by event type.
+
+    With a ``dedup`` index, redelivered events are skipped and the event's
+    fingerprint is staged in the same transaction; callers report the
+    outcome with ``dedup.committed()`` or ``dedup.rolled_back()``.
+    """
+    started = time.perf_counter()
+    result = _dispatch(db, event, dedup)
+    event_type = event.message.type if event.message.type in EVENT_HANDLERS else "other"
+    registry.increment(f"webhook.events.{event_type}")
+    registry.observe(f"webhook.latency.{event_type}", time.perf_counter() - started)
+    return result
+
+
+def _dispatch(db, event: VapiWebhook, dedup: Optional[DedupIndex]) -> dict:
+    message = event.message
+    handler = EVENT_HANDLERS.get(message.type)
+    if handler is None:
+        registry.increment("webhook.ignored.unsupported_type")
+        return {"status": "ignored", "reason": f"unsupported message type: {message.type}"}
+    if not message.call or not message.call.id:
+        registry.increment("webhook.ignored.no_call")
+        return {"status": "ignored", "reason": "no call data"}
+
+    key = fingerprint(event) if dedup is not None else None
+    if key is not None and dedup.seen(key):
+        return {"status": "duplicate", "type": message.type}
+
+    call, created = _find_or_create_call(db, message.call)
+    if call is None:
+        registry.increment("webhook.ignored.unknown_call")
+        return {"status": "ignored", "reason": "call not found in system"}
+
+    if handler in (handle_status_update, handle_call_end):
+        event_at = _event_at(message)
+        final = handler is handle_call_end
+        status = None if final else message.status or message.call.status
+        # A new call was just created in this event's state; anything else must move it forward
+        if not created and not call_lifecycle.accepts(call, status, event_at, final):
+            registry.increment(f"webhook.stale.{message.type}")
+            return {"status": "stale", "type": message.type, "call_id": call.id}
+        call_lifecycle.advance(call, event_at)
+
+    handler(db, message, call)
+    if key is not None:
+        dedup.stage(db, key)
+    result = {"status": "processed", "type": message.type, "call_id": call.id, "user_id": call.user_id}
+    if handler is handle_call_end:
+        result["ended"] = True
+    if handler in (handle_status_update, handle_call_end):
+        # Concurrency and queue tracking follow the call's lifecycle
+        result["call"] = {
+            "status": call.status,
+            "agent_id": call.agent_id,
+            "phone_number_id": call.phone_number_id,
+            "created_at": call.created_at or call.started_at,
+        }
+    live_event = _live_event(message, call, created)
+    if live_event is not None:
+        result["live_event"] = live_event
+    return result
+
+
+def _live_event(message: VapiMessage, call: Call, created: bool) -> Optional[dict]:
+    event_type = LIVE_EVENT_TYPES.get(message.type)
+    if event_type is None:
+        return None
+    if event_type == "status-update" and created:
+        # The first event we see for a call announces it, whatever its type
+        event_type = "call-start"
+
+    event = {"type": event_type, "call": live_events.call_state(call)}
+    if event_type == "transcript":
+        if message.transcriptType == "partial" or not (message.transcript or message.call.transcript):
+            return None
+        event["role"] = message.role
+        event["text"] = message.transcript or message.call.transcript
+    return event
+
+
+def after_commit(results):
+    """Side effects that wait for the transaction: live pushes, concurrent-call counts and call
+    queues, releasing ended calls' buffers and scheduling their enrichment"""
+    for result in results:
+        live_event = result.get("live_event")
+        if live_event is not None:
+            live_events.broker.publish(result["user_id"], live_event)
+        call = result.get("call")
+        if call is not None:
+            if call_lifecycle.stage(call["status"]) < call_lifecycle.ENDED:
+                keys = call_limits.call_keys(result["user_id"], call["agent_id"], call["phone_number_id"])
+                call_limits.limiter.started(result["call_id"], keys)
+            else:
+                call_limits.limiter.ended(result["call_id"])
+            if call_queues.is_queued(call["status"]):
+                call_queues.index.enqueue(result["call_id"], result["user_id"], call["agent_id"],
+                                          call["phone_number_id"], call["created_at"])
+            else:
+                call_queues.index.dequeue(result["call_id"])
+        if result.get("ended"):
+            live_transcripts.live_buffer.discard(result["call_id"])
+            call_enrichment.enricher.schedule(result["call_id"])
+
+
+def process_webhook(db, payload: Union[bytes, str, dict], dedup: Optional[DedupIndex] = None) -> dict:
+    """Decode, apply and commit one webhook delivery"""
+    event = decode(payload)
+    try:
+        result = apply_event(db, event, dedup)
+        db.commit()
+    except Exception:
+        if dedup is not None:
+            db.rollback()
+            # The commit may have failed because an earlier delivery's fingerprint is persisted
+            if dedup.rolled_back(db):
+                return {"status": "duplicate", "type": event.message.type}
+        raise
+    if dedup is not None:
+        dedup.committed()
+    after_commit([result])
+    return result
@@ -18,6 +18,7 @@ import {
 } from "lucide-react";
 import { useNavigate } from "react-router-dom";
 import { useAgents } from "../hooks/useApi";
+import apiService from "../services/api";
 import { toast } from "react-toastify";
 import SystemPromptGenerator from "../utils/systemPromptGenerator";
 import PricingDisplay from "../components/PricingDisplay";
@@ -329,19 +330,12 @@ const AgentCreationWizard = () => {
         return;
       }
 
+      // Uploaded as-is when the agent is created
       setSelectedFile(file);
-
-      // Convert file to base64
-      const reader = new FileReader();
-      reader.onload = (e) => {
-        const base64 = e.target.result.split(",")[1]; // Remove data:type;base64, prefix
-        setAgentData((prev) => ({
-          ...prev,
-          knowledgeBaseFile: base64,
-          knowledgeBaseFileName: file.name,
-        }));
-      };
-      reader.readAsDataURL(file);
+      setAgentData((prev) => ({
+        ...prev,
+        knowledgeBaseFileName: file.name,
+      }));
     }
   };
 
@@ -357,10 +351,22 @@ const AgentCreationWizard = () => {
     }
   };
 
+  // Stream the knowledge base file up first and hand its id to the agent
+  const withKnowledgeBase = async (data) => {
+    if (!selectedFile) {
+      return data;
+    }
+    const knowledgeBase = await apiService.uploadKnowledgeBase(
+      data.knowledgeBaseName || selectedFile.name,
+      selectedFile
+    );
+    return { ...data, knowledgeBaseFile: null, knowledgeBaseId: knowledgeBase.id };
+  };
+
   const handleSubmit = async () => {
     setLoading(true);
     try {
-      await createAgent(agentData);
+      await createAgent(await withKnowledgeBase(agentData));
       toast.success("Agent created successfully!");
       navigate("/agents");
     } catch (error) {
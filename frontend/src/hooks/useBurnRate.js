@@ -0,0 +1,38 @@
+// Custom hook for cost burn rate and month-end forecast
+import { useState, useEffect } from 'react';
+import apiService from '../services/api';
+
+export const useBurnRate = () => {
+  const [burnRate, setBurnRate] = useState({
+    report: null,
+    loading: true,
+    error: null,
+  });
+
+  const fetchBurnRate = async (useCache = true) => {
+    try {
+      setBurnRate(prev => ({ ...prev, loading: true, error: null }));
+
+      // Served from precomputed rollups, so this is cheap to request
+      const report = await apiService.getBurnRate(useCache);
+
+      setBurnRate({ report, loading: false, error: null });
+    } catch (error) {
+      console.error('Failed to fetch burn rate:', error);
+      setBurnRate(prev => ({
+        ...prev,
+        loading: false,
+        error: error.message,
+      }));
+    }
+  };
+
+  useEffect(() => {
+    fetchBurnRate();
+  }, []);
+
+  return {
+    ...burnRate,
+    refreshBurnRate: () => fetchBurnRate(false),
+  };
+};
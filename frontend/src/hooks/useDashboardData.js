@@ -1,6 +1,10 @@
 // Custom hook for dashboard data
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import apiService from '../services/api';
+import { useLiveCalls } from './useLiveCalls';
+
+// Wait for a burst of call events to settle before refetching
+const LIVE_REFRESH_DELAY = 2000;
 
 export const useDashboardData = () => {
   const [dashboardData, setDashboardData] = useState({
@@ -115,15 +119,22 @@ export const useDashboardData = () => {
     }
   };
 
+  const refreshTimer = useRef(null);
+
   useEffect(() => {
     fetchDashboardData();
-    
-    // Refresh data every 2 minutes instead of 30 seconds to reduce server load  
-    const interval = setInterval(fetchDashboardData, 120000);
-    
-    return () => clearInterval(interval);
+    return () => clearTimeout(refreshTimer.current);
   }, []);
 
+  // Instead of polling, refetch when the server reports a call starting or ending
+  useLiveCalls([], (type) => {
+    if (type !== 'call-start' && type !== 'call-end') return;
+    apiService.clearCache('/analytics');
+    apiService.clearCache('/calls');
+    clearTimeout(refreshTimer.current);
+    refreshTimer.current = setTimeout(fetchDashboardData, LIVE_REFRESH_DELAY);
+  });
+
   const refreshData = () => {
     fetchDashboardData();
   };
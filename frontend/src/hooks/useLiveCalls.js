@@ -0,0 +1,58 @@
+// Custom hook for live call state pushed over Server-Sent Events
+import { useState, useEffect, useRef } from 'react';
+import apiService from '../services/api';
+
+const ACTIVE_STATUSES = ['queued', 'ringing', 'in-progress', 'forwarding', 'speaking'];
+
+const mergeCall = (calls, update) => {
+  const existing = calls.find(call => call.id === update.id);
+  // Call state carries a per-call sequence number; never go back to an older one
+  if (existing && existing.seq != null && update.seq != null && update.seq < existing.seq) return calls;
+  const merged = { ...existing, ...update };
+  const others = calls.filter(call => call.id !== update.id);
+  return ACTIVE_STATUSES.includes(merged.status) ? [merged, ...others] : others;
+};
+
+export const useLiveCalls = (initialCalls = [], onEvent = null) => {
+  const [activeCalls, setActiveCalls] = useState(initialCalls);
+  const [connected, setConnected] = useState(false);
+  const [connection, setConnection] = useState(0);
+  const onEventRef = useRef(onEvent);
+  onEventRef.current = onEvent;
+
+  // Calls fetched over REST seed the list until the stream's snapshot arrives
+  useEffect(() => {
+    setActiveCalls(prev => initialCalls.reduce(mergeCall, prev));
+  }, [initialCalls]);
+
+  useEffect(() => {
+    const token = localStorage.getItem('token');
+    if (!token || typeof EventSource === 'undefined') return undefined;
+
+    const source = new EventSource(`${apiService.baseURL}/calls/live?token=${encodeURIComponent(token)}`);
+    const handle = (type, handler) => source.addEventListener(type, (message) => {
+      const data = JSON.parse(message.data);
+      handler(data);
+      if (onEventRef.current) onEventRef.current(type, data);
+    });
+
+    handle('snapshot', (data) => {
+      setActiveCalls(prev => data.calls.map(call => ({ ...prev.find(p => p.id === call.id), ...call })));
+    });
+    ['call-start', 'status-update', 'call-end'].forEach(type => {
+      handle(type, (data) => setActiveCalls(prev => mergeCall(prev, data.call)));
+    });
+    handle('transcript', (data) => {
+      setActiveCalls(prev => mergeCall(prev, { ...data.call, lastTranscript: { role: data.role, text: data.text } }));
+    });
+    // Events were dropped while we were slow; reconnecting delivers a fresh snapshot
+    handle('resync', () => setConnection(prev => prev + 1));
+
+    source.onopen = () => setConnected(true);
+    source.onerror = () => setConnected(false);
+
+    return () => source.close();
+  }, [connection]);
+
+  return { activeCalls, connected };
+};
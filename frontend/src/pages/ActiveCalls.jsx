@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from "react";
+import React from "react";
 import { Phone, Clock, User, Volume2, PhoneOff } from "lucide-react";
 import {
   PageTransition,
@@ -6,19 +6,12 @@ import {
   LoadingSpinner,
 } from "../components/AnimationComponents";
 import { useCalls } from "../hooks/useApi";
+import { useLiveCalls } from "../hooks/useLiveCalls";
 
 const ActiveCalls = () => {
-  const { activeCalls, loading, error } = useCalls();
-  const [refreshKey, setRefreshKey] = useState(0);
-
-  // Auto-refresh every 30 seconds instead of 5 seconds
-  useEffect(() => {
-    const interval = setInterval(() => {
-      setRefreshKey((prev) => prev + 1);
-    }, 30000);
-
-    return () => clearInterval(interval);
-  }, []);
+  const { activeCalls: fetchedCalls, loading, error } = useCalls();
+  // Calls are pushed by the server as they start, change and end
+  const { activeCalls } = useLiveCalls(fetchedCalls);
 
   const formatDuration = (seconds) => {
     const minutes = Math.floor(seconds / 60);
@@ -1,5 +1,7 @@
 import React, { useState } from "react";
 import { useAnalytics } from "../hooks/useAnalytics";
+import { useBurnRate } from "../hooks/useBurnRate";
+import apiService from "../services/api";
 import {
   BarChart,
   Bar,
@@ -42,6 +44,23 @@ const Analytics = () => {
     refreshData,
     exportData,
   } = useAnalytics(timeRange);
+  const { report: burnRate, refreshBurnRate } = useBurnRate();
+  const browserTimezone = Intl.DateTimeFormat().resolvedOptions().timeZone;
+
+  const applyBrowserTimezone = async () => {
+    try {
+      await apiService.updateTimezone(browserTimezone);
+      refreshData();
+      refreshBurnRate();
+    } catch (error) {
+      console.error("Failed to update timezone:", error);
+    }
+  };
+
+  const formatChange = (change) =>
+    change === null || change === undefined
+      ? "No prior week"
+      : `${change > 0 ? "+" : ""}${change.toFixed(1)}% vs last week`;
 
   // Create stats cards from API data
   const statsCards = [
@@ -154,7 +173,10 @@ const Analytics = () => {
             <option value="90d">Last 90 days</option>
           </select>
           <button
-            onClick={refreshData}
+            onClick={() => {
+              refreshData();
+              refreshBurnRate();
+            }}
             disabled={loading}
             className="bg-gray-100 text-gray-600 px-4 py-2 rounded-md text-sm font-medium hover:bg-gray-200 flex items-center space-x-2 disabled:opacity-50"
           >
@@ -214,6 +236,81 @@ const Analytics = () => {
         })}
       </div>
 
+      {/* Spend Forecast */}
+      {burnRate && (
+        <div className="bg-white rounded-lg shadow p-6">
+          <div className="flex items-center justify-between mb-6">
+            <h2 className="text-lg font-semibold text-gray-900">
+              Spend Forecast
+            </h2>
+            <div className="flex items-center space-x-3">
+              <span className="text-sm text-gray-500">
+                {burnRate.month.month} ({burnRate.month.timezone})
+              </span>
+              {browserTimezone && browserTimezone !== burnRate.month.timezone && (
+                <button
+                  onClick={applyBrowserTimezone}
+                  className="text-sm text-blue-600 hover:text-blue-700"
+                >
+                  Use {browserTimezone}
+                </button>
+              )}
+            </div>
+          </div>
+          <div className="grid grid-cols-1 md:grid-cols-4 gap-6">
+            <div>
+              <h3 className="text-sm font-medium text-gray-500">Burn Rate</h3>
+              <p className="text-2xl font-bold text-gray-900 mt-1">
+                ${burnRate.burn_rate.cost_per_day.toFixed(2)}/day
+              </p>
+              <p className="text-sm text-gray-500 mt-1">
+                Last {burnRate.burn_rate.window_days} days
+              </p>
+            </div>
+            <div>
+              <h3 className="text-sm font-medium text-gray-500">Month to Date</h3>
+              <p className="text-2xl font-bold text-gray-900 mt-1">
+                ${burnRate.month.spend_to_date.toFixed(2)}
+              </p>
+              <p className="text-sm text-gray-500 mt-1">
+                {burnRate.month.days_remaining.toFixed(1)} days remaining
+              </p>
+            </div>
+            <div>
+              <h3 className="text-sm font-medium text-gray-500">Projected Month End</h3>
+              <p className="text-2xl font-bold text-gray-900 mt-1">
+                ${burnRate.month.projected_spend.toFixed(2)}
+              </p>
+              <p className="text-sm text-gray-500 mt-1">
+                80%: ${burnRate.month.confidence_bands["80"].low.toFixed(2)} - $
+                {burnRate.month.confidence_bands["80"].high.toFixed(2)}
+              </p>
+            </div>
+            <div>
+              <h3 className="text-sm font-medium text-gray-500">This Week</h3>
+              <p className="text-2xl font-bold text-gray-900 mt-1">
+                ${burnRate.week_over_week.current.cost.toFixed(2)}
+              </p>
+              <p className="text-sm text-gray-500 mt-1">
+                {formatChange(burnRate.week_over_week.cost_change_percent)}
+              </p>
+            </div>
+          </div>
+          {burnRate.burn_rate.by_agent.length > 0 && (
+            <div className="mt-6 space-y-2">
+              {burnRate.burn_rate.by_agent.slice(0, 5).map((agent) => (
+                <div key={agent.id || "unassigned"} className="flex justify-between items-center">
+                  <span className="text-sm text-gray-600">{agent.name}</span>
+                  <span className="text-sm font-medium text-gray-900">
+                    ${agent.cost_per_day.toFixed(2)}/day
+                  </span>
+                </div>
+              ))}
+            </div>
+          )}
+        </div>
+      )}
+
       {/* Charts Grid */}
       <div className="grid lg:grid-cols-2 gap-6">
         {/* Call Volume Chart */}
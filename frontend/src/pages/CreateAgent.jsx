@@ -16,6 +16,7 @@ import {
   Upload,
 } from "lucide-react";
 import { useAgents } from "../hooks/useApi";
+import apiService from "../services/api";
 import toast from "react-hot-toast";
 
 const CreateAgent = () => {
@@ -225,19 +226,12 @@ const CreateAgent = () => {
         return;
       }
 
+      // Uploaded as-is when the agent is created
       setSelectedFile(file);
-
-      // Convert file to base64
-      const reader = new FileReader();
-      reader.onload = (e) => {
-        const base64 = e.target.result.split(",")[1]; // Remove data:type;base64, prefix
-        setAgentData((prev) => ({
-          ...prev,
-          knowledgeBaseFile: base64,
-          knowledgeBaseFileName: file.name,
-        }));
-      };
-      reader.readAsDataURL(file);
+      setAgentData((prev) => ({
+        ...prev,
+        knowledgeBaseFileName: file.name,
+      }));
     }
   };
 
@@ -260,6 +254,18 @@ const CreateAgent = () => {
     }
   };
 
+  // Stream the knowledge base file up first and hand its id to the agent
+  const withKnowledgeBase = async (data) => {
+    if (!selectedFile) {
+      return data;
+    }
+    const knowledgeBase = await apiService.uploadKnowledgeBase(
+      data.knowledgeBaseName || selectedFile.name,
+      selectedFile
+    );
+    return { ...data, knowledgeBaseFile: null, knowledgeBaseId: knowledgeBase.id };
+  };
+
   const handleSave = async () => {
     try {
       setLoading(true);
@@ -276,7 +282,7 @@ const CreateAgent = () => {
       }
 
       // Create the agent via API
-      const result = await createAgent(agentData);
+      const result = await createAgent(await withKnowledgeBase(agentData));
 
       if (result.success) {
         toast.success("Agent created successfully!");
@@ -83,7 +83,9 @@ const Login = () => {
         });
         
         auth2.signIn().then(async (googleUser) => {
-          const token = googleUser.getAuthResponse().access_token;
+          // The backend verifies ID tokens locally; access tokens still work via Google's userinfo
+          const { id_token, access_token } = googleUser.getAuthResponse(true);
+          const token = id_token || access_token;
           const result = await googleAuth(token);
           
           if (result.success) {
@@ -48,6 +48,7 @@ class ApiService {
       data = null,
       cache = false,
       cacheDuration = this.defaultCacheDuration,
+      headers: extraHeaders = {},
       ...axiosOptions
     } = options;
 
@@ -66,7 +67,7 @@ class ApiService {
       const token = localStorage.getItem('token');
       const headers = {
         'Content-Type': 'application/json',
-        ...(axiosOptions.headers || {})
+        ...extraHeaders
       };
       
       if (token) {
@@ -132,6 +133,25 @@ class ApiService {
     });
   }
 
+  // Knowledge Base API methods
+  async uploadKnowledgeBase(name, file) {
+    // Sent as multipart so the backend can stream it to VAPI without base64
+    const form = new FormData();
+    form.append('name', name);
+    // Lets the backend reuse a knowledge base built from identical content
+    if (window.crypto?.subtle) {
+      const digest = await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+      const hex = Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, '0')).join('');
+      form.append('sha256', hex);
+    }
+    form.append('file', file, file.name);
+    return this.apiCall('/knowledge-bases/upload', {
+      method: 'POST',
+      data: form,
+      headers: { 'Content-Type': 'multipart/form-data' }
+    });
+  }
+
   // Phone Number API methods
   async getPhoneNumbers(useCache = true) {
     return this.apiCall('/phone-numbers', { cache: useCache });
@@ -269,6 +289,23 @@ class ApiService {
     });
   }
 
+  async getBurnRate(useCache = true) {
+    return this.apiCall('/analytics/burn-rate', {
+      cache: useCache,
+      cacheDuration: 5 * 60 * 1000 // rollups only change as calls come in
+    });
+  }
+
+  async updateTimezone(timezone) {
+    const result = await this.apiCall('/auth/timezone', {
+      method: 'PUT',
+      data: { timezone }
+    });
+    // Day and month buckets change with the timezone
+    this.clearCache('/analytics');
+    return result;
+  }
+
   // Real-time data methods (no caching)
   async getRealtimeData(endpoint) {
     return this.apiCall(endpoint, { cache: false });